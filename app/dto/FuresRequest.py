@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing_extensions import List, Optional
+from pydantic import BaseModel, field_validator
+from typing_extensions import List, Optional, Union
 
 
 class FuresDataItem(BaseModel):
@@ -25,5 +25,17 @@ class FuresRequest(BaseModel):
 
 class PeriodicaRequest(BaseModel):
     token_ser: Optional[str] = None
-    anno: int
-    trimestre: int
+    # Se acepta un año/trimestre o una lista; internamente siempre son listas
+    anno: List[int]
+    trimestre: List[int]
+    # Ingesta a reanudar; sin él se inicia una ingesta nueva
+    ingestion_id: Optional[str] = None
+    # Porción de la ingesta para esta instancia; sin ellos se usan
+    # CLOUD_RUN_TASK_INDEX/CLOUD_RUN_TASK_COUNT o se procesa todo
+    shard_index: Optional[int] = None
+    shard_count: Optional[int] = None
+
+    @field_validator("anno", "trimestre", mode="before")
+    @classmethod
+    def _como_lista(cls, valor: Union[int, List[int]]) -> List[int]:
+        return valor if isinstance(valor, list) else [valor]
@@ -1,10 +1,11 @@
+import asyncio
 import os
-import shutil
 import uuid
 import requests
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import asynccontextmanager
 from datetime import date, datetime, timedelta, timezone
-from typing import List
+from typing import List, Tuple
 
 from fastapi import Depends, FastAPI, HTTPException, Query
 from fastapi.security import HTTPAuthorizationCredentials
@@ -15,14 +16,50 @@ from typing_extensions import Any, Dict, Optional
 from app.config.cors import configure_cors
 from app.dto.FuresRequest import FuresRequest, PeriodicaRequest
 from app.gen_pliegos.service import Service as PliegoService
-from app.playwright.SerService import SerService
+from playwright.async_api import async_playwright
+
+from app.playwright.AsyncSerService import AsyncSerService
+from app.playwright.BrowserPool import get_browser_pool
+from app.playwright.SerAuthenticator import AsyncSerAuthenticator, SerAuthenticator
 from app.repository.BigQueryRepository import BigQueryRepository, Oficio, RpaFursLog
+from app.repository.ManifiestoRepository import ETAPA_SCRAPEADO, ManifiestoRepository
 from app.repository.StorageRepository import StorageRepository
 from app.security.firebase_auth import get_current_user, initialize_firebase_app
+from app.utils.colocacion_archivos import (
+    directorio_descargas_temporales,
+    liberar_directorio_ingesta,
+    preparar_directorio_ingesta,
+)
+from app.utils.concurrencia import get_controlador_concurrencia
+from app.utils.proteccion_ser import get_circuito_ser
+from app.utils.ingesta import (
+    ContextoIngesta,
+    procesar_grupo,
+    scrapear_con_circuito_async,
+    subir_y_registrar_trimestre,
+)
 from app.utils.fecha_habil_colombia import (
     get_next_business_day,
     get_previous_business_day,
 )
+from app.utils.planificacion import (
+    GrupoTrabajo,
+    clave_shard,
+    filtrar_shard,
+    planificar_grupos,
+    planificar_reanudacion,
+    resolver_shard,
+)
+from app.utils.procesos import PoolProcesosSer
+from app.utils.trabajos import (
+    ESTADO_CANCELADO,
+    ESTADO_COMPLETADO,
+    ESTADO_ERROR,
+    ESTADO_OMITIDO,
+    GestorTrabajos,
+    Trabajo,
+    TrabajoEnCurso,
+)
 
 # --- INICIO DE CAMBIOS ---
 
@@ -37,10 +74,20 @@ class FinalResponse(BaseModel):
     pliegos_results: List[Dict[str, Any]]
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Al apagar el servicio se detienen las ingestas, los workers y los navegadores."""
+    yield
+    gestor_trabajos.apagar()
+    executor_ser.shutdown(wait=False, cancel_futures=True)
+    get_browser_pool().shutdown()
+
+
 app = FastAPI(
     title="Servicio de Descarga FURES",
     description="Una API para interactuar con los datos de FURES en BigQuery.",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 def obtener_bearer_token():
@@ -74,6 +121,17 @@ initialize_firebase_app()
 #    Mantenemos una instancia solo para la LECTURA inicial, que es segura.
 repo_lectura = BigQueryRepository()
 
+# 3. Ejecutor de larga vida: cada hilo conserva su navegador del pool entre
+#    peticiones, de modo que el costo por registro es solo un contexto nuevo.
+MAX_WORKERS = int(os.getenv("SER_BROWSER_POOL_SIZE", "4"))
+executor_ser = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="ser-worker")
+
+# 4. Ingestas en segundo plano: POST / encola y responde con el ingestion_id.
+gestor_trabajos = GestorTrabajos(
+    max_workers=int(os.getenv("SER_JOBS_WORKERS", "1")),
+    retenidos=int(os.getenv("SER_JOBS_RETENIDOS", "100")),
+)
+
 @app.get("/hola")
 def read_root(current_user: Dict[str, Any] = Depends(get_current_user)):
     print(f"✅ Petición autenticada por el usuario: {current_user.get('email')}")
@@ -82,7 +140,7 @@ def read_root(current_user: Dict[str, Any] = Depends(get_current_user)):
 
 @app.post(
     "/",
-    summary="Procesar y registrar FURs (versión simplificada sin sesiones ni pliegos)",
+    summary="Encolar la descarga y registro de FURs (versión simplificada sin sesiones ni pliegos)",
     tags=["FURES"],
 )
 def procesar_fures_simplificado(
@@ -90,164 +148,213 @@ def procesar_fures_simplificado(
 ):
     """
     Versión simplificada del servicio de descarga de FURs.
-    - Usa la estructura comprobada del endpoint original (/).
+    - Encola la ingesta y responde de inmediato con su `ingestion_id`; el
+      avance se consulta en `estado_url` (GET /jobs/{ingestion_id}, con
+      `shard_index`/`shard_count` si la ingesta está repartida).
     - Ejecuta procesos en paralelo con ThreadPoolExecutor.
     - No usa sesiones, radicados, Firebase ni generación de pliegos.
+    - Con un `ingestion_id` existente reanuda la ingesta desde su manifiesto.
+    - Con `shard_index`/`shard_count` (o en una tarea de Cloud Run Jobs) solo
+      procesa su porción de la ingesta; N instancias con el mismo
+      `ingestion_id` se reparten el trabajo sin solaparse.
     """
-    from concurrent.futures import ThreadPoolExecutor, as_completed
-    import threading
+    ingestion_id = request.ingestion_id or str(uuid.uuid4())
+    try:
+        shard = resolver_shard(request.shard_index, request.shard_count)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        trabajo = gestor_trabajos.enviar(
+            ingestion_id,
+            request.model_dump(exclude={"token_ser", "ingestion_id"}),
+            lambda trabajo: ejecutar_ingesta(request, trabajo, shard),
+            clave=clave_shard(ingestion_id, *shard),
+        )
+    except TrabajoEnCurso as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    shard_index, shard_count = shard
+    estado_url = f"/jobs/{ingestion_id}"
+    if shard_count > 1:
+        estado_url += f"?shard_index={shard_index}&shard_count={shard_count}"
+    return {
+        "ingestion_id": ingestion_id,
+        "estado": trabajo.estado,
+        "estado_url": estado_url,
+    }
+
+
+def _clave_de_consulta(ingestion_id: str, shard_index: int, shard_count: int) -> str:
+    try:
+        return clave_shard(ingestion_id, *resolver_shard(shard_index, shard_count))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/jobs/{ingestion_id}", summary="Consultar el avance de una ingesta", tags=["FURES"])
+def consultar_trabajo(
+    ingestion_id: str,
+    shard_index: int = Query(0, ge=0),
+    shard_count: int = Query(1, ge=1),
+):
+    clave = _clave_de_consulta(ingestion_id, shard_index, shard_count)
+    trabajo = gestor_trabajos.obtener(clave)
+    if trabajo is None:
+        raise HTTPException(status_code=404, detail=f"No existe la ingesta {clave}.")
+    return trabajo.como_dict()
+
+
+@app.post("/jobs/{ingestion_id}/cancel", summary="Cancelar una ingesta", tags=["FURES"])
+def cancelar_trabajo(
+    ingestion_id: str,
+    shard_index: int = Query(0, ge=0),
+    shard_count: int = Query(1, ge=1),
+):
+    clave = _clave_de_consulta(ingestion_id, shard_index, shard_count)
+    trabajo = gestor_trabajos.cancelar(clave)
+    if trabajo is None:
+        raise HTTPException(status_code=404, detail=f"No existe la ingesta {clave}.")
+    return trabajo.como_dict()
+
+
+@app.get("/concurrencia", summary="Nivel actual de sesiones simultáneas del SER", tags=["FURES"])
+def consultar_concurrencia():
+    return dict(
+        get_controlador_concurrencia().estado(), circuito=get_circuito_ser().estado_dict()
+    )
+
+
+@app.get(
+    "/jobs/{ingestion_id}/shards",
+    summary="Confirmar que todos los shards de una ingesta terminaron",
+    tags=["FURES"],
+)
+def consolidar_shards(ingestion_id: str, shard_count: int = Query(..., ge=1)):
+    storage_repo = StorageRepository()
+    return ManifiestoRepository.consolidar(storage_repo.bucket, ingestion_id, shard_count)
 
-    ingestion_id = str(uuid.uuid4())
+
+def ejecutar_ingesta(
+    request: PeriodicaRequest, trabajo: Trabajo, shard: Tuple[int, int] = (0, 1)
+):
+    """
+    Ejecuta una ingesta completa (scraping, subida y logs) para el trabajo
+    encolado por POST /, dejando el estado de cada ítem en `trabajo`.
+    `shard` es (índice, cantidad) de la porción que procesa esta instancia.
+    """
+    ingestion_id = trabajo.ingestion_id
+    shard_index, shard_count = shard
     ingestion_timestamp_global = datetime.now(timezone.utc).isoformat()
     print(f"🚀 Iniciando procesamiento simplificado para años {request.anno} y trimestres {request.trimestre}...")
 
-    #  Limpieza del directorio de descargas
-    download_folder = os.getenv("DOWNLOAD_PATH", "descargas")
-    if os.path.exists(download_folder):
-        print(f"🧹 Limpiando directorio de descargas principal: {download_folder}")
-        shutil.rmtree(download_folder)
-
     # 🔹 Inicialización de repositorios
     bq_repo = BigQueryRepository()
     storage_repo = StorageRepository()
+    manifiesto = ManifiestoRepository(
+        ingestion_id,
+        bucket=storage_repo.bucket,
+        shard_index=shard_index,
+        shard_count=shard_count,
+    )
+
+    #  Carpeta de descargas propia del shard (al reanudar se reutiliza lo ya descargado)
+    download_folder = preparar_directorio_ingesta(
+        clave_shard(ingestion_id, shard_index, shard_count), manifiesto.reanudado
+    )
 
     # 🔹 Obtener registros desde BigQuery
     registros = bq_repo.obtenerPeriodica(request.anno, request.trimestre)
     print(registros)
     if not registros:
-        raise HTTPException(status_code=404, detail="No se encontraron registros para los periodos solicitados.")
+        raise LookupError("No se encontraron registros para los periodos solicitados.")
+    registros = filtrar_shard(registros, shard_index, shard_count)
+    trabajo.registros_totales = len(registros)
 
     # 🔹 Variables globales
     logs_generados_total: List[RpaFursLog] = []
-    playwright_lock = threading.Lock()  # evita condiciones de carrera al iniciar Playwright
+    # Modo de inicio de sesión: compartida (storage_state), cookie o cookie_compartida
+    modo_sesion = os.getenv("SER_MODO_SESION", "compartida")
+    grupos = planificar_grupos(registros)
+    for grupo in grupos:
+        trabajo.agregar_item(grupo.etiqueta, grupo.trimestres, len(grupo.registros))
+
+    if os.getenv("SER_MODO_EJECUCION", "hilos") == "procesos":
+        # Un proceso por navegador, cada uno con sus propios repositorios
+        pool_procesos = PoolProcesosSer(
+            configuracion={
+                "ingestion_id": ingestion_id,
+                "ingestion_timestamp_global": ingestion_timestamp_global,
+                "download_folder": download_folder,
+                "shard_index": shard_index,
+                "shard_count": shard_count,
+                "token_ser": request.token_ser,
+                "modo_sesion": modo_sesion,
+            },
+            procesos=int(os.getenv("SER_PROCESOS", str(MAX_WORKERS))),
+            controlador=get_controlador_concurrencia(),
+        )
+        try:
+            logs_generados_total.extend(pool_procesos.ejecutar(grupos, trabajo))
+            if not trabajo.cancelado:
+                manifiesto.reportar_shard(len(registros), len(logs_generados_total))
+        finally:
+            manifiesto.cerrar(completo=_ingesta_completa(trabajo))
+        _liberar_si_completa(trabajo, download_folder)
+        print(f"🏁 Procesamiento completado. Total registros procesados: {len(logs_generados_total)}")
+        return
+
+    browser_pool = get_browser_pool()
+    # Una sola autenticación por ingesta; su storage_state siembra cada contexto.
+    autenticador = SerAuthenticator(browser_pool, token_ser=request.token_ser)
+
+    contexto = ContextoIngesta(
+        ingestion_id=ingestion_id,
+        ingestion_timestamp_global=ingestion_timestamp_global,
+        download_folder=download_folder,
+        storage_repo=storage_repo,
+        bq_repo=bq_repo,
+        manifiesto=manifiesto,
+        browser_pool=browser_pool,
+        autenticador=autenticador,
+        modo_sesion=modo_sesion,
+        controlador=get_controlador_concurrencia(),
+        circuito=get_circuito_ser(),
+    )
 
     # ============================================================
-    #  Worker: procesa un registro individual
+    #  Worker: procesa un grupo (NIT, expediente, año) con todos sus trimestres
     # ============================================================
-    def procesar_item(item):
-        try:
-            nit = str(item["Identificacion"])
-            expediente = str(item["Expediente"])
-            anio = int(item["ANNO"])
-            trimestre = int(item["TRIMESTRE"])
-
-            print(f"🧩 Procesando NIT {nit} | Expediente {expediente} | {anio}-T{trimestre}")
-
-            # Calcular fechas del trimestre
-            # mes_inicio = 3 * (trimestre - 1) + 1
-            # fecha_inicial = get_next_business_day(date(anio, mes_inicio, 1))
-            fecha_inicial = get_next_business_day(date(anio, 1, 1))
-            # mes_final = mes_inicio + 2
-            fecha_final = get_previous_business_day(date(anio, 12, 31))
-            # if mes_final == 12:
-            #     fecha_final = get_previous_business_day(date(anio, 12, 31))
-            # else:
-            #     fecha_final = get_previous_business_day(
-            #         date(anio, mes_final + 1, 1) - timedelta(days=1)
-            #     )
-
-            # Inicializar SER
-            ser_service = SerService()
-
-            # Inicio de sesion con token de request
-            # with playwright_lock:
-            #     ser_service.start_session(request.token_ser)
-
-            with playwright_lock:
-                # Inicio de sesion con token de request
-                if getattr(request, "token_ser", None):
-                    print("🔐 Iniciando sesión con token_ser (localStorage)")
-                    ser_service.start_session(request.token_ser)
-                else:
-                # Inicio de sesion manual
-                    print("🔑 Iniciando sesión manual en el SER (login con usuario y contraseña)...")
-                    ser_service.login()
-
-            # nit = "10722639"
-            # expediente = "96003411"
-
-            # Buscar y descargar datos
-            ser_service.buscar_data(
-                nitOperador=nit,
-                expediente=expediente,
-                fechaInicial=fecha_inicial,
-                fechaFinal=fecha_final,
-            )
-
-            ser_service.descargar_y_clasificar_furs_paginado(
-                nit=nit,
-                anio=anio,
-                expediente=int(expediente),
-                seccion="ia",
-                trimestres=[trimestre],
-            )
-
-            # Subir a Storage
-            print(f"🟦 Iniciando subida a Storage para NIT {nit} | {anio}-T{trimestre}...")
-            uploaded_urls, gsutil_paths = storage_repo.upload_period_and_images_standalone(
-                base_download_path=ser_service.download_path,
-                seccion="ia",
-                anio=anio,
-                periodo=trimestre,
-                nit=nit,
-                expediente=expediente,
-            )
-            print(f"🟩 Finalizó subida a Storage para {nit}: {len(uploaded_urls)} archivos subidos.")
-
-            # Clasificar archivos según tipo
-            image_urls, gs_images, doc_urls, gs_docs = [], [], [], []
-            for url, gs_path in zip(uploaded_urls, gsutil_paths):
-                if gs_path.lower().endswith((".png", ".jpg", ".jpeg")):
-                    image_urls.append(url)
-                    gs_images.append(gs_path)
-                elif gs_path.lower().endswith(".pdf"):
-                    doc_urls.append(url)
-                    gs_docs.append(gs_path)
-
-            # Insertar en BigQuery
-            log = {
-                "year": anio,
-                "nitOperador": nit,
-                "expediente": expediente,
-                "trimestre": trimestre,
-                "cod_seven": item.get("Cod_Servicio_Seven"),
-                "subido_a_storage": bool(uploaded_urls),
-                "links_imagenes": image_urls,
-                "gsutil_log_images": gs_images,
-                "links_documentos": doc_urls,
-                "gsutil_log_documents": gs_docs,
-                "ingestion_timestamp": datetime.now(timezone.utc).isoformat(),
-                "codigo_servicio": item.get("Cod_Servicio"),
-                "servicio": item.get("Servicio"),
-                "expediente_habilitado": "NO",
-                "ingestion_timestamp_global": ingestion_timestamp_global,
-            }
-
-            bq_repo.insert_upload_log(RpaFursLog(**log), ingestion_id=ingestion_id)
-            print(f"✅ Log insertado en BigQuery para NIT {nit} | Exp {expediente}")
-            return log
-        except Exception as e:
-                print(f"⚠️ Error menor al procesar NIT {item.get('Identificacion')}: {e}")
-                return None  # No detiene todo el flujo
-        finally:
-            try:
-                ser_service.close_session()
-            except Exception:
-                pass
+    def procesar_grupo_en_hilo(grupo: GrupoTrabajo) -> List[Dict[str, Any]]:
+        if trabajo.cancelado:
+            trabajo.terminar_item(grupo.etiqueta, ESTADO_CANCELADO)
+            return []
+        trabajo.iniciar_item(grupo.etiqueta)
+        estado, logs, error = procesar_grupo(
+            contexto,
+            grupo,
+            lambda: trabajo.cancelado,
+            lambda estado: trabajo.actualizar_item(grupo.etiqueta, estado),
+        )
+        trabajo.terminar_item(grupo.etiqueta, estado, logs=len(logs), error=error)
+        return logs
 
 
     # ============================================================
     # Ejecución paralela (idéntico al formato del servicio original)
     # ============================================================
-    MAX_WORKERS = 4
-    print(f"⚙️ Iniciando procesamiento paralelo con {MAX_WORKERS} workers...")
+    print(
+        f"⚙️ Iniciando procesamiento paralelo con {MAX_WORKERS} workers "
+        f"({get_controlador_concurrencia().nivel} sesiones del SER a la vez por ahora)..."
+    )
 
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        futuros = {executor.submit(procesar_item, item): item for item in registros}
+    futuros = {executor_ser.submit(procesar_grupo_en_hilo, grupo): grupo for grupo in grupos}
+    try:
         for futuro in as_completed(futuros):
-            resultado = futuro.result()
-            if resultado:
-                logs_generados_total.append(resultado)
+            logs_generados_total.extend(futuro.result())
+        if not trabajo.cancelado:
+            manifiesto.reportar_shard(len(registros), len(logs_generados_total))
+    finally:
+        manifiesto.cerrar(completo=_ingesta_completa(trabajo))
+    _liberar_si_completa(trabajo, download_folder)
 
     print(f"🏁 Procesamiento completado. Total registros procesados: {len(logs_generados_total)}")
 
@@ -279,3 +386,215 @@ def procesar_fures_simplificado(
     #     },
     #     "detalle": logs_generados_total,
     # }
+
+
+def _ingesta_completa(trabajo: Trabajo) -> bool:
+    """Con todos los ítems terminados sin error, ya no hay nada que reanudar."""
+    return trabajo.estado_final()[0] == ESTADO_COMPLETADO
+
+
+def _liberar_si_completa(trabajo: Trabajo, download_folder: str):
+    if _ingesta_completa(trabajo):
+        liberar_directorio_ingesta(download_folder)
+
+
+@app.post(
+    "/async",
+    summary="Procesar y registrar FURs con el motor asíncrono de Playwright",
+    tags=["FURES"],
+)
+async def procesar_fures_async(
+    request: PeriodicaRequest,
+):
+    """
+    Variante asíncrona de la descarga de FURs.
+    - Un solo event loop y un solo navegador atienden todas las sesiones del SER,
+      cada una en su propio contexto, sembrado con el storage_state de una sola
+      autenticación por ingesta.
+    - La concurrencia se limita con SER_ASYNC_MAX_SESSIONS (16 por defecto).
+    - Las subidas a Storage, el manifiesto y los logs de BigQuery corren en
+      hilos con asyncio.to_thread.
+    - Con un `ingestion_id` existente reanuda la ingesta desde su manifiesto.
+    - Responde al terminar, pero su avance también se consulta en
+      GET /jobs/{ingestion_id} y rechaza (409) una ingesta que ya está en curso.
+    """
+    ingestion_id = request.ingestion_id or str(uuid.uuid4())
+    try:
+        shard = resolver_shard(request.shard_index, request.shard_count)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        with gestor_trabajos.en_curso(
+            ingestion_id,
+            request.model_dump(exclude={"token_ser", "ingestion_id"}),
+            clave=clave_shard(ingestion_id, *shard),
+        ) as trabajo:
+            await ejecutar_ingesta_async(request, trabajo, shard)
+    except TrabajoEnCurso as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+async def ejecutar_ingesta_async(
+    request: PeriodicaRequest, trabajo: Trabajo, shard: Tuple[int, int]
+):
+    """Cuerpo de POST /async; deja el estado de cada ítem en `trabajo`."""
+    ingestion_id = trabajo.ingestion_id
+    shard_index, shard_count = shard
+    ingestion_timestamp_global = datetime.now(timezone.utc).isoformat()
+    print(f"🚀 Iniciando procesamiento asíncrono para años {request.anno} y trimestres {request.trimestre}...")
+
+    bq_repo = BigQueryRepository()
+    storage_repo = await asyncio.to_thread(StorageRepository)
+    manifiesto = await asyncio.to_thread(
+        ManifiestoRepository, ingestion_id, storage_repo.bucket, shard_index, shard_count
+    )
+
+    download_folder = await asyncio.to_thread(
+        preparar_directorio_ingesta,
+        clave_shard(ingestion_id, shard_index, shard_count),
+        manifiesto.reanudado,
+    )
+
+    registros = await asyncio.to_thread(bq_repo.obtenerPeriodica, request.anno, request.trimestre)
+    if not registros:
+        raise HTTPException(status_code=404, detail="No se encontraron registros para los periodos solicitados.")
+    registros = filtrar_shard(registros, shard_index, shard_count)
+    trabajo.registros_totales = len(registros)
+    grupos = planificar_grupos(registros)
+    for grupo in grupos:
+        trabajo.agregar_item(grupo.etiqueta, grupo.trimestres, len(grupo.registros))
+
+    max_sesiones = int(os.getenv("SER_ASYNC_MAX_SESSIONS", "16"))
+    semaforo = asyncio.Semaphore(max_sesiones)
+
+    async def procesar_grupo_async(
+        grupo: GrupoTrabajo, browser, autenticador: AsyncSerAuthenticator
+    ) -> List[Dict[str, Any]]:
+        async with semaforo:
+            if trabajo.cancelado:
+                trabajo.terminar_item(grupo.etiqueta, ESTADO_CANCELADO)
+                return []
+            trabajo.iniciar_item(grupo.etiqueta)
+            try:
+                nit = grupo.nit
+                expediente = grupo.expediente
+                anio = grupo.anio
+                trimestres, requiere_scrape, subidas = await asyncio.to_thread(
+                    planificar_reanudacion, manifiesto, grupo, download_folder
+                )
+                if not trimestres:
+                    print(f"⏩ [async] NIT {nit} | Expediente {expediente} | {anio} ya registrado en esta ingesta.")
+                    trabajo.terminar_item(grupo.etiqueta, ESTADO_OMITIDO)
+                    return []
+                print(f"🧩 [async] Procesando NIT {nit} | Expediente {expediente} | {anio} T{trimestres}")
+
+                if requiere_scrape:
+                    async def scrapear():
+                        ser_service = AsyncSerService(
+                            browser=browser, download_path=download_folder
+                        )
+                        try:
+                            # storage_state compartido: una sola autenticación por ingesta
+                            await ser_service.start_session_from_state(autenticador)
+
+                            await ser_service.buscar_data(
+                                nitOperador=nit,
+                                expediente=expediente,
+                                fechaInicial=get_next_business_day(date(anio, 1, 1)),
+                                fechaFinal=get_previous_business_day(date(anio, 12, 31)),
+                            )
+                            await ser_service.descargar_y_clasificar_furs_paginado(
+                                nit=nit,
+                                anio=anio,
+                                expediente=int(expediente),
+                                seccion="ia",
+                                trimestres=trimestres,
+                            )
+                        finally:
+                            try:
+                                await ser_service.close_session()
+                            except Exception:
+                                pass
+
+                    # Con el circuito del SER abierto la sesión espera estacionada
+                    await scrapear_con_circuito_async(get_circuito_ser(), grupo, scrapear)
+                    for trimestre in trimestres:
+                        if trimestre not in subidas:
+                            # SQLite y el respaldo en GCS bloquean: fuera del event loop
+                            await asyncio.to_thread(
+                                manifiesto.marcar, nit, expediente, anio, trimestre, ETAPA_SCRAPEADO
+                            )
+
+                logs = []
+                for trimestre in trimestres:
+                    logs.extend(
+                        await asyncio.to_thread(
+                            subir_y_registrar_trimestre,
+                            storage_repo,
+                            bq_repo,
+                            grupo,
+                            trimestre,
+                            download_folder,
+                            ingestion_id,
+                            ingestion_timestamp_global,
+                            manifiesto,
+                            subidas.get(trimestre),
+                        )
+                    )
+                trabajo.terminar_item(grupo.etiqueta, ESTADO_COMPLETADO, logs=len(logs))
+                return logs
+            except Exception as e:
+                print(f"⚠️ Error menor al procesar NIT {grupo.nit}: {e}")
+                trabajo.terminar_item(grupo.etiqueta, ESTADO_ERROR, error=str(e))
+                return []
+
+    print(f"⚙️ Iniciando procesamiento asíncrono con hasta {max_sesiones} sesiones simultáneas...")
+    async with async_playwright() as playwright:
+        browser = await playwright.chromium.launch(
+            headless=True, downloads_path=directorio_descargas_temporales()
+        )
+        autenticador = AsyncSerAuthenticator(browser, token_ser=request.token_ser)
+        try:
+            resultados = await asyncio.gather(
+                *(
+                    procesar_grupo_async(grupo, browser, autenticador)
+                    for grupo in grupos
+                )
+            )
+        finally:
+            await browser.close()
+
+    logs_generados_total = [log for logs in resultados for log in logs]
+    if not trabajo.cancelado:
+        await asyncio.to_thread(
+            manifiesto.reportar_shard, len(registros), len(logs_generados_total)
+        )
+    await asyncio.to_thread(manifiesto.cerrar, _ingesta_completa(trabajo))
+    await asyncio.to_thread(_liberar_si_completa, trabajo, download_folder)
+    print(f"🏁 Procesamiento asíncrono completado. Total registros procesados: {len(logs_generados_total)}")
+
+
+if __name__ == "__main__":
+    # Punto de entrada para Cloud Run Jobs: cada tarea procesa su shard
+    # (CLOUD_RUN_TASK_INDEX/COUNT) de la misma ingesta, cuyo id por defecto es
+    # el de la ejecución del job, compartido por todas sus tareas.
+    # Ej: SER_ANNOS=2024 SER_TRIMESTRES=1,2 python -m app.main
+    solicitud = PeriodicaRequest(
+        anno=[int(a) for a in os.environ["SER_ANNOS"].split(",")],
+        trimestre=[int(t) for t in os.environ["SER_TRIMESTRES"].split(",")],
+        token_ser=os.getenv("SER_TOKEN"),
+        ingestion_id=os.getenv("SER_INGESTION_ID")
+        or os.getenv("CLOUD_RUN_EXECUTION")
+        or str(uuid.uuid4()),
+    )
+    trabajo_cli = Trabajo(solicitud.ingestion_id, solicitud.model_dump(exclude={"token_ser"}))
+    try:
+        ejecutar_ingesta(solicitud, trabajo_cli, resolver_shard())
+    finally:
+        executor_ser.shutdown(wait=True)
+        get_browser_pool().shutdown()
+    estado_final, error_final = trabajo_cli.estado_final()
+    print(f"📤 Ingesta {solicitud.ingestion_id} terminó: {estado_final}.")
+    if estado_final != ESTADO_COMPLETADO:
+        # La tarea de Cloud Run Jobs queda fallida y se puede reintentar (reanuda)
+        raise SystemExit(error_final or estado_final)
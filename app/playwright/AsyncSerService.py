@@ -0,0 +1,837 @@
+import asyncio
+import os
+from datetime import date
+from typing import TYPE_CHECKING, Any, Dict, Set, Tuple
+
+from dotenv import load_dotenv
+from playwright.async_api import (
+    Browser,
+    BrowserContext,
+    Locator,
+    Page,
+    Playwright,
+    Route,
+    async_playwright,
+)
+from typing_extensions import List, Optional
+
+from app.playwright.CapturaEvidencia import CapturaEvidencia
+from app.playwright.FiltroRed import FiltroRed
+from app.playwright.SerWaiter import AsyncSerWaiter
+from app.playwright.ser_scripts import (
+    ESTADOS_FUR_OMITIDOS,
+    PATRON_URL_FUR,
+    SCRIPT_CLIC_HACIA_PAGINA,
+    SCRIPT_CONTROLES_FLOTANTES,
+    SCRIPT_EXPANDIR_FILAS,
+    SCRIPT_EXTRAER_FILAS,
+    SCRIPT_MOSTRAR_Y_POSICIONAR_FILTROS,
+    SCRIPT_OCULTAR_ELEMENTOS,
+    SCRIPT_OCULTAR_PIE,
+    SCRIPT_OPCIONES_OPERADOR,
+    SCRIPT_PAGINA_ACTUAL,
+    SCRIPT_TOTAL_PAGINAS,
+    SELECTOR_DROPDOWN_OPERADOR,
+    SELECTOR_EXPEDIENTE,
+    SELECTOR_FECHA_FIN,
+    SELECTOR_FECHA_INICIO,
+    SELECTOR_FILAS,
+    SELECTOR_FILAS_POR_PAGINA,
+    SELECTOR_FILTRO_OPERADOR,
+    SELECTOR_ICONO_FUR,
+    SELECTOR_OPCIONES_DROPDOWN,
+    TIPOS_SOLICITUD_FUR,
+    encabezados_reenviables,
+    extraer_pdf_de_respuesta,
+    normalizar_nombre_fur,
+    opcion_operador,
+    periodo_de_fecha,
+    repartir_paginas,
+    ruta_periodo,
+)
+from app.utils.colocacion_archivos import (
+    colocar_descarga_async,
+    directorio_descargas_temporales,
+)
+from app.utils.concurrencia import OPERACION_DESCARGA, OPERACION_NAVEGACION
+from app.utils.proteccion_ser import llamada_ser_async
+from app.utils.reintentos import ETAPA_BUSQUEDA, ETAPA_DESCARGA, reintentar_async
+
+# Cargar las variables de entorno desde el archivo .env
+if TYPE_CHECKING:
+    from app.playwright.SerAuthenticator import AsyncSerAuthenticator
+
+load_dotenv()
+
+
+class AsyncSerService:
+    """
+    Variante asíncrona de SerService sobre `playwright.async_api`.
+
+    Un solo event loop puede mantener decenas de sesiones del SER a la vez,
+    ya que las esperas y descargas no bloquean hilos. Comparte scripts y
+    reglas de clasificación con SerService, por lo que las carpetas y
+    capturas resultantes son idénticas.
+    """
+
+    def __init__(
+        self, browser: Optional[Browser] = None, download_path: Optional[str] = None
+    ):
+        """
+        Inicializa el servicio y las variables de estado.
+
+        Args:
+            browser (Browser): Navegador asíncrono compartido. Si se indica, cada
+                sesión abre solo un contexto nuevo en él; si no, lanza el suyo.
+            download_path (str): Carpeta de descargas de la ingesta. Por
+                defecto, DOWNLOAD_PATH.
+        """
+        self.ser_url = os.getenv("SER_URL")
+        self.ser_user = os.getenv("SER_USER")
+        self.ser_password = os.getenv("SER_PASSWORD")
+        self.ser_auth_cookie = os.getenv("SER_AUTH_COOKIE")
+        self.ser_url_consumo_fur = os.getenv("SER_URL_CONSUL_FUR")
+        self.download_path = download_path or os.getenv("DOWNLOAD_PATH", "descargas")
+        # Descarga de PDFs: "clic" (uno a uno con expect_download) o "concurrente"
+        self.descarga_modo = os.getenv("SER_DESCARGA_MODO", "clic")
+        self.descarga_paralelismo = int(os.getenv("SER_DESCARGA_PARALELISMO", "6"))
+        # Sube las filas por página del paginador al máximo antes de recorrerlo
+        self.filas_por_pagina_max = os.getenv("SER_FILAS_POR_PAGINA_MAX", "1") == "1"
+        # Máximo de pestañas del mismo contexto que recorren el paginador en paralelo
+        self.paginas_pestanas = max(1, int(os.getenv("SER_PAGINAS_PESTANAS", "1")))
+        # Llenado del formulario de consulta: "rapido" o "compatible"
+        self.busqueda_modo = os.getenv("SER_BUSQUEDA_MODO", "rapido")
+
+        if not self.ser_url or not self.ser_auth_cookie or not self.ser_url_consumo_fur:
+            raise ValueError(
+                "Las variables de entorno SER_URL, SER_AUTH_COOKIE y SER_URL_CONSUL_FUR deben estar definidas."
+            )
+
+        self.shared_browser = browser
+        self.playwright: Playwright | None = None
+        self.browser: Browser | None = None
+        self.context: BrowserContext | None = None
+        self.page: Page | None = None
+        self.waiter: AsyncSerWaiter | None = None
+        self._ultima_busqueda: Optional[Tuple[str, str, date, date]] = None
+        self._opciones_operador: Optional[List[str]] = None
+        self.filtro_red: FiltroRed | None = None
+        self.evidencia = CapturaEvidencia()
+        # Filas (página, fila) cuyo FUR no se pudo descargar ni con reintentos
+        self._filas_fallidas: Set[Tuple[int, int]] = set()
+
+    async def _nuevo_contexto(self, **context_options: Any) -> BrowserContext:
+        if self.shared_browser:
+            browser = self.shared_browser
+        else:
+            self.playwright = await async_playwright().start()
+            self.browser = await self.playwright.chromium.launch(
+                headless=True, downloads_path=directorio_descargas_temporales()
+            )
+            browser = self.browser
+
+        # Contexto con viewport de alta resolución para capturas de mejor calidad
+        self.context = await browser.new_context(
+            viewport={"width": 1920, "height": 1080},
+            device_scale_factor=2,
+            accept_downloads=True,
+            **context_options,
+        )
+
+        self.filtro_red = FiltroRed.desde_entorno(self.ser_url, self.ser_url_consumo_fur)
+        if self.filtro_red:
+            await self.filtro_red.instalar_async(self.context)
+        return self.context
+
+    async def _nueva_pagina(self, context: BrowserContext) -> Page:
+        """Abre la página de trabajo de la sesión junto con su capa de esperas."""
+        self.page = await context.new_page()
+        self.waiter = AsyncSerWaiter(self.page)
+        return self.page
+
+    async def login(self):
+        """
+        Inicia sesión en el portal del SER usando las credenciales.
+        """
+        print("Iniciando sesión (async) en el SER con credenciales...")
+        context = await self._nuevo_contexto()
+        await self._nueva_pagina(context)
+
+        async with llamada_ser_async(OPERACION_NAVEGACION):
+            await self.page.goto(f"{self.ser_url}")
+        await self.page.locator("#Usuario").fill(self.ser_user)  # type: ignore
+        await self.page.locator("#Clave").fill(self.ser_password)  # type: ignore
+
+        # Esperamos a que terminen de cargar los scripts del login (incluido el CAPTCHA)
+        await self.waiter.esperar_red_inactiva("login")  # type: ignore
+
+        # Modificar la función ValidadCaptcha para que siempre retorne true
+        await self.page.evaluate("window.ValidadCaptcha = function() { return true; };")
+        await self.page.locator("#aceptar").click()
+
+        try:
+            await self.page.wait_for_url("**/principal/index**", timeout=15000)
+            print("¡Sesión iniciada con éxito!")
+        except Exception as e:
+            print(f"La página no redirigió a la URL esperada. Error: {e}")
+            raise PermissionError("Las credenciales son inválidas o el login falló.")
+
+    async def start_session(self, token_ser: str):
+        """
+        Abre un contexto y se autentica inyectando el token en el localStorage.
+        """
+        print("Iniciando sesión (async) en el SER con token de localStorage...")
+        context = await self._nuevo_contexto()
+        await self._nueva_pagina(context)
+
+        async with llamada_ser_async(OPERACION_NAVEGACION):
+            await self.page.goto(self.ser_url, wait_until="domcontentloaded")  # type: ignore
+        await self.page.evaluate(
+            "(token) => { localStorage.setItem('auth-token', token); }",
+            token_ser,
+        )
+        async with llamada_ser_async(OPERACION_NAVEGACION):
+            await self.page.goto(self.ser_url_consumo_fur, wait_until="networkidle")  # type: ignore
+
+        try:
+            await self.page.wait_for_selector("p-dropdown", timeout=15000)
+            print("¡Sesión iniciada con éxito! Elemento post-login encontrado.")
+        except Exception:
+            print(
+                "Error: No se pudo verificar la sesión. El token puede ser inválido o ha expirado."
+            )
+            raise PermissionError(
+                "El token de autenticación es inválido o ha expirado. "
+                "No se pudo encontrar el contenido esperado después del login."
+            )
+
+    async def _verificar_consulta(self) -> bool:
+        """
+        Confirma si la sesión es válida: el dropdown de operador aparece con
+        sesión válida y el formulario de login aparece si expiró.
+        """
+        try:
+            await self.page.wait_for_selector("p-dropdown, #Usuario", timeout=15000)  # type: ignore
+            return await self.page.locator("p-dropdown").count() > 0  # type: ignore
+        except Exception:
+            return False
+
+    async def start_session_from_state(
+        self, autenticador: "AsyncSerAuthenticator", intentos: int = 2
+    ):
+        """
+        Inicia la sesión sembrando el contexto con el `storage_state` compartido
+        de la ingesta, sin pasar por el login ni por la inyección del token.
+        Si el contexto detecta que la sesión expiró, pide una nueva autenticación.
+        """
+        for intento in range(1, intentos + 1):
+            storage_state, generacion = await autenticador.obtener_storage_state()
+            context = await self._nuevo_contexto(storage_state=storage_state)
+            await self._nueva_pagina(context)
+
+            print(f"Navegando (async) con sesión compartida a: {self.ser_url_consumo_fur}")
+            async with llamada_ser_async(OPERACION_NAVEGACION):
+                await self.page.goto(self.ser_url_consumo_fur, wait_until="networkidle")  # type: ignore
+
+            if await self._verificar_consulta():
+                print("¡Sesión compartida válida! Elemento post-login encontrado.")
+                return
+
+            print(
+                f"⚠️ La sesión compartida expiró (intento {intento}/{intentos}). Reautenticando..."
+            )
+            autenticador.invalidar(generacion)
+            await self.close_session()
+
+        raise PermissionError(
+            "No se pudo iniciar la sesión con el storage_state compartido."
+        )
+
+    async def buscar_data(
+        self, nitOperador: str, expediente: str, fechaInicial: date, fechaFinal: date
+    ):
+        """
+        Con una sesión ya iniciada, se buscan los datos llenando el formulario y haciendo clic.
+        """
+        if not self.page:
+            raise ConnectionError(
+                "La sesión no ha sido iniciada. Llama a start_session() primero."
+            )
+        # Se recuerda la búsqueda para repetirla en las pestañas adicionales
+        self._ultima_busqueda = (nitOperador, expediente, fechaInicial, fechaFinal)
+        await self._buscar_en(self.page, self.waiter, *self._ultima_busqueda)  # type: ignore
+
+    async def _buscar_en(
+        self,
+        page: Page,
+        waiter: AsyncSerWaiter,
+        nitOperador: str,
+        expediente: str,
+        fechaInicial: date,
+        fechaFinal: date,
+    ):
+        """
+        Búsqueda en una pestaña. Si falla, se recarga la consulta y se repite
+        solo la búsqueda (política ETAPA_BUSQUEDA); agotados los intentos se
+        relanza el error.
+        """
+        fecha_ini_str = fechaInicial.strftime("%d/%m/%Y")
+        fecha_fin_str = fechaFinal.strftime("%d/%m/%Y")
+        print(
+            f"Buscando datos para NIT: {nitOperador}, Periodo: {fecha_ini_str} a {fecha_fin_str}..."
+        )
+
+        async def _buscar():
+            async with llamada_ser_async(OPERACION_NAVEGACION):
+                await page.goto(self.ser_url_consumo_fur, wait_until="networkidle")  # type: ignore
+
+            await self._seleccionar_operador(page, str(nitOperador))
+
+            if self.busqueda_modo == "compatible":
+                await self._llenar_campos_tecleando(
+                    page, str(expediente), fecha_ini_str, fecha_fin_str
+                )
+            else:
+                await self._llenar_campos_rapido(
+                    page, str(expediente), fecha_ini_str, fecha_fin_str
+                )
+
+            print("Haciendo clic en el botón 'Consultar'...")
+            await page.locator("button:has-text('Consultar')").click()
+
+            await page.evaluate(SCRIPT_CONTROLES_FLOTANTES)
+            await waiter.esperar_tabla("consulta")
+
+        try:
+            await reintentar_async(_buscar, ETAPA_BUSQUEDA, f"Búsqueda del NIT {nitOperador}")
+        except LookupError:
+            raise
+        except Exception as e:
+            print(f"Error durante la búsqueda de datos para NIT {nitOperador}: {e}")
+            # Sin búsqueda no hay tabla que recorrer: el ítem queda para reanudar
+            raise
+
+    async def _seleccionar_operador(self, page: Page, nit: str):
+        """
+        Selecciona el operador en el dropdown; en modo rápido usa la lista de
+        opciones cacheada por sesión (ver SerService._seleccionar_operador).
+        """
+        await page.locator(SELECTOR_DROPDOWN_OPERADOR).first.click()
+        if self._opciones_operador is None and self.busqueda_modo != "compatible":
+            self._opciones_operador = await page.evaluate(SCRIPT_OPCIONES_OPERADOR)
+
+        await page.locator(SELECTOR_FILTRO_OPERADOR).fill(nit)
+        if self._opciones_operador and self.busqueda_modo != "compatible":
+            etiqueta = opcion_operador(self._opciones_operador, nit)
+            if etiqueta is None:
+                await page.keyboard.press("Escape")
+                raise LookupError(
+                    f"El NIT {nit} no está en la lista de operadores del SER."
+                )
+            await page.locator("li[role='option']").filter(
+                has_text=etiqueta
+            ).first.click()
+            return
+
+        option_to_select = page.locator(f"li[role='option']:has-text('{nit}')")
+        await option_to_select.wait_for(state="visible", timeout=15000)
+        await option_to_select.click()
+
+    async def _llenar_campos_rapido(
+        self, page: Page, expediente: str, fecha_ini_str: str, fecha_fin_str: str
+    ):
+        for selector, valor in (
+            (SELECTOR_EXPEDIENTE, expediente),
+            (SELECTOR_FECHA_INICIO, fecha_ini_str),
+            (SELECTOR_FECHA_FIN, fecha_fin_str),
+        ):
+            campo = page.locator(selector)
+            await campo.fill(valor)
+            await campo.dispatch_event("blur")
+
+    async def _llenar_campos_tecleando(
+        self, page: Page, expediente: str, fecha_ini_str: str, fecha_fin_str: str
+    ):
+        expediente_input = page.locator(SELECTOR_EXPEDIENTE)
+        await expediente_input.clear()
+        await expediente_input.type(expediente, delay=150)
+
+        fecha_inicio_input = page.locator(SELECTOR_FECHA_INICIO)
+        await fecha_inicio_input.click()
+        await fecha_inicio_input.clear()
+        await fecha_inicio_input.type(fecha_ini_str, delay=100)
+
+        fecha_fin_input = page.locator(SELECTOR_FECHA_FIN)
+        await fecha_fin_input.click()
+        await fecha_fin_input.clear()
+        await fecha_fin_input.type(fecha_fin_str, delay=100)
+
+    async def descargar_y_clasificar_furs_paginado(
+        self, nit: str, anio: int, expediente: int, seccion: str, trimestres: List[int]
+    ):
+        """
+        Navega a través de la paginación, toma capturas de pantalla de filas colapsadas y expandidas,
+        y descarga todos los PDFs, clasificándolos en carpetas por año y trimestre.
+
+        Con SER_PAGINAS_PESTANAS mayor a 1, las páginas se reparten en rangos
+        contiguos entre la pestaña actual y pestañas adicionales del mismo
+        contexto autenticado, que se procesan en paralelo.
+        """
+        if not self.page or self.page.is_closed():
+            print("Error: La página no está disponible o ha sido cerrada.")
+            return
+
+        print(
+            f"--- Iniciando descarga y clasificación (async) para NIT {nit}, año de búsqueda {anio} ---"
+        )
+
+        created_period_paths: Set[str] = set()
+        base_search_year_path = ruta_periodo(
+            self.download_path, seccion, anio, nit, expediente
+        )
+        os.makedirs(base_search_year_path, exist_ok=True)
+        self._filas_fallidas = set()
+
+        await self.page.evaluate(SCRIPT_OCULTAR_PIE)
+
+        if self.filas_por_pagina_max:
+            await self._maximizar_filas_por_pagina(self.page, self.waiter)  # type: ignore
+
+        await self.waiter.esperar_tabla("pagina-1")  # type: ignore
+        total_paginas = await self.page.evaluate(SCRIPT_TOTAL_PAGINAS)
+        pestanas = min(self.paginas_pestanas, total_paginas)
+
+        argumentos = (nit, expediente, seccion, base_search_year_path, created_period_paths)
+        if pestanas > 1 and self._ultima_busqueda:
+            rangos = repartir_paginas(total_paginas, pestanas)
+            print(
+                f"  -> {total_paginas} páginas repartidas en {pestanas} pestañas: {rangos}"
+            )
+            primer_inicio, primer_fin = rangos[0]
+            resultados = list(
+                await asyncio.gather(
+                    self._procesar_rango(
+                        self.page, self.waiter, primer_inicio, primer_fin, *argumentos  # type: ignore
+                    ),
+                    *(
+                        self._procesar_rango_en_pestana(inicio, fin, *argumentos)
+                        for inicio, fin in rangos[1:]
+                    ),
+                )
+            )
+            # Los rangos de una pestaña que falló se recorren en la pestaña principal
+            for (inicio, fin), resultado in zip(rangos, resultados):
+                if resultado is None:
+                    print(f"  -> Reintentando las páginas {inicio}-{fin} en la pestaña principal...")
+                    await self._ir_a_pagina(self.page, self.waiter, inicio)  # type: ignore
+                    resultados.append(
+                        await self._procesar_rango(
+                            self.page, self.waiter, inicio, fin, *argumentos  # type: ignore
+                        )
+                    )
+            resultados = [r for r in resultados if r is not None]
+        else:
+            resultados = [
+                await self._procesar_rango(
+                    self.page, self.waiter, 1, None, *argumentos  # type: ignore
+                )
+            ]
+
+        # Se unen las capturas de todas las pestañas en orden de página
+        capturas = sorted(c for resultado in resultados for c in resultado)
+        screenshot_colapsada_paths = [col for _, col, _ in capturas if col]
+        screenshot_expandida_paths = [exp for _, _, exp in capturas if exp]
+
+        # --- FASE 4: VERIFICAR TRIMESTRES FALTANTES ---
+        for trimestre in trimestres:
+            expected_period_path = os.path.join(base_search_year_path, f"{trimestre}T")
+            if expected_period_path not in created_period_paths:
+                os.makedirs(expected_period_path, exist_ok=True)
+                created_period_paths.add(expected_period_path)
+
+        self.waiter.imprimir_resumen(f"NIT {nit}")  # type: ignore
+
+        # --- FASE 5: COPIA DINÁMICA DE IMÁGENES DE EVIDENCIA ---
+        # Cada captura se escribe en los períodos desde su buffer ya codificado
+        all_screenshots = screenshot_colapsada_paths + screenshot_expandida_paths
+        for img_path in all_screenshots:
+            self.evidencia.replicar(img_path, sorted(created_period_paths))
+        await self.evidencia.esperar_async()
+
+        if self._filas_fallidas:
+            # Subir el período incompleto perdería FURs sin rastro: el ítem
+            # falla y la ingesta se puede reanudar con el mismo ingestion_id
+            raise RuntimeError(
+                f"{len(self._filas_fallidas)} FURs del NIT {nit} no se pudieron "
+                "descargar tras los reintentos."
+            )
+
+    async def _procesar_rango_en_pestana(
+        self,
+        inicio: int,
+        fin: int,
+        nit: str,
+        expediente: int,
+        seccion: str,
+        base_search_year_path: str,
+        created_period_paths: Set[str],
+    ) -> Optional[List[Tuple[int, Optional[str], Optional[str]]]]:
+        """
+        Abre una pestaña en el mismo contexto, repite la búsqueda, salta a la
+        página `inicio` y procesa las páginas hasta `fin`. Devuelve None si la
+        pestaña falla, para que el rango se recorra en la pestaña principal.
+        """
+        pestana = await self.context.new_page()  # type: ignore
+        waiter = AsyncSerWaiter(pestana)
+        try:
+            await self._buscar_en(pestana, waiter, *self._ultima_busqueda)  # type: ignore
+            await pestana.evaluate(SCRIPT_OCULTAR_PIE)
+            if self.filas_por_pagina_max:
+                await self._maximizar_filas_por_pagina(pestana, waiter)
+            await self._ir_a_pagina(pestana, waiter, inicio)
+            return await self._procesar_rango(
+                pestana,
+                waiter,
+                inicio,
+                fin,
+                nit,
+                expediente,
+                seccion,
+                base_search_year_path,
+                created_period_paths,
+            )
+        except Exception as e:
+            print(f"  -> ERROR en la pestaña de las páginas {inicio}-{fin}: {e}")
+            return None
+        finally:
+            self.waiter.mediciones.extend(waiter.mediciones)  # type: ignore
+            await pestana.close()
+
+    async def _ir_a_pagina(self, page: Page, waiter: AsyncSerWaiter, objetivo: int):
+        """Avanza el paginador de una pestaña hasta la página `objetivo`."""
+        for _ in range(objetivo + 5):
+            if await page.evaluate(SCRIPT_PAGINA_ACTUAL) == objetivo:
+                return
+            destino = await page.evaluate(SCRIPT_CLIC_HACIA_PAGINA, objetivo)
+            if destino < 0:
+                break
+            await waiter.esperar_pagina(destino)
+        raise RuntimeError(f"No se pudo llegar a la página {objetivo} del paginador.")
+
+    async def _procesar_rango(
+        self,
+        page: Page,
+        waiter: AsyncSerWaiter,
+        inicio: int,
+        fin: Optional[int],
+        nit: str,
+        expediente: int,
+        seccion: str,
+        base_search_year_path: str,
+        created_period_paths: Set[str],
+    ) -> List[Tuple[int, Optional[str], Optional[str]]]:
+        """
+        Procesa páginas consecutivas desde `inicio` (la página ya visible) hasta
+        `fin`, o hasta la última si `fin` es None. Devuelve las capturas por página.
+        """
+        capturas: List[Tuple[int, Optional[str], Optional[str]]] = []
+        page_num = inicio
+        while True:
+            colapsada, expandida = await self._procesar_pagina(
+                page,
+                waiter,
+                page_num,
+                nit,
+                expediente,
+                seccion,
+                base_search_year_path,
+                created_period_paths,
+            )
+            capturas.append((page_num, colapsada, expandida))
+
+            # --- FASE 3: NAVEGAR A LA SIGUIENTE PÁGINA ---
+            if fin is not None and page_num >= fin:
+                break
+            next_button = page.locator("button.p-paginator-next")
+            if await next_button.count() == 0 or await next_button.is_disabled():
+                print(
+                    "--- Fin de la paginación. Es la última página o no hay paginador. ---"
+                )
+                break
+
+            await next_button.click()
+            page_num += 1
+            await waiter.esperar_pagina(page_num)
+        return capturas
+
+    async def _procesar_pagina(
+        self,
+        page: Page,
+        waiter: AsyncSerWaiter,
+        page_num: int,
+        nit: str,
+        expediente: int,
+        seccion: str,
+        base_search_year_path: str,
+        created_period_paths: Set[str],
+    ) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Toma las capturas colapsada y expandida de la página visible y descarga
+        sus PDFs. Devuelve las rutas de ambas capturas.
+        """
+        print(f"\n--- Procesando página {page_num} ---")
+
+        await waiter.esperar_tabla(f"pagina-{page_num}")
+
+        await page.evaluate(SCRIPT_MOSTRAR_Y_POSICIONAR_FILTROS)
+
+        # --- Captura Colapsada ---
+        captura = await page.screenshot(
+            full_page=True, **self.evidencia.opciones_screenshot("colapsada")
+        )
+        [screenshot_colapsada_path] = self.evidencia.guardar(
+            "colapsada",
+            captura,
+            f"{nit}-colapsada-pag-{page_num}",
+            [base_search_year_path],
+        )
+
+        await page.evaluate(SCRIPT_OCULTAR_ELEMENTOS)
+
+        # --- Expandir todas las filas (un solo script para toda la página) ---
+        screenshot_expandida_path = None
+        filas_expandidas = await page.evaluate(SCRIPT_EXPANDIR_FILAS)
+        if filas_expandidas > 0:
+            print(f"  -> Expandiendo {filas_expandidas} filas...")
+            await waiter.esperar_dom_estable("expandir", "div.p-datatable-wrapper")
+
+            # --- Captura Expandida ---
+            captura = await page.screenshot(
+                full_page=True, **self.evidencia.opciones_screenshot("expandida")
+            )
+            [screenshot_expandida_path] = self.evidencia.guardar(
+                "expandida",
+                captura,
+                f"{nit}-expandida-pag-{page_num}",
+                [base_search_year_path],
+            )
+        else:
+            print("  -> No se encontraron filas para expandir en esta página.")
+
+        # --- FASE 2: PROCESAR FILAS Y DESCARGAR PDFS ---
+        filas = await page.evaluate(SCRIPT_EXTRAER_FILAS)
+        rows = page.locator(SELECTOR_FILAS)
+        print(f"  -> Procesando {len(filas)} filas en la página {page_num}...")
+        pendientes: List[Tuple[int, int, Dict[str, Any], str]] = []
+
+        for fila in filas:
+            i = fila["indice"]
+            if fila["expansion"]:
+                continue
+
+            try:
+                estado_fur_str = fila["estado"]
+                if estado_fur_str in ESTADOS_FUR_OMITIDOS:
+                    print(
+                        f"     -> Fila {i + 1}: Omitiendo, estado es '{estado_fur_str.capitalize()}'."
+                    )
+                    continue
+
+                anio_real, trimestre = periodo_de_fecha(fila["fecha_inicial"])
+
+                period_path = ruta_periodo(
+                    self.download_path, seccion, anio_real, nit, expediente, trimestre
+                )
+                os.makedirs(period_path, exist_ok=True)
+                created_period_paths.add(period_path)
+
+                if fila["tiene_descarga"]:
+                    pdf_icon = rows.nth(i).locator(SELECTOR_ICONO_FUR)
+                    if self.descarga_modo == "concurrente":
+                        solicitud = await self._capturar_solicitud_fur(page, pdf_icon)
+                        if solicitud:
+                            pendientes.append((page_num, i + 1, solicitud, period_path))
+                            continue
+
+                    async def _descargar_con_clic() -> str:
+                        async with llamada_ser_async(OPERACION_DESCARGA), page.expect_download(
+                            timeout=60000
+                        ) as dl_info:
+                            await pdf_icon.click()
+
+                        download = await dl_info.value
+                        new_filename = normalizar_nombre_fur(download.suggested_filename)
+                        return await colocar_descarga_async(
+                            download, [os.path.join(period_path, new_filename)]
+                        )
+
+                    # Un fallo repite solo la descarga de esta fila. Si el rango se
+                    # recorre de nuevo en la pestaña principal, un éxito la rehabilita
+                    try:
+                        save_path = await reintentar_async(
+                            _descargar_con_clic, ETAPA_DESCARGA, f"Descarga de la fila {i + 1}"
+                        )
+                    except Exception:
+                        self._filas_fallidas.add((page_num, i + 1))
+                        raise
+                    self._filas_fallidas.discard((page_num, i + 1))
+
+                    print(
+                        f"     -> Fila {i + 1}: FUR {fila['fur']} del {anio_real}-T{trimestre} guardado en {save_path}."
+                    )
+                else:
+                    print(
+                        f"     -> Fila {i + 1}: No se encontró ícono de descarga."
+                    )
+
+            except Exception as e:
+                print(f"     -> ERROR procesando fila {i + 1}: {e}")
+
+        if pendientes:
+            await self._descargar_solicitudes_fur(pendientes)
+
+        return screenshot_colapsada_path, screenshot_expandida_path
+
+    async def _maximizar_filas_por_pagina(self, page: Page, waiter: AsyncSerWaiter):
+        """
+        Sube el selector de filas por página del paginador a la opción más alta.
+        """
+        selector_filas = page.locator(SELECTOR_FILAS_POR_PAGINA)
+        if await selector_filas.count() == 0:
+            return
+        try:
+            await selector_filas.first.click()
+            opciones = page.locator(SELECTOR_OPCIONES_DROPDOWN)
+            valores = [
+                int(texto.strip())
+                for texto in await opciones.all_inner_texts()
+                if texto.strip().isdigit()
+            ]
+            if not valores:
+                await page.keyboard.press("Escape")
+                return
+            maximo = max(valores)
+            print(f"  -> Mostrando {maximo} filas por página.")
+            await opciones.filter(has_text=str(maximo)).first.click()
+            await waiter.esperar_tabla("filas-por-pagina")
+        except Exception as e:
+            print(f"  -> No se pudo ajustar las filas por página: {e}")
+
+    async def _capturar_solicitud_fur(
+        self, page: Page, pdf_icon: Locator
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Hace clic en el ícono de un FUR interceptando (y abortando) la petición
+        que dispara hacia la URL de FURs (PATRON_URL_FUR), para repetirla después con el APIRequestContext.
+        """
+        capturada: Dict[str, Any] = {}
+
+        async def interceptar(route: Route):
+            request = route.request
+            if not capturada and request.resource_type in TIPOS_SOLICITUD_FUR:
+                capturada.update(
+                    url=request.url,
+                    method=request.method,
+                    headers=request.headers,
+                    post_data=request.post_data_buffer,
+                )
+                await route.abort()
+            else:
+                # fallback (no continue_) para que la ruta del contexto de
+                # FiltroRed siga decidiendo sobre las demás peticiones
+                await route.fallback()
+
+        await page.route(PATRON_URL_FUR, interceptar)
+        try:
+            async with page.expect_event(
+                "requestfailed",
+                predicate=lambda r: bool(capturada) and r.url == capturada["url"],
+                timeout=15000,
+            ):
+                await pdf_icon.click()
+        except Exception as e:
+            print(f"     -> No se pudo interceptar la petición del PDF: {e}")
+        finally:
+            await page.unroute(PATRON_URL_FUR, interceptar)
+        return capturada or None
+
+    async def _descargar_solicitudes_fur(
+        self, pendientes: List[Tuple[int, int, Dict[str, Any], str]]
+    ):
+        """
+        Repite las peticiones de PDF capturadas a través del APIRequestContext del
+        contexto (que comparte sus cookies), con a lo sumo SER_DESCARGA_PARALELISMO
+        peticiones en vuelo, y guarda cada FUR en la carpeta de su período. Cada
+        petición se reintenta por separado (ETAPA_DESCARGA); las que fallan
+        quedan en `_filas_fallidas`.
+        """
+        semaforo = asyncio.Semaphore(self.descarga_paralelismo)
+
+        async def _solicitar(solicitud: Dict[str, Any]) -> Tuple[bytes, str]:
+            async with llamada_ser_async(OPERACION_DESCARGA):
+                respuesta = await self.context.request.fetch(  # type: ignore
+                    solicitud["url"],
+                    method=solicitud["method"],
+                    headers=encabezados_reenviables(solicitud["headers"]),
+                    data=solicitud["post_data"],
+                    timeout=60000,
+                )
+                if not respuesta.ok:
+                    raise ConnectionError(f"HTTP {respuesta.status}")
+                return extraer_pdf_de_respuesta(
+                    respuesta.headers.get("content-type", ""),
+                    await respuesta.body(),
+                    respuesta.headers.get("content-disposition", ""),
+                    solicitud["url"],
+                )
+
+        async def _descargar(
+            pagina: int, fila: int, solicitud: Dict[str, Any], period_path: str
+        ):
+            async with semaforo:
+                try:
+                    contenido, nombre = await reintentar_async(
+                        lambda: _solicitar(solicitud),
+                        ETAPA_DESCARGA,
+                        f"Descarga de la fila {fila}",
+                    )
+                    save_path = os.path.join(period_path, normalizar_nombre_fur(nombre))
+                    await asyncio.to_thread(_escribir_archivo, save_path, contenido)
+                    print(f"     -> Fila {fila}: PDF guardado en {save_path}.")
+                    self._filas_fallidas.discard((pagina, fila))
+                except Exception as e:
+                    print(f"     -> ERROR descargando el PDF de la fila {fila}: {e}")
+                    self._filas_fallidas.add((pagina, fila))
+
+        print(
+            f"  -> Descargando {len(pendientes)} PDFs en paralelo ({self.descarga_paralelismo} a la vez)..."
+        )
+        await asyncio.gather(*(_descargar(*pendiente) for pendiente in pendientes))
+
+    async def close_session(self):
+        """
+        Cierra el contexto de la sesión y, si la sesión lanzó su propio navegador,
+        también el navegador y Playwright.
+        """
+        if self.filtro_red:
+            self.filtro_red.imprimir_resumen("la sesión")
+            self.filtro_red = None
+        if self.context:
+            try:
+                await self.context.close()
+            except Exception:
+                pass
+            self.context = None
+        if self.browser:
+            await self.browser.close()
+            self.browser = None
+            print("Navegador cerrado.")
+        if self.playwright:
+            await self.playwright.stop()
+            self.playwright = None
+            print("Sesión de Playwright finalizada.")
+
+
+def _escribir_archivo(path: str, contenido: bytes):
+    with open(path, "wb") as archivo:
+        archivo.write(contenido)
@@ -0,0 +1,215 @@
+import os
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, Iterator, Optional
+
+from playwright.sync_api import Browser, BrowserContext, Playwright, sync_playwright
+
+from app.utils.colocacion_archivos import directorio_descargas_temporales
+
+# La API síncrona de Playwright no es thread-safe: un driver y sus navegadores
+# solo pueden usarse desde el hilo que los creó. Por eso el pool mantiene un
+# navegador de larga vida por hilo de trabajo y entrega contextos nuevos de él.
+_launch_lock = threading.Lock()
+
+
+@dataclass
+class _BrowserSlot:
+    thread: threading.Thread
+    playwright: Playwright
+    browser: Browser
+    contextos_creados: int = 0
+    contextos_activos: Dict[int, BrowserContext] = field(default_factory=dict)  # type: ignore
+
+
+class BrowserPool:
+    """
+    Pool de navegadores Chromium compartido por todo el proceso.
+
+    Cada hilo de trabajo toma prestado un navegador de larga vida (uno por hilo,
+    hasta `size`) y por cada ítem recibe un `BrowserContext` nuevo mediante
+    `checkout()`, que debe devolverse con `checkin()`. Así el costo por registro
+    es un contexto nuevo y no un driver de Node más un proceso de Chromium.
+    """
+
+    def __init__(
+        self,
+        size: Optional[int] = None,
+        headless: bool = True,
+        max_contextos_por_navegador: Optional[int] = None,
+    ):
+        """
+        Args:
+            size (int): Número máximo de navegadores vivos (uno por hilo de trabajo).
+            headless (bool): Lanza Chromium sin interfaz gráfica.
+            max_contextos_por_navegador (int): Contextos servidos antes de reciclar
+                el navegador para contener fugas de memoria de Chromium.
+        """
+        self.size = size or int(os.getenv("SER_BROWSER_POOL_SIZE", "4"))
+        self.headless = headless
+        self.max_contextos_por_navegador = max_contextos_por_navegador or int(
+            os.getenv("SER_BROWSER_MAX_CONTEXTOS", "50")
+        )
+        self._lock = threading.Lock()
+        self._slots: Dict[int, _BrowserSlot] = {}
+
+    # ------------------------------------------------------------------
+    # Gestión de navegadores por hilo
+    # ------------------------------------------------------------------
+    def _lanzar_slot(self) -> _BrowserSlot:
+        with _launch_lock:
+            playwright = sync_playwright().start()
+            browser = playwright.chromium.launch(
+                headless=self.headless,
+                downloads_path=directorio_descargas_temporales(),
+            )
+        print(
+            f"🌐 Navegador del pool lanzado para el hilo {threading.current_thread().name}."
+        )
+        return _BrowserSlot(
+            thread=threading.current_thread(), playwright=playwright, browser=browser
+        )
+
+    def _cerrar_slot(self, slot: _BrowserSlot):
+        for context in list(slot.contextos_activos.values()):
+            try:
+                context.close()
+            except Exception:
+                pass
+        slot.contextos_activos.clear()
+        try:
+            slot.browser.close()
+        except Exception:
+            pass
+        try:
+            slot.playwright.stop()
+        except Exception:
+            pass
+
+    def _slot_actual(self) -> _BrowserSlot:
+        thread_id = threading.get_ident()
+        with self._lock:
+            slot = self._slots.get(thread_id)
+            if slot is None:
+                self._descartar_slots_huerfanos()
+                if len(self._slots) >= self.size:
+                    raise RuntimeError(
+                        f"El pool de navegadores está lleno ({self.size}). "
+                        "Usa tantos hilos de trabajo como navegadores tenga el pool."
+                    )
+
+        if slot is not None and not self._slot_saludable(slot):
+            print("⚠️ Navegador del pool no saludable. Relanzando...")
+            self._cerrar_slot(slot)
+            slot = None
+
+        if slot is None:
+            slot = self._lanzar_slot()
+            with self._lock:
+                self._slots[thread_id] = slot
+        return slot
+
+    def _slot_saludable(self, slot: _BrowserSlot) -> bool:
+        if not slot.browser.is_connected():
+            return False
+        # Reciclamos el navegador solo cuando no tiene contextos prestados.
+        if (
+            slot.contextos_creados >= self.max_contextos_por_navegador
+            and not slot.contextos_activos
+        ):
+            return False
+        return True
+
+    def _descartar_slots_huerfanos(self):
+        """
+        Olvida los navegadores cuyos hilos ya terminaron. Sus procesos mueren
+        con el driver, que no puede cerrarse desde otro hilo.
+        """
+        for thread_id, slot in list(self._slots.items()):
+            if not slot.thread.is_alive():
+                del self._slots[thread_id]
+
+    # ------------------------------------------------------------------
+    # API de préstamo
+    # ------------------------------------------------------------------
+    def checkout(self, **context_options: Any) -> BrowserContext:
+        """
+        Entrega un `BrowserContext` nuevo del navegador del hilo actual.
+        Las opciones se pasan tal cual a `browser.new_context`.
+        """
+        slot = self._slot_actual()
+        opciones: Dict[str, Any] = {
+            "viewport": {"width": 1920, "height": 1080},
+            "device_scale_factor": 2,
+            "accept_downloads": True,
+        }
+        opciones.update(context_options)
+        context = slot.browser.new_context(**opciones)
+        slot.contextos_creados += 1
+        slot.contextos_activos[id(context)] = context
+        return context
+
+    def checkin(self, context: BrowserContext):
+        """
+        Devuelve un contexto prestado al pool cerrándolo. El navegador sigue vivo.
+        """
+        slot = self._slots.get(threading.get_ident())
+        if slot is not None:
+            slot.contextos_activos.pop(id(context), None)
+        try:
+            context.close()
+        except Exception as e:
+            print(f"⚠️ No se pudo cerrar el contexto devuelto al pool: {e}")
+
+    @contextmanager
+    def contexto(self, **context_options: Any) -> Iterator[BrowserContext]:
+        """Presta un contexto y lo devuelve al salir del bloque `with`."""
+        context = self.checkout(**context_options)
+        try:
+            yield context
+        finally:
+            self.checkin(context)
+
+    def health_check(self) -> Dict[str, Any]:
+        """Resumen del estado de los navegadores del pool."""
+        with self._lock:
+            self._descartar_slots_huerfanos()
+            return {
+                "size": self.size,
+                "navegadores": [
+                    {
+                        "hilo": slot.thread.name,
+                        "conectado": slot.browser.is_connected(),
+                        "contextos_creados": slot.contextos_creados,
+                        "contextos_activos": len(slot.contextos_activos),
+                    }
+                    for slot in self._slots.values()
+                ],
+            }
+
+    def close_current_thread(self):
+        """Cierra el navegador del hilo actual, si existe."""
+        with self._lock:
+            slot = self._slots.pop(threading.get_ident(), None)
+        if slot is not None:
+            self._cerrar_slot(slot)
+
+    def shutdown(self):
+        """
+        Cierra todos los navegadores del pool. Los que pertenecen a otros hilos se
+        cierran en la medida de lo posible; al terminar el proceso muere el driver.
+        """
+        with self._lock:
+            slots = list(self._slots.values())
+            self._slots.clear()
+        for slot in slots:
+            self._cerrar_slot(slot)
+        print("🌐 Pool de navegadores cerrado.")
+
+
+@lru_cache()
+def get_browser_pool() -> BrowserPool:
+    """Devuelve el pool de navegadores único del proceso."""
+    return BrowserPool()
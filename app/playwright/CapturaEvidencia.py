@@ -0,0 +1,219 @@
+import asyncio
+import io
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional
+
+from app.utils.colocacion_archivos import guardar_por_contenido
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow es opcional: sin él solo hay PNG y JPEG de Playwright
+    Image = None
+
+EXTENSIONES = {"png": ".png", "jpeg": ".jpg", "webp": ".webp"}
+# Extensiones de las capturas de evidencia, para clasificarlas como imágenes.
+EXTENSIONES_IMAGEN = (".png", ".jpg", ".jpeg", ".webp")
+
+
+@lru_cache()
+def _pool_codificacion() -> ThreadPoolExecutor:
+    """Pool de hilos del proceso para codificar y escribir las capturas."""
+    return ThreadPoolExecutor(
+        max_workers=int(os.getenv("SER_CAPTURA_WORKERS", "2")),
+        thread_name_prefix="ser-captura",
+    )
+
+
+class CapturaEvidencia:
+    """
+    Pipeline de capturas de evidencia: cada vista se renderiza una sola vez y
+    el buffer resultante se guarda una vez en el almacén direccionado por
+    contenido; cada destino es un hardlink a esa copia.
+
+    La recodificación (WebP, optimización de PNG) y la escritura a disco se
+    hacen en un pool de hilos, de modo que el navegador puede seguir con la
+    siguiente interacción mientras tanto. Antes de leer las capturas (por
+    ejemplo, para subirlas) hay que llamar a `esperar()`, que falla si alguna
+    captura no quedó en disco: un período sin su evidencia no debe subirse.
+
+    El formato y la calidad se configuran por tipo de captura con
+    SER_CAPTURA_FORMATO_<TIPO> y SER_CAPTURA_CALIDAD_<TIPO> (ej:
+    SER_CAPTURA_FORMATO_EXPANDIDA=webp). Sin variable por tipo se usan
+    SER_CAPTURA_FORMATO (por defecto "png") y SER_CAPTURA_CALIDAD (por defecto 80).
+
+    Con `al_guardar`, cada ruta se informa apenas queda escrita en disco (desde
+    el pool de hilos), para que la subida continua la tome sin esperar al final.
+    """
+
+    def __init__(self, al_guardar: Optional[Callable[[str], None]] = None):
+        self.al_guardar = al_guardar
+        self._lock = threading.Lock()
+        self._pendientes: List[Future] = []
+        # Buffer ya codificado de cada captura, por ruta, para replicarla sin recodificar
+        self._codificadas: Dict[str, Future] = {}
+        # Capturas que no se pudieron replicar, para reportarlas en `esperar`
+        self._errores: List[str] = []
+
+    # ------------------------------------------------------------------
+    # Configuración por tipo de captura
+    # ------------------------------------------------------------------
+    def formato(self, tipo: str) -> str:
+        formato = (
+            os.getenv(f"SER_CAPTURA_FORMATO_{tipo.upper()}")
+            or os.getenv("SER_CAPTURA_FORMATO", "png")
+        ).lower()
+        if formato == "jpg":
+            formato = "jpeg"
+        if formato not in EXTENSIONES:
+            print(f"⚠️ Formato de captura '{formato}' no soportado. Se usa PNG.")
+            return "png"
+        if formato == "webp" and Image is None:
+            print("⚠️ WebP requiere Pillow, que no está instalado. Se usa PNG.")
+            return "png"
+        return formato
+
+    def calidad(self, tipo: str) -> int:
+        return int(
+            os.getenv(f"SER_CAPTURA_CALIDAD_{tipo.upper()}")
+            or os.getenv("SER_CAPTURA_CALIDAD", "80")
+        )
+
+    def extension(self, tipo: str) -> str:
+        return EXTENSIONES[self.formato(tipo)]
+
+    def opciones_screenshot(self, tipo: str) -> Dict[str, Any]:
+        """
+        Argumentos para `page.screenshot`. JPEG lo codifica Playwright
+        directamente; WebP se captura en PNG y se recodifica en el pool.
+        """
+        formato = self.formato(tipo)
+        if formato == "jpeg":
+            return {"type": "jpeg", "quality": self.calidad(tipo)}
+        return {"type": "png"}
+
+    # ------------------------------------------------------------------
+    # Escritura
+    # ------------------------------------------------------------------
+    def guardar(
+        self, tipo: str, contenido: bytes, nombre_base: str, directorios: List[str]
+    ) -> List[str]:
+        """
+        Programa la codificación de una captura y su escritura en cada directorio.
+
+        Args:
+            tipo (str): Tipo de captura (ej: 'autoliquidacion', 'colapsada').
+            contenido (bytes): Buffer devuelto por `page.screenshot` con
+                `opciones_screenshot(tipo)`.
+            nombre_base (str): Nombre del archivo sin extensión.
+            directorios (List[str]): Carpetas donde debe quedar la captura.
+
+        Returns:
+            List[str]: Rutas finales de la captura, una por directorio.
+        """
+        extension = self.extension(tipo)
+        rutas = [os.path.join(d, f"{nombre_base}{extension}") for d in directorios]
+        futuro = _pool_codificacion().submit(
+            self._codificar_y_escribir, tipo, contenido, rutas
+        )
+        with self._lock:
+            self._pendientes.append(futuro)
+            for ruta in rutas:
+                self._codificadas[ruta] = futuro
+        return rutas
+
+    def replicar(self, ruta: str, directorios: List[str]):
+        """
+        Escribe una captura ya programada con `guardar` en más directorios,
+        reutilizando su buffer codificado: solo se crean hardlinks al almacén.
+        """
+        with self._lock:
+            codificada = self._codificadas.get(ruta)
+        if codificada is None:
+            print(f"  -> ERROR: la captura {os.path.basename(ruta)} no fue programada.")
+            with self._lock:
+                self._errores.append(f"{os.path.basename(ruta)} no fue programada")
+            return
+        nombre = os.path.basename(ruta)
+        destinos = [os.path.join(d, nombre) for d in directorios]
+        futuro = _pool_codificacion().submit(
+            lambda: self._escribir(codificada.result(), destinos)
+        )
+        with self._lock:
+            self._pendientes.append(futuro)
+
+    def _codificar_y_escribir(
+        self, tipo: str, contenido: bytes, rutas: List[str]
+    ) -> bytes:
+        formato = self.formato(tipo)
+        if formato == "webp":
+            contenido = self._recodificar(contenido, "WEBP", quality=self.calidad(tipo))
+        elif formato == "png" and Image is not None and (
+            os.getenv("SER_CAPTURA_OPTIMIZAR_PNG", "0") == "1"
+        ):
+            contenido = self._recodificar(contenido, "PNG", optimize=True)
+
+        self._escribir(contenido, rutas)
+        return contenido
+
+    def _escribir(self, contenido: bytes, rutas: List[str]):
+        guardar_por_contenido(contenido, rutas)
+        if self.al_guardar:
+            for ruta in rutas:
+                self.al_guardar(ruta)
+
+    @staticmethod
+    def _recodificar(contenido: bytes, formato: str, **opciones: Any) -> bytes:
+        with Image.open(io.BytesIO(contenido)) as imagen:  # type: ignore
+            salida = io.BytesIO()
+            imagen.save(salida, format=formato, **opciones)
+        return salida.getvalue()
+
+    def _tomar_pendientes(self) -> List[Future]:
+        with self._lock:
+            pendientes, self._pendientes = self._pendientes, []
+        return pendientes
+
+    @staticmethod
+    def _reportar(futuro: Future) -> Optional[BaseException]:
+        error = futuro.exception()
+        if error:
+            print(f"  -> ERROR al guardar una captura de evidencia: {error}")
+        return error
+
+    def _cerrar_espera(self, pendientes: List[Future]):
+        """
+        Reporta las capturas ya terminadas y lanza un error si alguna falló.
+
+        Raises:
+            RuntimeError: Si alguna captura no se pudo codificar, escribir o replicar.
+        """
+        errores = [str(e) for e in map(self._reportar, pendientes) if e is not None]
+        with self._lock:
+            errores.extend(self._errores)
+            self._errores = []
+            self._codificadas.clear()
+        if errores:
+            raise RuntimeError(
+                f"{len(errores)} capturas de evidencia no se pudieron guardar: {errores[0]}"
+            )
+
+    def esperar(self):
+        """
+        Bloquea hasta que todas las capturas programadas estén en disco.
+
+        Raises:
+            RuntimeError: Si alguna captura no quedó en disco.
+        """
+        self._cerrar_espera(self._tomar_pendientes())
+
+    async def esperar_async(self):
+        """Equivalente de `esperar()` para el motor asíncrono."""
+        pendientes = self._tomar_pendientes()
+        if pendientes:
+            await asyncio.gather(
+                *(asyncio.wrap_future(f) for f in pendientes), return_exceptions=True
+            )
+        self._cerrar_espera(pendientes)
@@ -0,0 +1,201 @@
+import os
+from typing import Any, Dict, Iterable, Optional, Set
+from urllib.parse import urlparse
+
+# Tipos de recurso que nunca se bloquean: el documento, las llamadas a la API
+# del SER (consulta de FURs y descarga de PDFs) y el CSS que da forma a las capturas.
+TIPOS_SIEMPRE_PERMITIDOS = {"document", "xhr", "fetch", "stylesheet"}
+
+# Tipos bloqueados por defecto: las capturas de evidencia son de la tabla de
+# FURs ya renderizada, que no depende de imágenes, fuentes ni multimedia.
+TIPOS_BLOQUEADOS_POR_DEFECTO = ("image", "font", "media")
+
+# Dominios de analítica y publicidad que el SER carga y que no aportan a las capturas.
+DOMINIOS_BLOQUEADOS_POR_DEFECTO = (
+    "google-analytics.com",
+    "googletagmanager.com",
+    "doubleclick.net",
+    "hotjar.com",
+    "clarity.ms",
+    "facebook.net",
+)
+
+
+def _lista_entorno(nombre: str, por_defecto: Iterable[str] = ()) -> Set[str]:
+    valor = os.getenv(nombre)
+    if valor is None:
+        return set(por_defecto)
+    return {item.strip().lower() for item in valor.split(",") if item.strip()}
+
+
+def _coincide_dominio(host: str, dominios: Set[str]) -> bool:
+    """Verdadero si `host` es alguno de los dominios o un subdominio suyo."""
+    return any(host == dominio or host.endswith(f".{dominio}") for dominio in dominios)
+
+
+class FiltroRed:
+    """
+    Capa de filtrado de peticiones de red para los contextos del SER.
+
+    Se instala con `context.route` y decide por tipo de recurso y por dominio
+    qué peticiones llegan a la red, dejando pasar solo lo que necesitan la
+    navegación, las descargas y las capturas de evidencia. Lleva la cuenta de
+    peticiones permitidas y bloqueadas, y de los bytes recibidos, para poder
+    medir el ahorro.
+
+    Reglas, en orden:
+        1. Dominio bloqueado -> se bloquea.
+        2. Hay lista de dominios permitidos y el host no está en ella (ni es
+           un host del SER) -> se bloquea.
+        3. Tipo de recurso bloqueado (y no imprescindible) -> se bloquea.
+        4. En otro caso se permite.
+    """
+
+    def __init__(
+        self,
+        hosts_ser: Iterable[str],
+        tipos_bloqueados: Optional[Set[str]] = None,
+        dominios_permitidos: Optional[Set[str]] = None,
+        dominios_bloqueados: Optional[Set[str]] = None,
+    ):
+        """
+        Args:
+            hosts_ser (Iterable[str]): Hosts del SER, que siempre se permiten.
+            tipos_bloqueados (set): Tipos de recurso de Playwright a bloquear
+                (ej: 'image', 'font', 'media').
+            dominios_permitidos (set): Si no está vacío, solo estos dominios
+                (además del SER) llegan a la red.
+            dominios_bloqueados (set): Dominios que siempre se bloquean.
+        """
+        self.hosts_ser = {host.lower() for host in hosts_ser if host}
+        self.tipos_bloqueados = (tipos_bloqueados or set()) - TIPOS_SIEMPRE_PERMITIDOS
+        self.dominios_permitidos = dominios_permitidos or set()
+        self.dominios_bloqueados = dominios_bloqueados or set()
+
+        self.permitidas = 0
+        self.bloqueadas = 0
+        self.bytes_permitidos = 0
+        self.bloqueadas_por_motivo: Dict[str, int] = {}
+
+    @classmethod
+    def desde_entorno(cls, *urls_ser: Optional[str]) -> Optional["FiltroRed"]:
+        """
+        Construye el filtro a partir de las variables de entorno, o devuelve None
+        si SER_FILTRO_RED no está activado.
+
+        Variables:
+            SER_FILTRO_RED: "1" para activar el filtrado (por defecto "0").
+            SER_FILTRO_TIPOS_BLOQUEADOS: tipos separados por coma
+                (por defecto "image,font,media").
+            SER_FILTRO_DOMINIOS_PERMITIDOS: dominios separados por coma (vacío = todos).
+            SER_FILTRO_DOMINIOS_BLOQUEADOS: dominios separados por coma
+                (por defecto, dominios conocidos de analítica).
+        """
+        if os.getenv("SER_FILTRO_RED", "0") != "1":
+            return None
+        return cls(
+            hosts_ser=(urlparse(url).hostname or "" for url in urls_ser if url),
+            tipos_bloqueados=_lista_entorno(
+                "SER_FILTRO_TIPOS_BLOQUEADOS", TIPOS_BLOQUEADOS_POR_DEFECTO
+            ),
+            dominios_permitidos=_lista_entorno("SER_FILTRO_DOMINIOS_PERMITIDOS"),
+            dominios_bloqueados=_lista_entorno(
+                "SER_FILTRO_DOMINIOS_BLOQUEADOS", DOMINIOS_BLOQUEADOS_POR_DEFECTO
+            ),
+        )
+
+    def motivo_bloqueo(self, url: str, tipo_recurso: str) -> Optional[str]:
+        """Devuelve por qué se bloquea una petición, o None si se permite."""
+        host = (urlparse(url).hostname or "").lower()
+        if not host:
+            # data:, blob: y similares no salen a la red
+            return None
+        if _coincide_dominio(host, self.dominios_bloqueados):
+            return f"dominio:{host}"
+        es_ser = _coincide_dominio(host, self.hosts_ser)
+        if (
+            self.dominios_permitidos
+            and not es_ser
+            and not _coincide_dominio(host, self.dominios_permitidos)
+        ):
+            return f"dominio:{host}"
+        if tipo_recurso in self.tipos_bloqueados:
+            return f"tipo:{tipo_recurso}"
+        return None
+
+    def _registrar(self, motivo: Optional[str]) -> bool:
+        if motivo is None:
+            self.permitidas += 1
+            return True
+        self.bloqueadas += 1
+        self.bloqueadas_por_motivo[motivo] = self.bloqueadas_por_motivo.get(motivo, 0) + 1
+        return False
+
+    def _sumar_bytes(self, tamanos: Dict[str, int]):
+        """
+        Suma los bytes realmente recibidos (encabezados y cuerpo codificado).
+        A diferencia de content-length, cuenta también las respuestas chunked.
+        """
+        self.bytes_permitidos += max(0, tamanos.get("responseHeadersSize", 0)) + max(
+            0, tamanos.get("responseBodySize", 0)
+        )
+
+    def _registrar_peticion(self, request: Any):
+        try:
+            self._sumar_bytes(request.sizes())
+        except Exception:
+            # El contexto pudo cerrarse antes de consultar los tamaños
+            pass
+
+    async def _registrar_peticion_async(self, request: Any):
+        try:
+            self._sumar_bytes(await request.sizes())
+        except Exception:
+            pass
+
+    # ------------------------------------------------------------------
+    # Instalación en contextos
+    # ------------------------------------------------------------------
+    def instalar(self, context: Any):
+        """Instala el filtro en un `BrowserContext` de la API síncrona."""
+
+        def manejar(route: Any):
+            request = route.request
+            if self._registrar(self.motivo_bloqueo(request.url, request.resource_type)):
+                route.fallback()
+            else:
+                route.abort("blockedbyclient")
+
+        context.route("**/*", manejar)
+        context.on("requestfinished", self._registrar_peticion)
+
+    async def instalar_async(self, context: Any):
+        """Instala el filtro en un `BrowserContext` de la API asíncrona."""
+
+        async def manejar(route: Any):
+            request = route.request
+            if self._registrar(self.motivo_bloqueo(request.url, request.resource_type)):
+                await route.fallback()
+            else:
+                await route.abort("blockedbyclient")
+
+        await context.route("**/*", manejar)
+        context.on("requestfinished", self._registrar_peticion_async)
+
+    def resumen(self) -> Dict[str, Any]:
+        return {
+            "permitidas": self.permitidas,
+            "bloqueadas": self.bloqueadas,
+            "bytes_permitidos": self.bytes_permitidos,
+            "bloqueadas_por_motivo": dict(self.bloqueadas_por_motivo),
+        }
+
+    def imprimir_resumen(self, titulo: str):
+        print(
+            f"🛡️ Filtro de red de {titulo}: {self.permitidas} peticiones permitidas "
+            f"({self.bytes_permitidos / 1024:.0f} KB), {self.bloqueadas} bloqueadas."
+        )
+        for motivo, cantidad in sorted(
+            self.bloqueadas_por_motivo.items(), key=lambda item: -item[1]
+        ):
+            print(f"  -> {motivo}: {cantidad}")
@@ -0,0 +1,178 @@
+import asyncio
+import os
+import tempfile
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+from playwright.async_api import Browser
+
+from app.playwright.AsyncSerService import AsyncSerService
+from app.playwright.BrowserPool import BrowserPool
+from app.playwright.SerService import SerService
+
+
+def ruta_estado_auth() -> str:
+    """
+    Archivo donde se guarda el último `storage_state` (cookies de sesión vivas):
+    SER_AUTH_STATE_PATH o, por defecto, uno en el directorio temporal del
+    sistema, fuera del repositorio y del contexto de build de Docker.
+    """
+    return os.getenv("SER_AUTH_STATE_PATH") or os.path.join(
+        tempfile.gettempdir(), "ser_auth_state.json"
+    )
+
+
+def _proteger_archivo(ruta: str):
+    """Deja el archivo legible solo por el usuario del proceso."""
+    try:
+        os.chmod(ruta, 0o600)
+    except OSError:
+        pass
+
+
+class SerAuthenticator:
+    """
+    Autentica una sola vez por ingesta y comparte el `storage_state` resultante
+    (cookies y localStorage, incluido el 'auth-token') con todos los contextos.
+
+    Solo se vuelve a autenticar cuando un contexto detecta que la sesión expiró
+    y lo reporta con `invalidar()`.
+    """
+
+    def __init__(
+        self,
+        browser_pool: BrowserPool,
+        token_ser: Optional[str] = None,
+        state_path: Optional[str] = None,
+    ):
+        """
+        Args:
+            browser_pool (BrowserPool): Pool del que se toma el contexto de autenticación.
+            token_ser (str): Token del SER. Si no se indica, se usa el login con credenciales.
+            state_path (str): Archivo donde se guarda el último `storage_state` capturado.
+        """
+        self.browser_pool = browser_pool
+        self.token_ser = token_ser
+        self.state_path = state_path or ruta_estado_auth()
+        self._lock = threading.Lock()
+        self._storage_state: Optional[Dict[str, Any]] = None
+        self._generacion = 0
+
+    def obtener_storage_state(self) -> Tuple[Dict[str, Any], int]:
+        """
+        Devuelve el `storage_state` vigente y su generación, autenticando si aún
+        no existe. Solo un hilo autentica; los demás esperan y reutilizan el resultado.
+        """
+        with self._lock:
+            if self._storage_state is None:
+                self._autenticar()
+            return self._storage_state, self._generacion  # type: ignore
+
+    def obtener_cookie_auth(self) -> Tuple[str, int]:
+        """
+        Devuelve el valor de la cookie de autenticación del SER tomado del
+        `storage_state` vigente, autenticando si hace falta.
+        """
+        storage_state, generacion = self.obtener_storage_state()
+        nombre = os.getenv("SER_AUTH_COOKIE_NAME", ".ASPXAUTH")
+        for cookie in storage_state.get("cookies", []):
+            if cookie.get("name") == nombre:
+                return cookie["value"], generacion
+        raise PermissionError(
+            f"La sesión autenticada no contiene la cookie '{nombre}'."
+        )
+
+    def invalidar(self, generacion: int):
+        """
+        Marca como expirada la sesión de una generación. Si otro hilo ya la
+        renovó, no se hace nada para evitar autenticaciones repetidas.
+        """
+        with self._lock:
+            if generacion == self._generacion and self._storage_state is not None:
+                print(f"🔄 Sesión compartida del SER expirada (generación {generacion}).")
+                self._storage_state = None
+
+    def _autenticar(self):
+        ser_service = SerService(browser_pool=self.browser_pool)
+        try:
+            if self.token_ser:
+                print("🔐 Autenticación compartida con token_ser (localStorage)...")
+                ser_service.start_session(self.token_ser)
+            else:
+                print("🔑 Autenticación compartida con usuario y contraseña...")
+                ser_service.login()
+
+            self._storage_state = ser_service.context.storage_state(  # type: ignore
+                path=self.state_path
+            )
+            _proteger_archivo(self.state_path)
+            self._generacion += 1
+            print(
+                f"✅ storage_state capturado (generación {self._generacion}) y guardado en {self.state_path}"
+            )
+        finally:
+            ser_service.close_session()
+
+
+class AsyncSerAuthenticator:
+    """
+    Equivalente de `SerAuthenticator` para el motor asíncrono: una sola
+    autenticación (token_ser o login) en un contexto del navegador compartido,
+    cuyo `storage_state` siembra la sesión de cada grupo.
+    """
+
+    def __init__(
+        self,
+        browser: Browser,
+        token_ser: Optional[str] = None,
+        state_path: Optional[str] = None,
+    ):
+        """
+        Args:
+            browser (Browser): Navegador asíncrono en el que se autentica.
+            token_ser (str): Token del SER. Si no se indica, se usa el login con credenciales.
+            state_path (str): Archivo donde se guarda el último `storage_state` capturado.
+        """
+        self.browser = browser
+        self.token_ser = token_ser
+        self.state_path = state_path or ruta_estado_auth()
+        self._lock = asyncio.Lock()
+        self._storage_state: Optional[Dict[str, Any]] = None
+        self._generacion = 0
+
+    async def obtener_storage_state(self) -> Tuple[Dict[str, Any], int]:
+        """
+        Devuelve el `storage_state` vigente y su generación, autenticando si aún
+        no existe. Solo una corrutina autentica; las demás esperan el resultado.
+        """
+        async with self._lock:
+            if self._storage_state is None:
+                await self._autenticar()
+            return self._storage_state, self._generacion  # type: ignore
+
+    def invalidar(self, generacion: int):
+        """Marca como expirada la sesión de una generación, si no se renovó ya."""
+        if generacion == self._generacion and self._storage_state is not None:
+            print(f"🔄 Sesión compartida (async) del SER expirada (generación {generacion}).")
+            self._storage_state = None
+
+    async def _autenticar(self):
+        ser_service = AsyncSerService(browser=self.browser)
+        try:
+            if self.token_ser:
+                print("🔐 Autenticación compartida (async) con token_ser (localStorage)...")
+                await ser_service.start_session(self.token_ser)
+            else:
+                print("🔑 Autenticación compartida (async) con usuario y contraseña...")
+                await ser_service.login()
+
+            self._storage_state = await ser_service.context.storage_state(  # type: ignore
+                path=self.state_path
+            )
+            _proteger_archivo(self.state_path)
+            self._generacion += 1
+            print(
+                f"✅ storage_state (async) capturado (generación {self._generacion}) y guardado en {self.state_path}"
+            )
+        finally:
+            await ser_service.close_session()
@@ -1,12 +1,63 @@
 import os
-import shutil
-from datetime import date, datetime
-from typing import Set
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from typing import TYPE_CHECKING, Any, Callable, Dict, Set, Tuple
 from urllib.parse import urlparse
 
+import requests
 from dotenv import load_dotenv
-from playwright.sync_api import Browser, Page, Playwright, sync_playwright
-from typing_extensions import List
+from playwright.sync_api import (
+    Browser,
+    BrowserContext,
+    Locator,
+    Page,
+    Playwright,
+    Route,
+    sync_playwright,
+)
+from typing_extensions import List, Optional
+
+from app.playwright.BrowserPool import BrowserPool
+from app.playwright.CapturaEvidencia import CapturaEvidencia
+from app.playwright.FiltroRed import FiltroRed
+from app.playwright.SerWaiter import SerWaiter
+from app.playwright.ser_scripts import (
+    ESTADOS_FUR_OMITIDOS,
+    PATRON_URL_FUR,
+    SCRIPT_CONTROLES_FLOTANTES,
+    SCRIPT_EXPANDIR_FILAS,
+    SCRIPT_EXTRAER_FILAS,
+    SCRIPT_MOSTRAR_Y_POSICIONAR_FILTROS,
+    SCRIPT_OCULTAR_ELEMENTOS,
+    SCRIPT_OCULTAR_PIE,
+    SCRIPT_OPCIONES_OPERADOR,
+    SELECTOR_DROPDOWN_OPERADOR,
+    SELECTOR_EXPEDIENTE,
+    SELECTOR_FECHA_FIN,
+    SELECTOR_FECHA_INICIO,
+    SELECTOR_FILAS,
+    SELECTOR_FILAS_POR_PAGINA,
+    SELECTOR_FILTRO_OPERADOR,
+    SELECTOR_ICONO_FUR,
+    SELECTOR_OPCIONES_DROPDOWN,
+    TIPOS_SOLICITUD_FUR,
+    encabezados_reenviables,
+    extraer_pdf_de_respuesta,
+    normalizar_nombre_fur,
+    opcion_operador,
+    periodo_de_fecha,
+    ruta_periodo,
+)
+from app.utils.colocacion_archivos import (
+    colocar_descarga,
+    directorio_descargas_temporales,
+)
+from app.utils.concurrencia import OPERACION_DESCARGA, OPERACION_NAVEGACION
+from app.utils.proteccion_ser import llamada_ser
+from app.utils.reintentos import ETAPA_BUSQUEDA, ETAPA_DESCARGA, reintentar
+
+if TYPE_CHECKING:
+    from app.playwright.SerAuthenticator import SerAuthenticator
 
 # Cargar las variables de entorno desde el archivo .env
 load_dotenv()
@@ -18,16 +69,38 @@ class SerService:
     Maneja un ciclo de vida de sesión para realizar múltiples operaciones de forma eficiente.
     """
 
-    def __init__(self):
+    def __init__(
+        self,
+        browser_pool: Optional[BrowserPool] = None,
+        al_guardar: Optional[Callable[[str], None]] = None,
+        download_path: Optional[str] = None,
+    ):
         """
         Inicializa el servicio y las variables de estado.
+
+        Args:
+            browser_pool (BrowserPool): Pool de navegadores del que se toma prestado
+                un contexto. Si no se indica, la sesión lanza su propio navegador.
+            al_guardar (Callable): Recibe la ruta de cada FUR o captura apenas
+                queda en disco (ej: para subirla mientras sigue el scraping).
+            download_path (str): Carpeta de descargas de la ingesta. Por
+                defecto, DOWNLOAD_PATH.
         """
         self.ser_url = os.getenv("SER_URL")
         self.ser_user = os.getenv("SER_USER")
         self.ser_password = os.getenv("SER_PASSWORD")
         self.ser_auth_cookie = os.getenv("SER_AUTH_COOKIE")
+        self.ser_auth_cookie_name = os.getenv("SER_AUTH_COOKIE_NAME", ".ASPXAUTH")
         self.ser_url_consumo_fur = os.getenv("SER_URL_CONSUL_FUR")
-        self.download_path = os.getenv("DOWNLOAD_PATH", "descargas")
+        self.download_path = download_path or os.getenv("DOWNLOAD_PATH", "descargas")
+        # Descarga de PDFs: "clic" (uno a uno con expect_download) o "concurrente"
+        self.descarga_modo = os.getenv("SER_DESCARGA_MODO", "clic")
+        self.descarga_paralelismo = int(os.getenv("SER_DESCARGA_PARALELISMO", "6"))
+        # Sube las filas por página del paginador al máximo antes de recorrerlo
+        self.filas_por_pagina_max = os.getenv("SER_FILAS_POR_PAGINA_MAX", "1") == "1"
+        # Llenado del formulario de consulta: "rapido" (fill directo) o
+        # "compatible" (tecleo lento, como antes)
+        self.busqueda_modo = os.getenv("SER_BUSQUEDA_MODO", "rapido")
 
         if not self.ser_url or not self.ser_auth_cookie:
             raise ValueError(
@@ -44,9 +117,53 @@ class SerService:
             raise ValueError("No se pudo extraer el dominio de la SER_URL.")
 
         # Atributos para gestionar el estado de Playwright durante la sesión
+        self.browser_pool = browser_pool
         self.playwright: Playwright | None = None
         self.browser: Browser | None = None
+        self.context: BrowserContext | None = None
         self.page: Page | None = None
+        self.waiter: SerWaiter | None = None
+        self.filtro_red: FiltroRed | None = None
+        self.al_guardar = al_guardar
+        self.evidencia = CapturaEvidencia(al_guardar)
+        # Indica que la página ya está en la consulta de FURs recién cargada,
+        # de modo que buscar_data no necesita volver a navegar.
+        self._consulta_cargada = False
+        # Opciones del dropdown de operadores, leídas una vez por sesión
+        self._opciones_operador: Optional[List[str]] = None
+
+    def _nuevo_contexto(self, **context_options: Any) -> BrowserContext:
+        """
+        Crea el contexto de la sesión: prestado del pool si existe o, si no,
+        de un navegador propio lanzado para esta sesión.
+        """
+        if self.browser_pool:
+            self.context = self.browser_pool.checkout(**context_options)
+        else:
+            self.playwright = sync_playwright().start()
+            # Cambia a headless=False si quieres ver el navegador mientras depuras
+            # Las descargas quedan junto a DOWNLOAD_PATH para colocarlas con un rename
+            self.browser = self.playwright.chromium.launch(
+                headless=True, downloads_path=directorio_descargas_temporales()
+            )
+            # Contexto con viewport de alta resolución para capturas de mejor calidad
+            self.context = self.browser.new_context(
+                viewport={"width": 1920, "height": 1080},
+                device_scale_factor=2,
+                accept_downloads=True,
+                **context_options,
+            )
+
+        self.filtro_red = FiltroRed.desde_entorno(self.ser_url, self.ser_url_consumo_fur)
+        if self.filtro_red:
+            self.filtro_red.instalar(self.context)
+        return self.context
+
+    def _nueva_pagina(self, context: BrowserContext) -> Page:
+        """Abre la página de trabajo de la sesión junto con su capa de esperas."""
+        self.page = context.new_page()
+        self.waiter = SerWaiter(self.page)
+        return self.page
 
     def login(self):
         """
@@ -55,20 +172,13 @@ class SerService:
         """
         print("Iniciando sesión en el SER con credenciales...")
 
-        # Iniciamos Playwright y mantenemos la sesión abierta
-        self.playwright = sync_playwright().start()
-        # Lanzamos el navegador en modo "headed" (no oculto) para poder ver la interfaz
-        self.browser = self.playwright.chromium.launch(headless=True)
-        context = self.browser.new_context(
-            viewport={"width": 1920, "height": 1080},
-            device_scale_factor=2,
-            accept_downloads=True,
-        )
-
-        self.page = context.new_page()
+        # Tomamos un contexto (del pool o de un navegador propio) y mantenemos la sesión abierta
+        context = self._nuevo_contexto()
+        self._nueva_pagina(context)
 
         print(f"Navegando a la página de login: {self.ser_url}")
-        self.page.goto(f"{self.ser_url}")
+        with llamada_ser(OPERACION_NAVEGACION):
+            self.page.goto(f"{self.ser_url}")
 
         print("Llenando formulario de login...")
 
@@ -76,8 +186,8 @@ class SerService:
         self.page.locator("#Usuario").fill(self.ser_user)  # type: ignore
         self.page.locator("#Clave").fill(self.ser_password)  # type: ignore
 
-        # tiempo de espera
-        self.page.wait_for_timeout(15000)
+        # Esperamos a que terminen de cargar los scripts del login (incluido el CAPTCHA)
+        self.waiter.esperar_red_inactiva("login")  # type: ignore
 
         print("Saltándose la validación del CAPTCHA...")
         # Modificar la función ValidadCaptcha para que siempre retorne true
@@ -109,21 +219,13 @@ class SerService:
         el token en el localStorage.
         """
         print("Iniciando sesión en el SER con token de localStorage...")
-        self.playwright = sync_playwright().start()
-        # Cambia a headless=False si quieres ver el navegador mientras depuras
-        self.browser = self.playwright.chromium.launch(headless=True)
-
-        # Contexto con viewport de alta resolución para capturas de mejor calidad
-        context = self.browser.new_context(
-            viewport={"width": 1920, "height": 1080},
-            device_scale_factor=2,
-            accept_downloads=True,
-        )
-        self.page = context.new_page()
+        context = self._nuevo_contexto()
+        self._nueva_pagina(context)
 
         # 1. Navegar a la página base para establecer el origen del localStorage
         print(f"Navegando a la URL base: {self.ser_url}")
-        self.page.goto(self.ser_url, wait_until="domcontentloaded")  # type: ignore
+        with llamada_ser(OPERACION_NAVEGACION):
+            self.page.goto(self.ser_url, wait_until="domcontentloaded")  # type: ignore
 
         # 2. Inyectar el token en el localStorage del navegador
         print("Inyectando 'auth-token' en el localStorage...")
@@ -134,7 +236,8 @@ class SerService:
 
         # 3. Navegar a la página de consulta final para que lea el token
         print(f"Navegando a la página de consulta: {self.ser_url_consumo_fur}")
-        self.page.goto(self.ser_url_consumo_fur, wait_until="networkidle")  # type: ignore
+        with llamada_ser(OPERACION_NAVEGACION):
+            self.page.goto(self.ser_url_consumo_fur, wait_until="networkidle")  # type: ignore
 
         # 4. Verificar si el login fue exitoso esperando por un elemento clave post-login
         try:
@@ -153,131 +256,230 @@ class SerService:
                 "No se pudo encontrar el contenido esperado después del login."
             )
 
+    def _verificar_consulta(self) -> bool:
+        """
+        Espera a que la consulta de FURs termine de cargar y confirma si la
+        sesión es válida: el dropdown de operador aparece con sesión válida y
+        el formulario de login aparece si expiró.
+        """
+        try:
+            self.page.wait_for_selector("p-dropdown, #Usuario", timeout=15000)  # type: ignore
+            sesion_valida = self.page.locator("p-dropdown").count() > 0  # type: ignore
+        except Exception:
+            sesion_valida = False
+        self._consulta_cargada = sesion_valida
+        return sesion_valida
+
+    def start_session_from_state(
+        self, autenticador: "SerAuthenticator", intentos: int = 2
+    ):
+        """
+        Inicia la sesión sembrando el contexto con el `storage_state` compartido
+        de la ingesta, sin pasar por el login ni por la inyección del token.
+        Si el contexto detecta que la sesión expiró, pide una nueva autenticación.
+        """
+        for intento in range(1, intentos + 1):
+            storage_state, generacion = autenticador.obtener_storage_state()
+            context = self._nuevo_contexto(storage_state=storage_state)
+            self._nueva_pagina(context)
+
+            print(f"Navegando con sesión compartida a: {self.ser_url_consumo_fur}")
+            with llamada_ser(OPERACION_NAVEGACION):
+                self.page.goto(self.ser_url_consumo_fur, wait_until="networkidle")  # type: ignore
+
+            if self._verificar_consulta():
+                print("¡Sesión compartida válida! Elemento post-login encontrado.")
+                return
+
+            print(
+                f"⚠️ La sesión compartida expiró (intento {intento}/{intentos}). Reautenticando..."
+            )
+            autenticador.invalidar(generacion)
+            self.close_session()
+
+        raise PermissionError(
+            "No se pudo iniciar la sesión con el storage_state compartido."
+        )
+
+    def start_session_from_cookie(
+        self, autenticador: Optional["SerAuthenticator"] = None, intentos: int = 2
+    ):
+        """
+        Inicia la sesión agregando la cookie de autenticación del SER al contexto
+        y navegando directamente a la consulta de FURs, sin formulario de login,
+        sin CAPTCHA y sin pasar por el localStorage.
+
+        La cookie se toma del autenticador central si se indica (que la renueva
+        cuando expira) o, si no, de la variable de entorno SER_AUTH_COOKIE.
+        """
+        for intento in range(1, intentos + 1):
+            generacion = None
+            cookie_value = self.ser_auth_cookie
+            if autenticador:
+                cookie_value, generacion = autenticador.obtener_cookie_auth()
+
+            context = self._nuevo_contexto()
+            context.add_cookies(
+                [
+                    {
+                        "name": self.ser_auth_cookie_name,
+                        "value": cookie_value,  # type: ignore
+                        "domain": self.cookie_domain,  # type: ignore
+                        "path": "/",
+                        "httpOnly": True,
+                        "secure": True,
+                        "sameSite": "Lax",
+                    }
+                ]
+            )
+            self._nueva_pagina(context)
+
+            print(f"Navegando con cookie de sesión a: {self.ser_url_consumo_fur}")
+            with llamada_ser(OPERACION_NAVEGACION):
+                self.page.goto(self.ser_url_consumo_fur, wait_until="networkidle")  # type: ignore
+
+            if self._verificar_consulta():
+                print("¡Sesión iniciada con cookie! Elemento post-login encontrado.")
+                return
+
+            print(
+                f"⚠️ La cookie de sesión no es válida (intento {intento}/{intentos})."
+            )
+            self.close_session()
+            if not autenticador:
+                break
+            autenticador.invalidar(generacion)  # type: ignore
+
+        raise PermissionError(
+            "La cookie de autenticación del SER es inválida o ha expirado."
+        )
+
     def buscar_data(
         self, nitOperador: str, expediente: str, fechaInicial: date, fechaFinal: date
     ):
         """
         Con una sesión ya iniciada, se buscan los datos llenando el formulario y haciendo clic.
+        Si la búsqueda falla se recarga la página de consulta y se repite solo la
+        búsqueda (política de reintentos ETAPA_BUSQUEDA).
         """
-        self.page.goto(self.ser_url_consumo_fur, wait_until="networkidle")  # type: ignore
         if not self.page:
             raise ConnectionError(
                 "La sesión no ha sido iniciada. Llama a start_session() primero."
             )
 
-        try:
-            # Formateamos las fechas al formato que el formulario web espera (dd/mm/yyyy)
-            fecha_ini_str = fechaInicial.strftime("%d/%m/%Y")
-            fecha_fin_str = fechaFinal.strftime("%d/%m/%Y")
-            print(
-                f"Buscando datos para NIT: {nitOperador}, Periodo: {fecha_ini_str} a {fecha_fin_str}..."
-            )
-            self.page.locator("p-dropdown").first.click()
-            search_input = self.page.locator("input.p-dropdown-filter")
-            search_input.fill(str(nitOperador))
-            option_to_select = self.page.locator(
-                f"li[role='option']:has-text('{nitOperador}')"
-            )
-            option_to_select.wait_for(state="visible", timeout=15000)
-            option_to_select.click()
+        # Formateamos las fechas al formato que el formulario web espera (dd/mm/yyyy)
+        fecha_ini_str = fechaInicial.strftime("%d/%m/%Y")
+        fecha_fin_str = fechaFinal.strftime("%d/%m/%Y")
+        print(
+            f"Buscando datos para NIT: {nitOperador}, Periodo: {fecha_ini_str} a {fecha_fin_str}..."
+        )
 
-            expediente_input = self.page.locator(
-                'input[formcontrolname="numeroExpediente"]'
-            )
-            expediente_input.clear()
-            expediente_input.type(str(expediente), delay=150)
+        def _buscar():
+            if not self._consulta_cargada:
+                with llamada_ser(OPERACION_NAVEGACION):
+                    self.page.goto(self.ser_url_consumo_fur, wait_until="networkidle")  # type: ignore
+            # Un reintento parte de la página de consulta recién cargada
+            self._consulta_cargada = False
 
-            # --- CAMPO FECHA INICIAL ---
-            fecha_inicio_input = self.page.locator(
-                'p-calendar[formcontrolname="fechaInicio"] input'
-            )
-            print(f"  -> Escribiendo la fecha inicial: {fecha_ini_str}...")
-            fecha_inicio_input.click()  # Hacemos clic para asegurar que el campo tiene foco
-            fecha_inicio_input.clear()
-            # Escribimos la fecha lentamente para simular un humano
-            fecha_inicio_input.type(fecha_ini_str, delay=100)
-
-            # --- CAMPO FECHA FINAL ---
-            fecha_fin_input = self.page.locator(
-                'p-calendar[formcontrolname="fechaFin"] input'
-            )
-            print(f"  -> Escribiendo la fecha final: {fecha_fin_str}...")
-            fecha_fin_input.click()  # Hacemos clic para asegurar que el campo tiene foco
-            fecha_fin_input.clear()
-            # Escribimos la fecha lentamente para simular un humano
-            fecha_fin_input.type(fecha_fin_str, delay=100)
+            self._seleccionar_operador(str(nitOperador))
+
+            if self.busqueda_modo == "compatible":
+                self._llenar_campos_tecleando(str(expediente), fecha_ini_str, fecha_fin_str)
+            else:
+                self._llenar_campos_rapido(str(expediente), fecha_ini_str, fecha_fin_str)
 
             print("Haciendo clic en el botón 'Consultar'...")
             consultar_button = self.page.locator("button:has-text('Consultar')")
             consultar_button.click()
 
-            # 1. Guarda tu script en una variable
-            javascript_code = """
-            () => { // Se envuelve en una función para asegurar la correcta ejecución
-                const pieDePagina = document.querySelector("app-pie-pagina");
-
-                // 2. Comprobar si existe y luego ocultarlo
-                if (pieDePagina) {
-                pieDePagina.style.display = "none";
-                console.log("Pie de página ocultado exitosamente.");
-                } else {
-                console.warn("Elemento <app-pie-pagina> no encontrado.");
-                }
-
-                const controles = document.querySelector(".controles");
-                if (!controles) {
-                    console.error('Elemento ".controles" no encontrado.');
-                    return;
-                }
-
-                // Estilos fijos
-                controles.style.position = "fixed";
-                controles.style.top = "0px"; // posición inicial
-                controles.style.transform = "translateX(-50%)";
-                controles.style.left = "50%";
-                controles.style.width = "50%";
-                controles.style.height = "350px";
-                controles.style.border = "2px solid #0078d4";
-                controles.style.borderRadius = "8px";
-                controles.style.zIndex = 10000;
-                controles.style.cursor = "move";
-                controles.style.overflow = "auto";
-
-                // Hacerlo arrastrable
-                let isDragging = false;
-                let offsetX = 0;
-                let offsetY = 0;
-
-                controles.addEventListener("mousedown", (e) => {
-                  isDragging = true;
-                  offsetX = e.clientX - controles.offsetLeft;
-                  offsetY = e.clientY - controles.offsetTop;
-                  controles.style.userSelect = "none";
-                });
-
-                document.addEventListener("mousemove", (e) => {
-                  if (isDragging) {
-                    controles.style.left = e.clientX - offsetX + "px";
-                    controles.style.top = e.clientY - offsetY + "px";
-                  }
-                });
-
-                document.addEventListener("mouseup", () => {
-                  isDragging = false;
-                  controles.style.userSelect = "auto";
-                });
-            }
-            """
-
-            # 2. Ejecuta el script en el navegador
-            self.page.evaluate(javascript_code)
-            self.page.wait_for_timeout(3000)
+            # Ejecuta el script que deja los controles flotando sobre la tabla
+            self.page.evaluate(SCRIPT_CONTROLES_FLOTANTES)
+            self.waiter.esperar_tabla("consulta")  # type: ignore
 
+        try:
+            reintentar(_buscar, ETAPA_BUSQUEDA, f"Búsqueda del NIT {nitOperador}")
+        except LookupError:
+            # El NIT no existe en el SER: no tiene sentido recorrer la tabla
+            raise
         except Exception as e:
             print(f"Error durante la búsqueda de datos para NIT {nitOperador}: {e}")
             # Opcional: tomar una captura de pantalla para depurar el error
             # self.page.screenshot(path=f"error_screenshot_{nitOperador}.png")
-            # ser-furs-downloader-storage-service/app/playwright/SerService.py
+            # Sin búsqueda no hay tabla que recorrer: el ítem queda para reanudar
+            raise
+
+    def _seleccionar_operador(self, nit: str):
+        """
+        Selecciona el operador en el dropdown. En modo rápido la lista de
+        opciones se lee una sola vez por sesión; con ella se elige la opción
+        exacta sin esperar a que el filtro la muestre, y un NIT ausente falla
+        de inmediato.
+        """
+        self.page.locator(SELECTOR_DROPDOWN_OPERADOR).first.click()  # type: ignore
+        if self._opciones_operador is None and self.busqueda_modo != "compatible":
+            self._opciones_operador = self.page.evaluate(SCRIPT_OPCIONES_OPERADOR)  # type: ignore
+
+        self.page.locator(SELECTOR_FILTRO_OPERADOR).fill(nit)  # type: ignore
+        if self._opciones_operador and self.busqueda_modo != "compatible":
+            etiqueta = opcion_operador(self._opciones_operador, nit)
+            if etiqueta is None:
+                self.page.keyboard.press("Escape")  # type: ignore
+                raise LookupError(
+                    f"El NIT {nit} no está en la lista de operadores del SER."
+                )
+            self.page.locator("li[role='option']").filter(  # type: ignore
+                has_text=etiqueta
+            ).first.click()
+            return
+
+        option_to_select = self.page.locator(  # type: ignore
+            f"li[role='option']:has-text('{nit}')"
+        )
+        option_to_select.wait_for(state="visible", timeout=15000)
+        option_to_select.click()
+
+    def _llenar_campos_rapido(
+        self, expediente: str, fecha_ini_str: str, fecha_fin_str: str
+    ):
+        """
+        Llena expediente y fechas con un solo `fill` por campo. `fill` dispara el
+        evento 'input' que actualiza el control de Angular; el 'blur' posterior
+        hace que el calendario de PrimeNG confirme la fecha y cierre su panel.
+        """
+        for selector, valor in (
+            (SELECTOR_EXPEDIENTE, expediente),
+            (SELECTOR_FECHA_INICIO, fecha_ini_str),
+            (SELECTOR_FECHA_FIN, fecha_fin_str),
+        ):
+            campo = self.page.locator(selector)  # type: ignore
+            campo.fill(valor)
+            campo.dispatch_event("blur")
+
+    def _llenar_campos_tecleando(
+        self, expediente: str, fecha_ini_str: str, fecha_fin_str: str
+    ):
+        """
+        Modo de compatibilidad: escribe cada campo tecla por tecla, como un humano.
+        """
+        expediente_input = self.page.locator(SELECTOR_EXPEDIENTE)  # type: ignore
+        expediente_input.clear()
+        expediente_input.type(expediente, delay=150)
+
+        # --- CAMPO FECHA INICIAL ---
+        fecha_inicio_input = self.page.locator(SELECTOR_FECHA_INICIO)  # type: ignore
+        print(f"  -> Escribiendo la fecha inicial: {fecha_ini_str}...")
+        fecha_inicio_input.click()  # Hacemos clic para asegurar que el campo tiene foco
+        fecha_inicio_input.clear()
+        # Escribimos la fecha lentamente para simular un humano
+        fecha_inicio_input.type(fecha_ini_str, delay=100)
+
+        # --- CAMPO FECHA FINAL ---
+        fecha_fin_input = self.page.locator(SELECTOR_FECHA_FIN)  # type: ignore
+        print(f"  -> Escribiendo la fecha final: {fecha_fin_str}...")
+        fecha_fin_input.click()  # Hacemos clic para asegurar que el campo tiene foco
+        fecha_fin_input.clear()
+        # Escribimos la fecha lentamente para simular un humano
+        fecha_fin_input.type(fecha_fin_str, delay=100)
 
     def descargar_pdfs_de_tabla(
         self, nit: str, anio: int, trimestre: int, expediente: int, seecion: str
@@ -326,21 +528,20 @@ class SerService:
                 target_header_1.wait_for(state="visible", timeout=5000)
                 # self.page.pause()
 
-                self.page.wait_for_timeout(3000)
-                # Imagen normal (autoliquidacion)
-                screenshot_name = f"{nit}-autoliquidaciones.png"
-                screenshot_path_autoliquidacion = os.path.join(
-                    autoliquidacion_path, screenshot_name
+                self.waiter.esperar_dom_estable(  # type: ignore
+                    "autoliquidacion", "#tabs-1 .scrollBar"
                 )
-                screenshot_path_periodo = os.path.join(
-                    base_trimestre_path, screenshot_name
+                # Imagen normal (autoliquidacion): una sola captura para ambos destinos
+                captura = self.page.screenshot(
+                    full_page=True,
+                    **self.evidencia.opciones_screenshot("autoliquidacion"),
                 )
-                self.page.screenshot(
-                    path=screenshot_path_autoliquidacion, full_page=True
+                self.evidencia.guardar(
+                    "autoliquidacion",
+                    captura,
+                    f"{nit}-autoliquidaciones",
+                    [autoliquidacion_path, base_trimestre_path],
                 )
-                self.page.screenshot(path=screenshot_path_periodo, full_page=True)
-
-                self.page.wait_for_timeout(3000)
 
                 rows = self.page.locator("table.scrollBarProcesada tbody tr")
                 num_rows = rows.count()
@@ -348,6 +549,7 @@ class SerService:
 
                 if num_rows == 0:
                     print("No hay datos en la tabla para descargar.")
+                    self.evidencia.esperar()
                     return
 
                 for i in range(num_rows):
@@ -360,7 +562,9 @@ class SerService:
                         )
 
                         # --- LÓGICA ORIGINAL RESTAURADA ---
-                        with self.page.expect_download(timeout=60000) as download_info:
+                        with llamada_ser(OPERACION_DESCARGA), self.page.expect_download(
+                            timeout=60000
+                        ) as download_info:
                             pdf_icon.click()
 
                         download = download_info.value
@@ -373,18 +577,16 @@ class SerService:
                             )
                             continue
 
-                        # Usamos el nombre de archivo sugerido por el servidor
+                        # Usamos el nombre de archivo sugerido por el servidor.
+                        # Se mueve una vez y el período recibe un hardlink.
                         file_name = download.suggested_filename
-                        save_path = os.path.join(autoliquidacion_path, file_name)
-
-                        download.save_as(save_path)
-                        save_path_autoliquidacion = os.path.join(
-                            autoliquidacion_path, file_name
+                        save_path = colocar_descarga(
+                            download,
+                            [
+                                os.path.join(autoliquidacion_path, file_name),
+                                os.path.join(base_trimestre_path, file_name),
+                            ],
                         )
-                        save_path_periodo = os.path.join(base_trimestre_path, file_name)
-
-                        download.save_as(save_path_autoliquidacion)
-                        download.save_as(save_path_periodo)
                         print(f"  -> ¡Éxito! Guardado en: {save_path}")
 
                         # --- FIN DE LA LÓGICA RESTAURADA ---
@@ -442,23 +644,22 @@ class SerService:
                 target_header_1.wait_for(state="visible", timeout=5000)
                 # self.page.pause()
 
-                self.page.wait_for_timeout(3000)
-                # Imagen normal (obligacion)
-                screenshot_name = f"{nit}-obligaciones.png"
-                screenshot_path_obligacion = os.path.join(
-                    obligacion_path, screenshot_name
+                self.waiter.esperar_dom_estable(  # type: ignore
+                    "obligacion", "#tabs-2 .scrollBar"
                 )
-                screenshot_path_periodo = os.path.join(
-                    base_trimestre_path, screenshot_name
+                # Imagen normal (obligacion): una sola captura para ambos destinos
+                captura = self.page.screenshot(
+                    full_page=True, **self.evidencia.opciones_screenshot("obligacion")
+                )
+                screenshot_path_obligacion, _ = self.evidencia.guardar(
+                    "obligacion",
+                    captura,
+                    f"{nit}-obligaciones",
+                    [obligacion_path, base_trimestre_path],
                 )
 
                 print(f"  -> Captura guardada en: {screenshot_path_obligacion}")
 
-                self.page.screenshot(path=screenshot_path_obligacion, full_page=True)
-                self.page.screenshot(path=screenshot_path_periodo, full_page=True)
-
-                self.page.wait_for_timeout(3000)
-
                 # SOLUCIÓN: Usamos un selector específico para la tabla de obligaciones.
                 rows_obligacion = self.page.locator(
                     "#tabs-2 table.scrollBarProcesada tbody tr"
@@ -476,7 +677,9 @@ class SerService:
                     if pdf_icon.count() > 0:
                         print(f"  -> Descargando PDF de la fila {i + 1}...")
 
-                        with self.page.expect_download(timeout=6000) as download_info:
+                        with llamada_ser(OPERACION_DESCARGA), self.page.expect_download(
+                            timeout=6000
+                        ) as download_info:
                             pdf_icon.scroll_into_view_if_needed()
                             pdf_icon.click()
 
@@ -486,20 +689,14 @@ class SerService:
                                 f"  -> ERROR: Descarga falló. Razón: {download.failure()}"
                             )
                             continue
-                        self.page.wait_for_timeout(2000)
-                        save_path = os.path.join(
-                            obligacion_path, download.suggested_filename
-                        )
-                        download.save_as(save_path)
-                        save_path_obligacion = os.path.join(
-                            obligacion_path, download.suggested_filename
-                        )
-                        save_path_periodo = os.path.join(
-                            base_trimestre_path, download.suggested_filename
+                        file_name = download.suggested_filename
+                        save_path = colocar_descarga(
+                            download,
+                            [
+                                os.path.join(obligacion_path, file_name),
+                                os.path.join(base_trimestre_path, file_name),
+                            ],
                         )
-
-                        download.save_as(save_path_obligacion)
-                        download.save_as(save_path_periodo)
                         print(f"  -> ¡Éxito! Guardado en: {save_path}")
 
         except Exception as e:
@@ -510,6 +707,9 @@ class SerService:
                 f"  -> ¡Error! Se guardó una captura de pantalla en: {screenshot_path}"
             )
 
+        # Las capturas de evidencia deben estar en disco antes de subirlas
+        self.evidencia.esperar()
+
     def descargar_y_clasificar_furs_paginado(
         self, nit: str, anio: int, expediente: int, seccion: str, trimestres: List[int]
     ):
@@ -527,99 +727,79 @@ class SerService:
 
         # --- FASE 1: PREPARACIÓN Y CAPTURA DE PANTALLAS ---
         created_period_paths: Set[str] = set()
-        base_search_year_path = os.path.join(
-            self.download_path, seccion, str(anio), f"{nit}-{expediente}"
+        base_search_year_path = ruta_periodo(
+            self.download_path, seccion, anio, nit, expediente
         )
         os.makedirs(base_search_year_path, exist_ok=True)
 
         # Usaremos listas para guardar las rutas de las capturas de cada página
         screenshot_colapsada_paths: List[str] = []
         screenshot_expandida_paths: List[str] = []
+        # Filas cuyo FUR no se pudo descargar ni con reintentos
+        filas_fallidas = 0
 
         # Ocultar el pie de página para que no interfiera con las capturas
-        self.page.evaluate(
-            '() => { const pf = document.querySelector("app-pie-pagina"); if (pf) pf.style.display = "none"; }'
-        )
+        self.page.evaluate(SCRIPT_OCULTAR_PIE)
+
+        # Menos páginas implica menos capturas, clics y esperas de paginación
+        if self.filas_por_pagina_max:
+            self._maximizar_filas_por_pagina()
 
         page_num = 1
         while True:
             print(f"\n--- Procesando página {page_num} ---")
 
             # Esperar a que la tabla se cargue y esté estable
-            self.page.wait_for_selector("div.p-datatable-wrapper", timeout=20000)
-            self.page.wait_for_timeout(2000)  # Tiempo extra para renderizado
+            self.waiter.esperar_tabla(f"pagina-{page_num}")  # type: ignore
 
             # --- SCRIPT PARA MOSTRAR FILTROS ---
 
-            script_mostrar_y_posicionar_filtros = """
-            () => {
-                const resultados = document.querySelector(".resultados");
-                const filtros = document.querySelector(".controles");
-
-                if (filtros && resultados) {
-                    // --- CAMBIOS CLAVE ---
-                    filtros.style.display = "block";
-                    filtros.style.position = "relative";
-                    filtros.style.margin = "20px auto";
-                    filtros.style.width = "50%";
-                    resultados.style.marginTop = "20px";
-                    filtros.style.zIndex = "10000";
-                    filtros.style.background = "white";
-                }
-
-                const pieDePagina = document.querySelector("app-pie-pagina");
-                if (pieDePagina) pieDePagina.style.display = "none";
-            }
-            """
-
-            self.page.evaluate(script_mostrar_y_posicionar_filtros)
+            self.page.evaluate(SCRIPT_MOSTRAR_Y_POSICIONAR_FILTROS)
             print(
                 "  -> Filtros posicionados en la parte superior para la captura 'colapsada'."
             )
 
             # --- Captura Colapsada ---
-            screenshot_colapsada_path = os.path.join(
-                base_search_year_path, f"{nit}-colapsada-pag-{page_num}.png"
+            captura = self.page.screenshot(
+                full_page=True, **self.evidencia.opciones_screenshot("colapsada")
+            )
+            [screenshot_colapsada_path] = self.evidencia.guardar(
+                "colapsada",
+                captura,
+                f"{nit}-colapsada-pag-{page_num}",
+                [base_search_year_path],
             )
-            self.page.screenshot(path=screenshot_colapsada_path, full_page=True)
             screenshot_colapsada_paths.append(screenshot_colapsada_path)
             print(f"  -> Captura 'colapsada' guardada en: {screenshot_colapsada_path}")
 
             # --- SOLUCIÓN: OCULTAR ELEMENTOS MOLESTOS ANTES DE LA CAPTURA ---
-            script_ocultar_elementos = """
-            () => {
-                const pieDePagina = document.querySelector("app-pie-pagina");
-                if (pieDePagina) pieDePagina.style.display = "none";
-
-                const filtros = document.querySelector(".controles");
-                if (filtros) filtros.style.display = "none";
-            }
-            """
-            self.page.evaluate(script_ocultar_elementos)
-            self.page.evaluate(script_ocultar_elementos)
-            self.page.evaluate(script_ocultar_elementos)
+            self.page.evaluate(SCRIPT_OCULTAR_ELEMENTOS)
+            self.page.evaluate(SCRIPT_OCULTAR_ELEMENTOS)
+            self.page.evaluate(SCRIPT_OCULTAR_ELEMENTOS)
             print(
                 "  -> Elementos de la UI (filtros, pie de página) ocultados para la captura."
             )
 
-            # --- Expandir todas las filas ---
-            expand_buttons = self.page.locator("button.boton-expandir")
-            if expand_buttons.count() > 0:
-                print(f"  -> Expandiendo {expand_buttons.count()} filas...")
-                for i in range(expand_buttons.count()):
-                    expand_buttons.nth(i).click()
-                    self.page.wait_for_timeout(200)  # Pequeña pausa entre clics
+            # --- Expandir todas las filas (un solo script para toda la página) ---
+            filas_expandidas = self.page.evaluate(SCRIPT_EXPANDIR_FILAS)
+            if filas_expandidas > 0:
+                print(f"  -> Expandiendo {filas_expandidas} filas...")
 
-                self.page.wait_for_timeout(
-                    3000
-                )  # Esperar a que todo el contenido se cargue
+                # Esperar a que el contenido expandido termine de renderizarse
+                self.waiter.esperar_dom_estable(  # type: ignore
+                    "expandir", "div.p-datatable-wrapper"
+                )
 
                 # --- Captura Expandida ---
-                screenshot_expandida_path = os.path.join(
-                    base_search_year_path, f"{nit}-expandida-pag-{page_num}.png"
+                captura = self.page.screenshot(
+                    full_page=True, **self.evidencia.opciones_screenshot("expandida")
+                )
+                [screenshot_expandida_path] = self.evidencia.guardar(
+                    "expandida",
+                    captura,
+                    f"{nit}-expandida-pag-{page_num}",
+                    [base_search_year_path],
                 )
-
-                self.page.screenshot(path=screenshot_expandida_path, full_page=True)
                 screenshot_expandida_paths.append(screenshot_expandida_path)
                 print(
                     f"  -> Captura 'expandida' guardada en: {screenshot_expandida_path}"
@@ -628,83 +808,77 @@ class SerService:
                 print("  -> No se encontraron filas para expandir en esta página.")
 
             # --- FASE 2: PROCESAR FILAS Y DESCARGAR PDFS ---
-            rows = self.page.locator("tbody.p-datatable-tbody > tr")
-            print(f"  -> Procesando {rows.count()} filas en la página {page_num}...")
-
-            for i in range(rows.count()):
-                row = rows.nth(i)
+            # Estado, fecha, FUR y manejador de descarga de todas las filas en un solo evaluate
+            filas = self.page.evaluate(SCRIPT_EXTRAER_FILAS)
+            rows = self.page.locator(SELECTOR_FILAS)
+            print(f"  -> Procesando {len(filas)} filas en la página {page_num}...")
+            # En modo concurrente se acumulan las peticiones de PDF de la página
+            pendientes: List[Tuple[int, Dict[str, Any], str]] = []
+
+            for fila in filas:
+                i = fila["indice"]
                 # Omitir filas de detalle (las expandidas) en el bucle principal
-                if "p-datatable-row-expansion" in (row.get_attribute("class") or ""):
+                if fila["expansion"]:
                     continue
 
                 try:
                     # --- VALIDACIÓN DE ESTADO FUR ---
-                    # La columna "Estado FUR" es la 7ma (índice 6).
-                    estado_fur_str = (
-                        row.locator("td")
-                        .nth(6)
-                        .inner_text(timeout=5000)
-                        .strip()
-                        .lower()
-                    )
-
-                    if estado_fur_str in ["vencido", "anulado"]:
+                    estado_fur_str = fila["estado"]
+                    if estado_fur_str in ESTADOS_FUR_OMITIDOS:
                         print(
                             f"     -> Fila {i + 1}: Omitiendo, estado es '{estado_fur_str.capitalize()}'."
                         )
                         continue  # Salta al siguiente registro
-                    # La columna de fecha inicial es la 4ta (índice 3)
-                    fecha_inicial_str = (
-                        row.locator("td").nth(3).inner_text(timeout=5000)
-                    )
-                    fecha_obj = datetime.strptime(
-                        fecha_inicial_str.strip(), "%d/%m/%Y"
-                    ).date()
-
-                    anio_real = fecha_obj.year
-                    trimestre = (fecha_obj.month - 1) // 3 + 1
-
-                    period_path = os.path.join(
-                        self.download_path,
-                        seccion,
-                        str(anio_real),
-                        f"{nit}-{expediente}",
-                        f"{trimestre}T",
+                    anio_real, trimestre = periodo_de_fecha(fila["fecha_inicial"])
+
+                    period_path = ruta_periodo(
+                        self.download_path, seccion, anio_real, nit, expediente, trimestre
                     )
                     os.makedirs(period_path, exist_ok=True)
                     created_period_paths.add(period_path)
 
                     # El ícono de PDF/acción está en la última columna
-                    pdf_icon = row.locator("td:last-child div.ver-fur")
-                    if pdf_icon.count() > 0:
-                        with self.page.expect_download(timeout=60000) as dl_info:
-                            pdf_icon.click()
+                    if fila["tiene_descarga"]:
+                        pdf_icon = rows.nth(i).locator(SELECTOR_ICONO_FUR)
+                        if self.descarga_modo == "concurrente":
+                            solicitud = self._capturar_solicitud_fur(pdf_icon)
+                            if solicitud:
+                                pendientes.append((i + 1, solicitud, period_path))
+                                continue
+                            print(
+                                f"     -> Fila {i + 1}: No se capturó la petición del PDF. Se descarga con clic."
+                            )
 
-                        download = dl_info.value
-                        original_filename = download.suggested_filename
+                        def _descargar_con_clic() -> str:
+                            with llamada_ser(OPERACION_DESCARGA), self.page.expect_download(  # type: ignore
+                                timeout=60000
+                            ) as dl_info:
+                                pdf_icon.click()
 
-                        # --- INICIO DE LA MODIFICACIÓN ---
-                        # Separa el nombre del archivo de su extensión
-                        name_part, extension = os.path.splitext(original_filename)
+                            download = dl_info.value
+                            original_filename = download.suggested_filename
 
-                        # Si hay un guion bajo en el nombre...
-                        if "_" in name_part:
-                            # ...nos quedamos solo con la parte antes del primer guion bajo
-                            base_name = name_part.split("_")[0]
-                            # Creamos el nuevo nombre de archivo
-                            new_filename = f"{base_name}{extension}"
-                        else:
-                            # Si no hay guion bajo, usamos el nombre original
-                            new_filename = original_filename
-                        # --- FIN DE LA MODIFICACIÓN ---
+                            new_filename = normalizar_nombre_fur(original_filename)
 
-                        # Usamos el nuevo nombre de archivo para guardarlo
-                        save_path = os.path.join(period_path, new_filename)
-                        download.save_as(save_path)
+                            # Usamos el nuevo nombre de archivo para guardarlo
+                            return colocar_descarga(
+                                download, [os.path.join(period_path, new_filename)]
+                            )
+
+                        # Un fallo repite solo la descarga de esta fila
+                        try:
+                            save_path = reintentar(
+                                _descargar_con_clic, ETAPA_DESCARGA, f"Descarga de la fila {i + 1}"
+                            )
+                        except Exception:
+                            filas_fallidas += 1
+                            raise
 
                         print(
-                            f"     -> Fila {i + 1}: PDF del {anio_real}-T{trimestre} guardado en {save_path}."
+                            f"     -> Fila {i + 1}: FUR {fila['fur']} del {anio_real}-T{trimestre} guardado en {save_path}."
                         )
+                        if self.al_guardar:
+                            self.al_guardar(save_path)
 
                     else:
                         print(
@@ -714,6 +888,9 @@ class SerService:
                 except Exception as e:
                     print(f"     -> ERROR procesando fila {i + 1}: {e}")
 
+            if pendientes:
+                filas_fallidas += self._descargar_solicitudes_fur(pendientes)
+
             # --- FASE 3: NAVEGAR A LA SIGUIENTE PÁGINA ---
             next_button = self.page.locator("button.p-paginator-next")
             if next_button.count() == 0 or next_button.is_disabled():
@@ -725,6 +902,7 @@ class SerService:
             print("  -> Navegando a la siguiente página...")
             next_button.click()
             page_num += 1
+            self.waiter.esperar_pagina(page_num)  # type: ignore
 
         # --- FASE 4: VERIFICAR TRIMESTRES FALTANTES ---
         print(
@@ -739,26 +917,170 @@ class SerService:
                 os.makedirs(expected_period_path, exist_ok=True)
                 created_period_paths.add(expected_period_path)
 
+        self.waiter.imprimir_resumen(f"NIT {nit}")  # type: ignore
+
         # --- FASE 5: COPIA DINÁMICA DE IMÁGENES DE EVIDENCIA ---
+        # Cada captura se escribe en los períodos desde su buffer ya codificado
         print("\n--- Iniciando copia dinámica de imágenes de evidencia ---")
         all_screenshots = screenshot_colapsada_paths + screenshot_expandida_paths
-        for period_path in created_period_paths:
-            for img_path in all_screenshots:
-                if os.path.exists(img_path):
-                    try:
-                        shutil.copy(img_path, period_path)
-                    except Exception as e:
-                        print(
-                            f"  -> ERROR al copiar imagen {os.path.basename(img_path)} a {period_path}: {e}"
-                        )
+        for img_path in all_screenshots:
+            self.evidencia.replicar(img_path, sorted(created_period_paths))
+        self.evidencia.esperar()
+
+        if filas_fallidas:
+            # Subir el período incompleto perdería FURs sin rastro: el ítem
+            # falla y la ingesta se puede reanudar con el mismo ingestion_id
+            raise RuntimeError(
+                f"{filas_fallidas} FURs del NIT {nit} no se pudieron descargar tras los reintentos."
+            )
+
+    def _maximizar_filas_por_pagina(self):
+        """
+        Sube el selector de filas por página del paginador a la opción más alta.
+        """
+        selector_filas = self.page.locator(SELECTOR_FILAS_POR_PAGINA)  # type: ignore
+        if selector_filas.count() == 0:
+            return
+        try:
+            selector_filas.first.click()
+            opciones = self.page.locator(SELECTOR_OPCIONES_DROPDOWN)  # type: ignore
+            valores = [
+                int(texto.strip())
+                for texto in opciones.all_inner_texts()
+                if texto.strip().isdigit()
+            ]
+            if not valores:
+                self.page.keyboard.press("Escape")  # type: ignore
+                return
+            maximo = max(valores)
+            print(f"  -> Mostrando {maximo} filas por página.")
+            opciones.filter(has_text=str(maximo)).first.click()
+            self.waiter.esperar_tabla("filas-por-pagina")  # type: ignore
+        except Exception as e:
+            print(f"  -> No se pudo ajustar las filas por página: {e}")
+
+    def _capturar_solicitud_fur(self, pdf_icon: Locator) -> Optional[Dict[str, Any]]:
+        """
+        Hace clic en el ícono de un FUR interceptando la petición que dispara
+        hacia la URL de FURs (PATRON_URL_FUR). La petición se aborta (no se descarga nada) y se devuelve su URL, método,
+        encabezados y cuerpo para repetirla después fuera del navegador.
+        """
+        capturada: Dict[str, Any] = {}
+
+        def interceptar(route: Route):
+            request = route.request
+            if not capturada and request.resource_type in TIPOS_SOLICITUD_FUR:
+                capturada.update(
+                    url=request.url,
+                    method=request.method,
+                    headers=request.headers,
+                    post_data=request.post_data_buffer,
+                )
+                route.abort()
+            else:
+                # fallback (no continue_) para que la ruta del contexto de
+                # FiltroRed siga decidiendo sobre las demás peticiones
+                route.fallback()
+
+        self.page.route(PATRON_URL_FUR, interceptar)  # type: ignore
+        try:
+            # La petición abortada emite 'requestfailed' después de pasar por el handler
+            with self.page.expect_event(  # type: ignore
+                "requestfailed",
+                predicate=lambda r: bool(capturada) and r.url == capturada["url"],
+                timeout=15000,
+            ):
+                pdf_icon.click()
+        except Exception as e:
+            print(f"     -> No se pudo interceptar la petición del PDF: {e}")
+        finally:
+            self.page.unroute(PATRON_URL_FUR, interceptar)  # type: ignore
+        return capturada or None
+
+    def _descargar_solicitudes_fur(
+        self, pendientes: List[Tuple[int, Dict[str, Any], str]]
+    ) -> int:
+        """
+        Repite en paralelo las peticiones de PDF capturadas, con las cookies de la
+        sesión, y guarda cada FUR en la carpeta de su período. Devuelve cuántos
+        PDFs no se pudieron descargar tras los reintentos de ETAPA_DESCARGA.
+
+        La API síncrona de Playwright no admite peticiones simultáneas desde un
+        mismo hilo, por lo que aquí se usa una sesión de `requests` con las cookies
+        del contexto y un pool de hilos de tamaño SER_DESCARGA_PARALELISMO.
+        """
+        sesion_http = requests.Session()
+        for cookie in self.context.cookies():  # type: ignore
+            sesion_http.cookies.set(
+                cookie["name"],
+                cookie["value"],
+                domain=cookie.get("domain"),
+                path=cookie.get("path", "/"),
+            )
+
+        def _solicitar(solicitud: Dict[str, Any]) -> requests.Response:
+            with llamada_ser(OPERACION_DESCARGA):
+                respuesta = sesion_http.request(
+                    solicitud["method"],
+                    solicitud["url"],
+                    headers=encabezados_reenviables(solicitud["headers"]),
+                    data=solicitud["post_data"],
+                    timeout=60,
+                )
+                respuesta.raise_for_status()
+            return respuesta
+
+        def _descargar(pendiente: Tuple[int, Dict[str, Any], str]) -> bool:
+            fila, solicitud, period_path = pendiente
+            try:
+                respuesta = reintentar(
+                    lambda: _solicitar(solicitud), ETAPA_DESCARGA, f"Descarga de la fila {fila}"
+                )
+                contenido, nombre = extraer_pdf_de_respuesta(
+                    respuesta.headers.get("content-type", ""),
+                    respuesta.content,
+                    respuesta.headers.get("content-disposition", ""),
+                    solicitud["url"],
+                )
+                save_path = os.path.join(period_path, normalizar_nombre_fur(nombre))
+                with open(save_path, "wb") as archivo:
+                    archivo.write(contenido)
+                print(f"     -> Fila {fila}: PDF guardado en {save_path}.")
+                if self.al_guardar:
+                    self.al_guardar(save_path)
+                return True
+            except Exception as e:
+                print(f"     -> ERROR descargando el PDF de la fila {fila}: {e}")
+                return False
+
+        print(
+            f"  -> Descargando {len(pendientes)} PDFs en paralelo ({self.descarga_paralelismo} a la vez)..."
+        )
+        with ThreadPoolExecutor(max_workers=self.descarga_paralelismo) as executor:
+            resultados = list(executor.map(_descargar, pendientes))
+        sesion_http.close()
+        return resultados.count(False)
 
     def close_session(self):
         """
         Cierra el navegador y detiene la instancia de Playwright para liberar recursos.
+        Si la sesión usa el pool, solo devuelve su contexto y el navegador sigue vivo.
         """
+        if self.filtro_red:
+            self.filtro_red.imprimir_resumen("la sesión")
+            self.filtro_red = None
+        if self.browser_pool:
+            if self.context:
+                self.browser_pool.checkin(self.context)
+                print("Contexto devuelto al pool de navegadores.")
+            self.context = None
+            self.page = None
+            return
         if self.browser:
             self.browser.close()
+            self.browser = None
             print("Navegador cerrado.")
         if self.playwright:
             self.playwright.stop()
+            self.playwright = None
             print("Sesión de Playwright finalizada.")
@@ -0,0 +1,218 @@
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from playwright.async_api import Page as AsyncPage
+from playwright.sync_api import Page
+
+from app.utils.concurrencia import OPERACION_ESPERA, registrar_observacion
+
+# Resuelve true cuando el elemento no ha mutado durante `quietMs`, o false si
+# se agota `timeoutMs` (o el elemento no existe) antes de estabilizarse.
+SCRIPT_DOM_ESTABLE = """
+([selector, quietMs, timeoutMs]) => new Promise((resolve) => {
+    const objetivo = document.querySelector(selector);
+    if (!objetivo) { resolve(false); return; }
+    let temporizador = null;
+    let limite = null;
+    const observer = new MutationObserver(() => {
+        clearTimeout(temporizador);
+        temporizador = setTimeout(() => terminar(true), quietMs);
+    });
+    const terminar = (ok) => {
+        observer.disconnect();
+        clearTimeout(temporizador);
+        clearTimeout(limite);
+        resolve(ok);
+    };
+    observer.observe(objetivo, { childList: true, subtree: true, attributes: true, characterData: true });
+    temporizador = setTimeout(() => terminar(true), quietMs);
+    limite = setTimeout(() => terminar(false), timeoutMs);
+})
+"""
+
+# Verdadero cuando el paginador resalta la página indicada (o no hay paginador).
+SCRIPT_PAGINA_ACTIVA = """
+(numero) => {
+    const paginador = document.querySelector(".p-paginator");
+    if (!paginador) return true;
+    const activa = paginador.querySelector(".p-paginator-page.p-highlight");
+    return !!activa && activa.textContent.trim() === String(numero);
+}
+"""
+
+SELECTOR_TABLA = "div.p-datatable-wrapper"
+SELECTOR_CARGANDO = ".p-datatable-loading-overlay"
+
+
+class _MedicionesEspera:
+    """Registro de la duración real de cada espera, compartido por ambos motores."""
+
+    def __init__(self):
+        self.mediciones: List[Tuple[str, float, bool]] = []
+
+    def registrar(self, nombre: str, inicio: float, ok: bool):
+        self.mediciones.append((nombre, (time.monotonic() - inicio) * 1000, ok))
+
+    def registrar_espera(self, nombre: str, inicio: float, ok: bool):
+        """Registra una espera con condición y la reporta al controlador de concurrencia."""
+        self.registrar(nombre, inicio, ok)
+        registrar_observacion(OPERACION_ESPERA, time.monotonic() - inicio, ok)
+
+    def resumen(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Agrupa las mediciones por nombre de espera: cantidad, total, máximo
+        y cuántas terminaron sin cumplirse la condición.
+        """
+        resumen: Dict[str, Dict[str, Any]] = {}
+        for nombre, ms, ok in self.mediciones:
+            datos = resumen.setdefault(
+                nombre, {"n": 0, "total_ms": 0.0, "max_ms": 0.0, "fallidas": 0}
+            )
+            datos["n"] += 1
+            datos["total_ms"] += ms
+            datos["max_ms"] = max(datos["max_ms"], ms)
+            if not ok:
+                datos["fallidas"] += 1
+        return resumen
+
+    def imprimir_resumen(self, titulo: str):
+        print(f"⏱️ Esperas de {titulo}:")
+        for nombre, datos in self.resumen().items():
+            print(
+                f"  -> {nombre}: {datos['n']} esperas, {datos['total_ms']:.0f} ms en total, "
+                f"máx {datos['max_ms']:.0f} ms, {datos['fallidas']} sin cumplirse"
+            )
+
+
+class SerWaiter(_MedicionesEspera):
+    """
+    Capa de esperas por condición para SerService (API síncrona).
+
+    Reemplaza los `wait_for_timeout` fijos por esperas sobre condiciones
+    concretas (respuestas de red, estabilidad del DOM de la tabla y estado del
+    paginador) y registra cuánto tardó realmente cada una. Una condición que no
+    se cumple no interrumpe el flujo: se registra y se continúa, igual que antes
+    ocurría al terminar la pausa fija.
+    """
+
+    def __init__(self, page: Page):
+        super().__init__()
+        self.page = page
+
+    @contextmanager
+    def medir(self, nombre: str) -> Iterator[None]:
+        inicio = time.monotonic()
+        ok = True
+        try:
+            yield
+        except Exception as e:
+            ok = False
+            print(f"  -> Espera '{nombre}' no se cumplió: {e}")
+        finally:
+            self.registrar_espera(nombre, inicio, ok)
+
+    def esperar_red_inactiva(self, nombre: str, timeout: int = 15000):
+        """Espera a que la página no tenga peticiones de red en curso."""
+        with self.medir(nombre):
+            self.page.wait_for_load_state("networkidle", timeout=timeout)
+
+    def esperar_respuesta(
+        self,
+        nombre: str,
+        predicado: Callable[[Any], bool],
+        accion: Callable[[], Any],
+        timeout: int = 30000,
+    ) -> Optional[Any]:
+        """Ejecuta `accion` y espera la primera respuesta de red que cumpla `predicado`."""
+        respuesta = None
+        with self.medir(nombre):
+            with self.page.expect_response(predicado, timeout=timeout) as info:
+                accion()
+            respuesta = info.value
+        return respuesta
+
+    def esperar_dom_estable(
+        self, nombre: str, selector: str, quieto_ms: int = 500, timeout: int = 10000
+    ) -> bool:
+        """Espera a que el elemento deje de mutar durante `quieto_ms`."""
+        inicio = time.monotonic()
+        try:
+            ok = bool(
+                self.page.evaluate(SCRIPT_DOM_ESTABLE, [selector, quieto_ms, timeout])
+            )
+        except Exception as e:
+            print(f"  -> Espera '{nombre}' no se cumplió: {e}")
+            ok = False
+        self.registrar(nombre, inicio, ok)
+        return ok
+
+    def esperar_tabla(self, nombre: str, timeout: int = 20000):
+        """
+        Espera a que la tabla de resultados exista, termine de cargar y su DOM se estabilice.
+        """
+        with self.medir(f"{nombre}:tabla"):
+            self.page.wait_for_selector(SELECTOR_TABLA, timeout=timeout)
+            self.page.wait_for_selector(SELECTOR_CARGANDO, state="detached", timeout=timeout)
+        self.esperar_dom_estable(f"{nombre}:estable", SELECTOR_TABLA)
+
+    def esperar_pagina(self, numero: int, timeout: int = 20000):
+        """Espera a que el paginador marque `numero` como página activa y la tabla se estabilice."""
+        with self.medir("paginador"):
+            self.page.wait_for_function(SCRIPT_PAGINA_ACTIVA, arg=numero, timeout=timeout)
+        self.esperar_tabla("pagina", timeout=timeout)
+
+
+class AsyncSerWaiter(_MedicionesEspera):
+    """Equivalente de SerWaiter para AsyncSerService (API asíncrona)."""
+
+    def __init__(self, page: AsyncPage):
+        super().__init__()
+        self.page = page
+
+    @asynccontextmanager
+    async def medir(self, nombre: str):
+        inicio = time.monotonic()
+        ok = True
+        try:
+            yield
+        except Exception as e:
+            ok = False
+            print(f"  -> Espera '{nombre}' no se cumplió: {e}")
+        finally:
+            self.registrar_espera(nombre, inicio, ok)
+
+    async def esperar_red_inactiva(self, nombre: str, timeout: int = 15000):
+        async with self.medir(nombre):
+            await self.page.wait_for_load_state("networkidle", timeout=timeout)
+
+    async def esperar_dom_estable(
+        self, nombre: str, selector: str, quieto_ms: int = 500, timeout: int = 10000
+    ) -> bool:
+        inicio = time.monotonic()
+        try:
+            ok = bool(
+                await self.page.evaluate(
+                    SCRIPT_DOM_ESTABLE, [selector, quieto_ms, timeout]
+                )
+            )
+        except Exception as e:
+            print(f"  -> Espera '{nombre}' no se cumplió: {e}")
+            ok = False
+        self.registrar(nombre, inicio, ok)
+        return ok
+
+    async def esperar_tabla(self, nombre: str, timeout: int = 20000):
+        async with self.medir(f"{nombre}:tabla"):
+            await self.page.wait_for_selector(SELECTOR_TABLA, timeout=timeout)
+            await self.page.wait_for_selector(
+                SELECTOR_CARGANDO, state="detached", timeout=timeout
+            )
+        await self.esperar_dom_estable(f"{nombre}:estable", SELECTOR_TABLA)
+
+    async def esperar_pagina(self, numero: int, timeout: int = 20000):
+        async with self.medir("paginador"):
+            await self.page.wait_for_function(
+                SCRIPT_PAGINA_ACTIVA, arg=numero, timeout=timeout
+            )
+        await self.esperar_tabla("pagina", timeout=timeout)
@@ -0,0 +1,323 @@
+import base64
+import json
+import os
+import re
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import unquote, urlparse
+
+# Scripts y utilidades compartidas por SerService (API síncrona) y
+# AsyncSerService (API asíncrona) para que ambos motores produzcan
+# exactamente las mismas capturas y la misma clasificación de archivos.
+
+# Oculta el pie de página y deja los controles de búsqueda flotando y arrastrables.
+SCRIPT_CONTROLES_FLOTANTES = """
+() => { // Se envuelve en una función para asegurar la correcta ejecución
+    const pieDePagina = document.querySelector("app-pie-pagina");
+
+    // 2. Comprobar si existe y luego ocultarlo
+    if (pieDePagina) {
+    pieDePagina.style.display = "none";
+    console.log("Pie de página ocultado exitosamente.");
+    } else {
+    console.warn("Elemento <app-pie-pagina> no encontrado.");
+    }
+
+    const controles = document.querySelector(".controles");
+    if (!controles) {
+        console.error('Elemento ".controles" no encontrado.');
+        return;
+    }
+
+    // Estilos fijos
+    controles.style.position = "fixed";
+    controles.style.top = "0px"; // posición inicial
+    controles.style.transform = "translateX(-50%)";
+    controles.style.left = "50%";
+    controles.style.width = "50%";
+    controles.style.height = "350px";
+    controles.style.border = "2px solid #0078d4";
+    controles.style.borderRadius = "8px";
+    controles.style.zIndex = 10000;
+    controles.style.cursor = "move";
+    controles.style.overflow = "auto";
+
+    // Hacerlo arrastrable
+    let isDragging = false;
+    let offsetX = 0;
+    let offsetY = 0;
+
+    controles.addEventListener("mousedown", (e) => {
+      isDragging = true;
+      offsetX = e.clientX - controles.offsetLeft;
+      offsetY = e.clientY - controles.offsetTop;
+      controles.style.userSelect = "none";
+    });
+
+    document.addEventListener("mousemove", (e) => {
+      if (isDragging) {
+        controles.style.left = e.clientX - offsetX + "px";
+        controles.style.top = e.clientY - offsetY + "px";
+      }
+    });
+
+    document.addEventListener("mouseup", () => {
+      isDragging = false;
+      controles.style.userSelect = "auto";
+    });
+}
+"""
+
+SCRIPT_OCULTAR_PIE = '() => { const pf = document.querySelector("app-pie-pagina"); if (pf) pf.style.display = "none"; }'
+
+SCRIPT_MOSTRAR_Y_POSICIONAR_FILTROS = """
+() => {
+    const resultados = document.querySelector(".resultados");
+    const filtros = document.querySelector(".controles");
+
+    if (filtros && resultados) {
+        // --- CAMBIOS CLAVE ---
+        filtros.style.display = "block";
+        filtros.style.position = "relative";
+        filtros.style.margin = "20px auto";
+        filtros.style.width = "50%";
+        resultados.style.marginTop = "20px";
+        filtros.style.zIndex = "10000";
+        filtros.style.background = "white";
+    }
+
+    const pieDePagina = document.querySelector("app-pie-pagina");
+    if (pieDePagina) pieDePagina.style.display = "none";
+}
+"""
+
+SCRIPT_OCULTAR_ELEMENTOS = """
+() => {
+    const pieDePagina = document.querySelector("app-pie-pagina");
+    if (pieDePagina) pieDePagina.style.display = "none";
+
+    const filtros = document.querySelector(".controles");
+    if (filtros) filtros.style.display = "none";
+}
+"""
+
+# Estados de FUR que no se descargan.
+ESTADOS_FUR_OMITIDOS = ["vencido", "anulado"]
+
+# Extrae en una sola llamada el estado de todas las filas de la página de
+# resultados. "indice" es la posición de la fila en el tbody (incluidas las
+# filas de expansión) y sirve de manejador para localizar su ícono de descarga.
+# Columnas: FUR (índice 1), fecha inicial (índice 3) y estado FUR (índice 6).
+SCRIPT_EXTRAER_FILAS = """
+() => Array.from(document.querySelectorAll("tbody.p-datatable-tbody > tr")).map((tr, indice) => {
+    const celdas = tr.querySelectorAll(":scope > td");
+    const texto = (i) => (celdas[i] ? celdas[i].innerText : "").trim();
+    return {
+        indice: indice,
+        expansion: tr.classList.contains("p-datatable-row-expansion"),
+        fur: texto(1),
+        fecha_inicial: texto(3),
+        estado: texto(6).toLowerCase(),
+        tiene_descarga: !!tr.querySelector(":scope > td:last-child div.ver-fur"),
+    };
+})
+"""
+
+# Expande todas las filas de la página en un solo script y devuelve cuántas expandió.
+SCRIPT_EXPANDIR_FILAS = """
+() => {
+    const botones = Array.from(document.querySelectorAll("button.boton-expandir"));
+    botones.forEach((boton) => boton.click());
+    return botones.length;
+}
+"""
+
+# Paginador: selector del dropdown de filas por página y de sus opciones abiertas.
+SELECTOR_FILAS_POR_PAGINA = ".p-paginator .p-paginator-rpp-options"
+SELECTOR_OPCIONES_DROPDOWN = ".p-dropdown-items li[role='option']"
+
+# Etiquetas de todas las opciones del dropdown de operadores abierto.
+SCRIPT_OPCIONES_OPERADOR = """
+() => Array.from(document.querySelectorAll(".p-dropdown-items li[role='option']"))
+    .map((li) => (li.getAttribute("aria-label") || li.innerText || "").trim())
+    .filter((texto) => texto)
+"""
+
+# Formulario de consulta: dropdown de operadores y campos de texto.
+SELECTOR_DROPDOWN_OPERADOR = "p-dropdown"
+SELECTOR_FILTRO_OPERADOR = "input.p-dropdown-filter"
+SELECTOR_EXPEDIENTE = 'input[formcontrolname="numeroExpediente"]'
+SELECTOR_FECHA_INICIO = 'p-calendar[formcontrolname="fechaInicio"] input'
+SELECTOR_FECHA_FIN = 'p-calendar[formcontrolname="fechaFin"] input'
+
+SELECTOR_FILAS = "tbody.p-datatable-tbody > tr"
+SELECTOR_ICONO_FUR = "td:last-child div.ver-fur"
+
+
+def normalizar_nombre_fur(original_filename: str) -> str:
+    """
+    Conserva solo la parte del nombre anterior al primer guion bajo,
+    manteniendo la extensión (ej: 'FUR123_2024.pdf' -> 'FUR123.pdf').
+    """
+    # Separa el nombre del archivo de su extensión
+    name_part, extension = os.path.splitext(original_filename)
+
+    # Si hay un guion bajo en el nombre nos quedamos solo con la parte anterior
+    if "_" in name_part:
+        base_name = name_part.split("_")[0]
+        return f"{base_name}{extension}"
+    # Si no hay guion bajo, usamos el nombre original
+    return original_filename
+
+
+def opcion_operador(opciones: List[str], nit: str) -> Optional[str]:
+    """
+    Busca en las opciones del dropdown de operadores la que corresponde al NIT.
+    """
+    patron = re.compile(rf"(?<!\d){re.escape(str(nit))}(?!\d)")
+    for opcion in opciones:
+        if patron.search(opcion):
+            return opcion
+    return None
+
+
+def periodo_de_fecha(fecha_inicial_str: str) -> Tuple[int, int]:
+    """
+    Convierte la fecha inicial de un FUR (dd/mm/yyyy) en su (año, trimestre).
+    """
+    fecha_obj = datetime.strptime(fecha_inicial_str.strip(), "%d/%m/%Y").date()
+    return fecha_obj.year, (fecha_obj.month - 1) // 3 + 1
+
+
+def ruta_periodo(
+    download_path: str,
+    seccion: str,
+    anio: int,
+    nit: str,
+    expediente: int,
+    trimestre: Optional[int] = None,
+) -> str:
+    """
+    Construye la carpeta local de un NIT/expediente para un año y, opcionalmente, un trimestre.
+    """
+    ruta = os.path.join(download_path, seccion, str(anio), f"{nit}-{expediente}")
+    if trimestre is not None:
+        ruta = os.path.join(ruta, f"{trimestre}T")
+    return ruta
+
+
+# Tipos de recurso que puede tener la petición del PDF que dispara "ver FUR".
+TIPOS_SOLICITUD_FUR = ("document", "xhr", "fetch", "other")
+
+# URL de la petición del PDF de un FUR (configurable con SER_FUR_URL_PATRON).
+# Solo se interceptan las peticiones que la cumplen; si el clic no dispara
+# ninguna, la fila se descarga con el clic normal.
+PATRON_URL_FUR = re.compile(
+    os.getenv(
+        "SER_FUR_URL_PATRON", r"(?i)(\.pdf(\?|$)|/api/.*(fur|pdf|archivo|descarg))"
+    )
+)
+
+# Encabezados que no deben reenviarse al repetir la petición capturada.
+ENCABEZADOS_NO_REENVIABLES = ("host", "content-length", "connection")
+
+
+def encabezados_reenviables(headers: Dict[str, str]) -> Dict[str, str]:
+    """Filtra los encabezados de una petición capturada para poder repetirla."""
+    return {
+        k: v
+        for k, v in headers.items()
+        if not k.startswith(":") and k.lower() not in ENCABEZADOS_NO_REENVIABLES
+    }
+
+
+def extraer_pdf_de_respuesta(
+    content_type: str, body: bytes, content_disposition: str, url: str
+) -> Tuple[bytes, str]:
+    """
+    Obtiene el contenido y el nombre del PDF de la respuesta de un FUR.
+
+    El SER responde con el PDF directamente o con un JSON cuyo
+    `data.archivo.content` trae el PDF en base64 y `data.Nombre` su nombre.
+    """
+    if "json" in (content_type or "").lower():
+        data = json.loads(body).get("data") or {}
+        contenido = base64.b64decode(data["archivo"]["content"])
+        nombre = data.get("Nombre") or ""
+    else:
+        contenido = body
+        nombre = ""
+        coincidencia = re.search(
+            r"filename\*?=(?:UTF-8'')?\"?([^\";]+)\"?", content_disposition or ""
+        )
+        if coincidencia:
+            nombre = unquote(coincidencia.group(1))
+
+    if not nombre:
+        nombre = os.path.basename(urlparse(url).path) or "fur.pdf"
+    if not nombre.lower().endswith(".pdf"):
+        nombre = f"{nombre}.pdf"
+    return contenido, nombre
+
+# Número de páginas del paginador. Con el reporte "Mostrando 1 a 10 de 57" se
+# calcula a partir del total de registros; con "1 de 6" se toma directamente;
+# si no hay reporte se usa el mayor botón de página visible.
+SCRIPT_TOTAL_PAGINAS = """
+() => {
+    const paginador = document.querySelector(".p-paginator");
+    if (!paginador) return 1;
+    const reporte = paginador.querySelector(".p-paginator-current");
+    const numeros = reporte ? (reporte.textContent.match(/\\d+/g) || []).map(Number) : [];
+    if (numeros.length >= 3) {
+        const [primero, ultimo, total] = numeros.slice(-3);
+        const porPagina = Math.max(1, ultimo - primero + 1);
+        return Math.max(1, Math.ceil(total / porPagina));
+    }
+    if (numeros.length === 2) return Math.max(1, numeros[1]);
+    const botones = Array.from(paginador.querySelectorAll(".p-paginator-page"))
+        .map((b) => parseInt(b.textContent.trim(), 10))
+        .filter((n) => !isNaN(n));
+    return botones.length ? Math.max(...botones) : 1;
+}
+"""
+
+# Página resaltada actualmente en el paginador (1 si no hay paginador).
+SCRIPT_PAGINA_ACTUAL = """
+() => {
+    const activa = document.querySelector(".p-paginator .p-paginator-page.p-highlight");
+    return activa ? parseInt(activa.textContent.trim(), 10) : 1;
+}
+"""
+
+# Hace clic en el botón de la página objetivo si está visible o, si no, en el
+# mayor número visible menor que el objetivo. Devuelve la página a la que fue
+# (o -1 si no pudo avanzar).
+SCRIPT_CLIC_HACIA_PAGINA = """
+(objetivo) => {
+    const botones = Array.from(document.querySelectorAll(".p-paginator .p-paginator-page"));
+    const numeros = botones.map((b) => parseInt(b.textContent.trim(), 10));
+    let indice = numeros.indexOf(objetivo);
+    if (indice < 0) {
+        const menores = numeros.filter((n) => n < objetivo);
+        if (!menores.length) return -1;
+        indice = numeros.indexOf(Math.max(...menores));
+    }
+    botones[indice].click();
+    return numeros[indice];
+}
+"""
+
+
+def repartir_paginas(total_paginas: int, partes: int) -> List[Tuple[int, int]]:
+    """
+    Divide las páginas 1..total_paginas en `partes` rangos contiguos (inclusive).
+    """
+    partes = max(1, min(partes, total_paginas))
+    tamano, sobrantes = divmod(total_paginas, partes)
+    rangos: List[Tuple[int, int]] = []
+    inicio = 1
+    for parte in range(partes):
+        fin = inicio + tamano - 1 + (1 if parte < sobrantes else 0)
+        rangos.append((inicio, fin))
+        inicio = fin + 1
+    return rangos
@@ -1,9 +1,15 @@
+import hashlib
 from dataclasses import dataclass, field
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 
 from google.cloud import bigquery
 from google.cloud.exceptions import GoogleCloudError
 
+from app.utils.reintentos import ETAPA_LOG, reintentar
+
+# Motivos de error por fila de insert_rows_json que vale la pena reintentar
+MOTIVOS_TRANSITORIOS = {"backendError", "internalError", "rateLimitExceeded", "timeout"}
+
 
 @dataclass
 class Sancion:
@@ -202,9 +208,38 @@ class BigQueryRepository:
             print(f"Error al ejecutar la consulta en BigQuery: {e}")
             return []
 
+    @staticmethod
+    def insert_id_de_log(log_entry: RpaFursLog, ingestion_id: Optional[str]) -> str:
+        """
+        insertId determinista de un log: la misma ingesta, NIT, expediente,
+        período y servicio producen siempre el mismo id, así que BigQuery
+        descarta las filas repetidas por un reintento.
+        """
+        clave = "|".join(
+            str(valor)
+            for valor in (
+                ingestion_id or "manual",
+                log_entry.nitOperador,
+                log_entry.expediente,
+                log_entry.year,
+                log_entry.trimestre,
+                log_entry.cod_seven,
+                log_entry.codigo_servicio,
+            )
+        )
+        return hashlib.sha256(clave.encode("utf-8")).hexdigest()
+
     def insert_upload_log(self, log_entry: RpaFursLog, ingestion_id: Optional[str] = None):
         """
         Inserta un registro de log en la tabla rpa_furs_logs_ia de BigQuery.
+
+        Los errores transitorios se reintentan (política ETAPA_LOG) con el
+        mismo insertId, de modo que un reintento no duplica la fila.
+
+        Raises:
+            Exception: Si BigQuery rechazó la fila o el log no se pudo insertar
+            tras los reintentos; el trimestre no queda registrado en el
+            manifiesto y se puede reanudar.
         """
         table_id = "mintic-models-dev.SANCIONES_DIVIC_PRO.rpa_furs_logs_ia"
 
@@ -227,42 +262,62 @@ class BigQueryRepository:
             "ingestion_id": ingestion_id or "manual",
         }
 
+        insert_id = self.insert_id_de_log(log_entry, ingestion_id)
+
+        def _insertar() -> List[Dict[str, Any]]:
+            errores = self.bigquery_client.insert_rows_json(
+                table_id, [row_to_insert], row_ids=[insert_id]
+            )
+            if errores and _errores_transitorios(errores):
+                raise RuntimeError(f"Errores transitorios de BigQuery: {errores}")
+            return errores
+
         try:
-            errors = self.bigquery_client.insert_rows_json(table_id, [row_to_insert])
+            errors = reintentar(
+                _insertar,
+                ETAPA_LOG,
+                f"Log {log_entry.nitOperador}-{log_entry.expediente} "
+                f"({log_entry.year}-T{log_entry.trimestre})",
+            )
             if not errors:
                 print(
                     f"✅ Log insertado para {log_entry.nitOperador}-{log_entry.expediente} "
                     f"({log_entry.year}-T{log_entry.trimestre}) [ingestion_id={ingestion_id}]"
                 )
             else:
-                print(f"❌ Errores al insertar el log: {errors}")
+                # Errores permanentes por fila: el trimestre no debe quedar registrado
+                raise RuntimeError(f"Errores al insertar el log: {errors}")
         except Exception as e:
             print(f"❌ Error crítico al insertar log en BigQuery: {e}")
+            raise
 
 
-    def obtenerPeriodica(self, anno: int, trimestre: int):
+    def obtenerPeriodica(self, annos: List[int], trimestres: List[int]):
+        """
+        Registros de la base periódica para todas las combinaciones de años y
+        trimestres indicadas, uno por NIT, expediente, servicio y período.
+        """
         query_sql = f"""
         SELECT *
         FROM (
             SELECT
                 *,
                 ROW_NUMBER() OVER (
-                    PARTITION BY Identificacion, Expediente, Cod_Servicio
+                    PARTITION BY Identificacion, Expediente, Cod_Servicio, ANNO, TRIMESTRE
                 ) AS row_num
             FROM
                 `mintic-models-dev.contraprestaciones_pro.EXPEDIENTES_BDU_PERIODICA`
             WHERE
-                CAST(ANNO AS INT64) = @anno
-                AND CAST(TRIMESTRE AS INT64) = @trimestre
+                CAST(ANNO AS INT64) IN UNNEST(@annos)
+                AND CAST(TRIMESTRE AS INT64) IN UNNEST(@trimestres)
         )
         WHERE row_num = 1
-        LIMIT 21
         """
 
         job_config = bigquery.QueryJobConfig(
             query_parameters=[
-                bigquery.ScalarQueryParameter("anno", "INT64", anno),
-                bigquery.ScalarQueryParameter("trimestre", "INT64", trimestre),
+                bigquery.ArrayQueryParameter("annos", "INT64", annos),
+                bigquery.ArrayQueryParameter("trimestres", "INT64", trimestres),
             ]
         )
 
@@ -274,3 +329,10 @@ class BigQueryRepository:
             return []
 
 
+def _errores_transitorios(errores: List[Dict[str, Any]]) -> bool:
+    """Si algún error por fila de insert_rows_json es transitorio."""
+    return any(
+        detalle.get("reason") in MOTIVOS_TRANSITORIOS
+        for error in errores
+        for detalle in error.get("errors", [])
+    )
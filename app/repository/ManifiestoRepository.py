@@ -0,0 +1,285 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+# Etapas que alcanza cada (NIT, expediente, año, trimestre), en orden.
+ETAPA_SCRAPEADO = "scrapeado"
+ETAPA_SUBIDO = "subido"
+ETAPA_REGISTRADO = "registrado"
+ETAPAS = (ETAPA_SCRAPEADO, ETAPA_SUBIDO, ETAPA_REGISTRADO)
+
+
+class ManifiestoRepository:
+    """
+    Manifiesto persistente de una ingesta, para reanudarla si el proceso muere.
+
+    Guarda en SQLite la etapa alcanzada por cada (NIT, expediente, año,
+    trimestre) y, tras la subida, las URLs resultantes, de modo que una
+    ingesta reanudada pueda registrar en BigQuery sin volver a subir. El
+    archivo se respalda en el bucket como 'manifiestos/<ingestion_id>.sqlite'
+    para sobrevivir a un contenedor nuevo.
+
+    Una ingesta repartida en shards tiene un manifiesto por shard
+    ('manifiestos/<ingestion_id>/shard-<i>-de-<n>.sqlite'), y cada shard deja
+    al terminar un reporte que `consolidar` usa para confirmar que todos
+    terminaron.
+    """
+
+    def __init__(
+        self,
+        ingestion_id: str,
+        bucket=None,
+        shard_index: int = 0,
+        shard_count: int = 1,
+        restaurar: bool = True,
+    ):
+        """
+        Args:
+            ingestion_id (str): Identificador de la ingesta.
+            bucket (Bucket): Bucket de GCS para el respaldo. Sin él, el
+                manifiesto solo vive en el disco local.
+            shard_index (int): Shard de esta instancia (desde 0).
+            shard_count (int): Cantidad de shards de la ingesta.
+            restaurar (bool): Falso para abrir el manifiesto local que ya
+                preparó el proceso principal (modo de procesos), sin
+                restaurarlo ni anunciar la reanudación.
+        """
+        self.ingestion_id = ingestion_id
+        self.bucket = bucket
+        self.shard_index = shard_index
+        self.shard_count = shard_count
+        directorio = os.getenv("SER_MANIFIESTO_PATH", "manifiestos")
+        os.makedirs(directorio, exist_ok=True)
+        if shard_count > 1:
+            nombre = f"shard-{shard_index}-de-{shard_count}.sqlite"
+            self.local_path = os.path.join(directorio, f"{ingestion_id}-{nombre}")
+            self.blob_name = f"manifiestos/{ingestion_id}/{nombre}"
+        else:
+            self.local_path = os.path.join(directorio, f"{ingestion_id}.sqlite")
+            self.blob_name = f"manifiestos/{ingestion_id}.sqlite"
+        self.intervalo_respaldo = float(os.getenv("SER_MANIFIESTO_RESPALDO_SEG", "30"))
+        # El primer respaldo periódico llega un intervalo después de abrirlo
+        self._ultimo_respaldo = time.monotonic()
+        self._lock = threading.Lock()
+
+        self.reanudado = self._restaurar() if restaurar else False
+        # Con varios procesos escribiendo el mismo archivo, SQLite espera el bloqueo
+        self._conn = sqlite3.connect(self.local_path, timeout=30, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS etapas (
+                nit TEXT NOT NULL,
+                expediente TEXT NOT NULL,
+                anio INTEGER NOT NULL,
+                trimestre INTEGER NOT NULL,
+                etapa TEXT NOT NULL,
+                uploaded_urls TEXT,
+                gsutil_paths TEXT,
+                actualizado TEXT DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (nit, expediente, anio, trimestre)
+            )
+            """
+        )
+        self._conn.commit()
+        if self.reanudado:
+            print(
+                f"📒 Reanudando la ingesta {ingestion_id}: "
+                f"{self.contar(ETAPA_REGISTRADO)} períodos ya registrados."
+            )
+        elif restaurar:
+            print(f"📒 Nueva ingesta {ingestion_id}; envíe este ingestion_id para reanudarla.")
+
+    def _restaurar(self) -> bool:
+        """Trae el manifiesto del bucket si no está en disco. Indica si ya existía."""
+        if os.path.exists(self.local_path):
+            return True
+        if self.bucket is None:
+            return False
+        # Solo el respaldo en GCS necesita el cliente de Google: sin bucket (ej:
+        # en las pruebas) el manifiesto y la planificación funcionan sin él
+        from google.api_core import exceptions
+
+        try:
+            self.bucket.blob(self.blob_name).download_to_filename(self.local_path)
+            print(f"📒 Manifiesto restaurado desde gs://{self.bucket.name}/{self.blob_name}")
+            return True
+        except exceptions.NotFound:
+            if os.path.exists(self.local_path):
+                os.remove(self.local_path)
+            return False
+
+    # ------------------------------------------------------------------
+    # Consulta y registro de etapas
+    # ------------------------------------------------------------------
+    def etapas_de(
+        self, nit: str, expediente: str, anio: int
+    ) -> Dict[int, Tuple[str, Optional[List[str]], Optional[List[str]]]]:
+        """
+        Etapa alcanzada por cada trimestre de un NIT/expediente/año, con las
+        URLs y rutas gsutil de su subida si ya se subió.
+        """
+        with self._lock:
+            filas = self._conn.execute(
+                "SELECT trimestre, etapa, uploaded_urls, gsutil_paths FROM etapas "
+                "WHERE nit = ? AND expediente = ? AND anio = ?",
+                (nit, expediente, anio),
+            ).fetchall()
+        return {
+            trimestre: (
+                etapa,
+                json.loads(urls) if urls else None,
+                json.loads(paths) if paths else None,
+            )
+            for trimestre, etapa, urls, paths in filas
+        }
+
+    def marcar(
+        self,
+        nit: str,
+        expediente: str,
+        anio: int,
+        trimestre: int,
+        etapa: str,
+        uploaded_urls: Optional[List[str]] = None,
+        gsutil_paths: Optional[List[str]] = None,
+    ):
+        """Registra que un período alcanzó `etapa`, conservando sus URLs de subida."""
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO etapas (nit, expediente, anio, trimestre, etapa, uploaded_urls, gsutil_paths)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (nit, expediente, anio, trimestre) DO UPDATE SET
+                    etapa = excluded.etapa,
+                    uploaded_urls = COALESCE(excluded.uploaded_urls, etapas.uploaded_urls),
+                    gsutil_paths = COALESCE(excluded.gsutil_paths, etapas.gsutil_paths),
+                    actualizado = CURRENT_TIMESTAMP
+                """,
+                (
+                    nit,
+                    expediente,
+                    anio,
+                    trimestre,
+                    etapa,
+                    json.dumps(uploaded_urls) if uploaded_urls is not None else None,
+                    json.dumps(gsutil_paths) if gsutil_paths is not None else None,
+                ),
+            )
+            self._conn.commit()
+            respaldar = time.monotonic() - self._ultimo_respaldo >= self.intervalo_respaldo
+            if respaldar:
+                self._ultimo_respaldo = time.monotonic()
+        if respaldar:
+            self.respaldar()
+
+    def contar(self, etapa: str) -> int:
+        with self._lock:
+            (cantidad,) = self._conn.execute(
+                "SELECT COUNT(*) FROM etapas WHERE etapa = ?", (etapa,)
+            ).fetchone()
+        return cantidad
+
+    # ------------------------------------------------------------------
+    # Respaldo en el bucket
+    # ------------------------------------------------------------------
+    def respaldar(self) -> bool:
+        """Sube una copia consistente del manifiesto al bucket. Indica si lo logró."""
+        if self.bucket is None:
+            return False
+        copia_path = f"{self.local_path}.{uuid.uuid4().hex}.respaldo"
+        try:
+            with self._lock:
+                copia = sqlite3.connect(copia_path)
+                try:
+                    self._conn.backup(copia)
+                finally:
+                    copia.close()
+            self.bucket.blob(self.blob_name).upload_from_filename(copia_path)
+            return True
+        except Exception as e:
+            print(f"⚠️ No se pudo respaldar el manifiesto de la ingesta: {e}")
+            return False
+        finally:
+            if os.path.exists(copia_path):
+                os.remove(copia_path)
+
+    def cerrar(self, completo: bool = False):
+        """
+        Respalda y cierra el manifiesto. Con `completo` (la ingesta terminó sin
+        pendientes) borra además el archivo local, pero solo si quedó respaldado
+        en el bucket: una reanudación posterior lo restaura desde ahí.
+        """
+        respaldado = self.respaldar()
+        with self._lock:
+            self._conn.close()
+        if completo and respaldado:
+            try:
+                os.remove(self.local_path)
+            except FileNotFoundError:
+                pass
+            print(f"🧹 Manifiesto local de la ingesta {self.ingestion_id} eliminado.")
+
+    # ------------------------------------------------------------------
+    # Reportes de shards
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _prefijo_reportes(ingestion_id: str) -> str:
+        return f"manifiestos/{ingestion_id}/reportes/"
+
+    def reportar_shard(self, registros: int, registros_procesados: int):
+        """Deja en el bucket el reporte de fin de este shard."""
+        if self.bucket is None:
+            return
+        reporte = {
+            "ingestion_id": self.ingestion_id,
+            "shard_index": self.shard_index,
+            "shard_count": self.shard_count,
+            "registros": registros,
+            "registros_procesados": registros_procesados,
+            "periodos_registrados": self.contar(ETAPA_REGISTRADO),
+            "terminado": datetime.now(timezone.utc).isoformat(),
+        }
+        blob_name = f"{self._prefijo_reportes(self.ingestion_id)}shard-{self.shard_index}.json"
+        try:
+            self.bucket.blob(blob_name).upload_from_string(
+                json.dumps(reporte), content_type="application/json"
+            )
+            print(
+                f"📒 Shard {self.shard_index + 1}/{self.shard_count} de la ingesta "
+                f"{self.ingestion_id} reportado."
+            )
+        except Exception as e:
+            print(f"⚠️ No se pudo reportar el shard {self.shard_index}: {e}")
+
+    @classmethod
+    def consolidar(cls, bucket, ingestion_id: str, shard_count: int) -> Dict[str, Any]:
+        """
+        Reúne los reportes de los shards de una ingesta y confirma que todos
+        terminaron.
+
+        Returns:
+            Dict: Shards reportados y faltantes, totales sumados y `completa`.
+        """
+        reportes: Dict[int, Dict[str, Any]] = {}
+        for blob in bucket.list_blobs(prefix=cls._prefijo_reportes(ingestion_id)):
+            reporte = json.loads(blob.download_as_bytes())
+            if reporte.get("shard_count") == shard_count:
+                reportes[int(reporte["shard_index"])] = reporte
+        faltantes = [i for i in range(shard_count) if i not in reportes]
+        return {
+            "ingestion_id": ingestion_id,
+            "shard_count": shard_count,
+            "shards_reportados": sorted(reportes),
+            "shards_faltantes": faltantes,
+            "completa": not faltantes,
+            "registros": sum(r["registros"] for r in reportes.values()),
+            "registros_procesados": sum(
+                r["registros_procesados"] for r in reportes.values()
+            ),
+            "reportes": [reportes[i] for i in sorted(reportes)],
+        }
@@ -1,15 +1,86 @@
+import base64
+import hashlib
 import os
+import queue
+import threading
 from concurrent.futures import ThreadPoolExecutor
-from typing import List, Tuple
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
 
+import google.auth
+import google_crc32c
+import requests
 from dotenv import load_dotenv
 from google.api_core import exceptions
+from google.auth.transport.requests import AuthorizedSession
 from google.cloud import storage  # type: ignore
+from google.cloud.storage import transfer_manager  # type: ignore
 from google.cloud.storage.client import Bucket  # type: ignore
 
+from app.utils.reintentos import ETAPA_SUBIDA, es_error_permanente, reintentar
+
 # Cargar las variables de entorno para encontrar las credenciales
 load_dotenv()
 
+# Resultado de cada archivo de una subida en bloque
+RESULTADO_SUBIDO = "subido"
+RESULTADO_COPIADO = "copiado"
+RESULTADO_OMITIDO = "omitido"
+RESULTADO_ERROR = "error"
+
+
+@dataclass
+class ResultadoSubida:
+    """Resultado de un archivo de `StorageRepository.subir_lote`."""
+
+    local_path: str
+    destino: str
+    estado: str = RESULTADO_ERROR
+    url: Optional[str] = None
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.estado != RESULTADO_ERROR
+
+
+@lru_cache()
+def get_storage_client() -> storage.Client:
+    """
+    Cliente de Cloud Storage único del proceso. Su sesión HTTP tiene un pool
+    de SER_STORAGE_CONEXIONES conexiones (32 por defecto), para que los hilos
+    de subida reutilicen conexiones en lugar de esperar o abrir una por archivo.
+    """
+    # La autenticación se maneja automáticamente a través de la variable
+    # de entorno GOOGLE_APPLICATION_CREDENTIALS.
+    credenciales, proyecto = google.auth.default()
+    conexiones = int(os.getenv("SER_STORAGE_CONEXIONES", "32"))
+    adaptador = requests.adapters.HTTPAdapter(
+        pool_connections=conexiones, pool_maxsize=conexiones
+    )
+    sesion = AuthorizedSession(credenciales)
+    sesion.mount("https://", adaptador)
+    sesion.mount("http://", adaptador)
+    return storage.Client(project=proyecto, credentials=credenciales, _http=sesion)
+
+
+@lru_cache()
+def _bucket_verificado(bucket_name: str) -> Bucket:
+    """
+    Bucket del cliente compartido, comprobando una sola vez por proceso que
+    exista (un fallo no queda en caché y se vuelve a comprobar).
+    """
+    bucket: Bucket = get_storage_client().bucket(bucket_name)  # type: ignore
+    if not bucket.exists():  # type: ignore
+        # En un entorno de producción, es mejor que el bucket ya esté creado.
+        # Lanzar un error es más seguro que crearlo programáticamente.
+        raise FileNotFoundError(
+            f"El bucket de Google Cloud Storage '{bucket_name}' no existe."
+        )
+    print(f"Conectado exitosamente al bucket: '{bucket_name}'")
+    return bucket
+
 
 class StorageRepository:
     """
@@ -24,20 +95,23 @@ class StorageRepository:
             bucket_name (str): El nombre del bucket al que se subirán los archivos.
         """
         self.bucket_name = bucket_name
+        # Blob ya subido por SHA-256 de su contenido: el contenido repetido se
+        # coloca en sus otros destinos con una copia del lado del servidor.
+        self._blobs_por_contenido: Dict[str, str] = {}
+        # SHA-256 y MD5 (base64, como lo reporta GCS) de cada inodo ya leído
+        self._huellas_por_inodo: Dict[Tuple[int, int], Tuple[str, str]] = {}
+        self._contenido_lock = threading.Lock()
+        # Sincronización incremental: los archivos cuyo checksum coincide con el
+        # del blob ya existente no se vuelven a subir (SER_STORAGE_SYNC=0 la desactiva)
+        self.sincronizar = os.getenv("SER_STORAGE_SYNC", "1") == "1"
+        # Subidas en bloque con transfer_manager: "thread" o "process"
+        self.tipo_workers = os.getenv("SER_STORAGE_TIPO_WORKERS", transfer_manager.THREAD)
+        self.max_workers = int(os.getenv("SER_STORAGE_WORKERS", "8"))
 
         try:
-            # La autenticación se maneja automáticamente a través de la variable
-            # de entorno GOOGLE_APPLICATION_CREDENTIALS.
-            self.storage_client = storage.Client()
-            self.bucket: Bucket = self.storage_client.bucket(self.bucket_name)  # type: ignore
-
-            if not self.bucket.exists():  # type: ignore
-                # En un entorno de producción, es mejor que el bucket ya esté creado.
-                # Lanzar un error es más seguro que crearlo programáticamente.
-                raise FileNotFoundError(
-                    f"El bucket de Google Cloud Storage '{self.bucket_name}' no existe."
-                )
-            print(f"Conectado exitosamente al bucket: '{self.bucket_name}'")
+            # Cliente y bucket compartidos por todos los repositorios del proceso
+            self.storage_client = get_storage_client()
+            self.bucket: Bucket = _bucket_verificado(self.bucket_name)
 
         except exceptions:
             print("Error de autenticación con Google Cloud.")
@@ -64,6 +138,7 @@ class StorageRepository:
         print(f"--- Iniciando subida del directorio '{local_directory_path}' a GCS ---")
 
         # os.walk() recorre el árbol de directorios de forma recursiva
+        tareas: List[Tuple[str, str]] = []
         for root, _, files in os.walk(local_directory_path):
             for filename in files:
                 # 1. Construir la ruta completa del archivo local
@@ -78,21 +153,9 @@ class StorageRepository:
 
                 # GCS usa '/' como separador, independientemente del SO
                 destination_blob_name = destination_blob_name.replace("\\", "/")
+                tareas.append((local_file_path, destination_blob_name))
 
-                print(
-                    f"  -> Subiendo '{local_file_path}' a 'gs://{self.bucket_name}/{destination_blob_name}'..."
-                )
-
-                try:
-                    # 3. Crear un objeto 'blob' en el bucket
-                    blob = self.bucket.blob(destination_blob_name)  # type: ignore
-
-                    # 4. Subir el archivo. Por defecto, esto sobrescribe si ya existe.
-                    blob.upload_from_filename(local_file_path)  # type: ignore
-
-                except Exception as e:
-                    print(f"  -> ERROR al subir el archivo {filename}: {e}")
-
+        self._subir_tareas(tareas)
         print("--- Subida de archivos a Google Cloud Storage completada. ---")
 
     def upload_specific_folder(self, folder_to_upload: str, relative_to_path: str):
@@ -112,6 +175,7 @@ class StorageRepository:
 
         print(f"--- Iniciando subida del directorio '{folder_to_upload}' a GCS ---")
 
+        tareas: List[Tuple[str, str]] = []
         for root, _, files in os.walk(folder_to_upload):
             for filename in files:
                 local_file_path = os.path.join(root, filename)
@@ -119,17 +183,126 @@ class StorageRepository:
                     local_file_path, relative_to_path
                 )
                 destination_blob_name = destination_blob_name.replace("\\", "/")
+                tareas.append((local_file_path, destination_blob_name))
+
+        self._subir_tareas(tareas)
 
+    def _subir_tareas(self, tareas: List[Tuple[str, str]]):
+        """
+        Sube una lista de (archivo local, blob destino) con `subir_lote` y
+        reporta los archivos que no se pudieron subir.
+        """
+        resultados = self.subir_lote(tareas)
+        for resultado in resultados:
+            if not resultado.ok:
                 print(
-                    f"  -> Subiendo '{local_file_path}' a 'gs://{self.bucket_name}/{destination_blob_name}'..."
+                    f"  -> ERROR al subir el archivo {os.path.basename(resultado.local_path)}: "
+                    f"{resultado.error}"
                 )
+        self._imprimir_resumen(resultados)
 
-                try:
-                    blob = self.bucket.blob(destination_blob_name)  # type: ignore
-                    blob.upload_from_filename(local_file_path)  # type: ignore
+    def subir_lote(self, tareas: List[Tuple[str, str]]) -> List[ResultadoSubida]:
+        """
+        Sube en bloque una lista de (archivo local, blob destino) y devuelve un
+        resultado por tarea, en el mismo orden.
+
+        - Los archivos que ya están en el bucket con el mismo contenido se omiten.
+        - Cada contenido nuevo se sube una sola vez con
+          `transfer_manager.upload_many` (SER_STORAGE_WORKERS workers de tipo
+          SER_STORAGE_TIPO_WORKERS); lo que falla en el lote se reintenta
+          individualmente con la política ETAPA_SUBIDA.
+        - Los demás destinos de un contenido ya subido se crean con una copia
+          del lado del servidor.
+        """
+        resultados = [ResultadoSubida(local, destino) for local, destino in tareas]
+        if not resultados:
+            return resultados
+        remotos = self._listar_remotos(destino for _, destino in tareas)
+
+        # Índice del resultado que sube cada contenido nuevo, por SHA-256
+        nuevos: Dict[str, int] = {}
+        copias: List[Tuple[int, str]] = []
+        for indice, resultado in enumerate(resultados):
+            try:
+                sha256 = self._huellas_de_archivo(resultado.local_path)[0]
+            except OSError as e:
+                resultado.error = str(e)
+                continue
+            remoto = remotos.get(resultado.destino)
+            if self._sin_cambios(resultado.local_path, remoto):
+                # Ya está en el bucket: se conserva su URL para el log
+                resultado.estado, resultado.url = RESULTADO_OMITIDO, remoto.public_url  # type: ignore
+                with self._contenido_lock:
+                    self._blobs_por_contenido.setdefault(sha256, resultado.destino)
+                continue
+            with self._contenido_lock:
+                origen = self._blobs_por_contenido.get(sha256)
+            if sha256 in nuevos or (origen and origen != resultado.destino):
+                copias.append((indice, sha256))
+            else:
+                nuevos[sha256] = indice
+
+        if nuevos:
+            self._subir_en_bloque(resultados, nuevos)
+
+        def _copiar(copia: Tuple[int, str]):
+            indice, sha256 = copia
+            resultado = resultados[indice]
+            try:
+                blob = self._subir_o_copiar(sha256, resultado.local_path, resultado.destino)
+            except Exception as e:
+                resultado.error = str(e)
+                return
+            # Si el origen ya no existía, el contenido se subió a este destino
+            with self._contenido_lock:
+                copiado = self._blobs_por_contenido.get(sha256) != resultado.destino
+            resultado.estado = RESULTADO_COPIADO if copiado else RESULTADO_SUBIDO
+            resultado.url = blob.public_url
+
+        if copias:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                list(executor.map(_copiar, copias))
+        return resultados
+
+    def _subir_en_bloque(self, resultados: List[ResultadoSubida], nuevos: Dict[str, int]):
+        """Sube con transfer_manager el primer destino de cada contenido nuevo."""
+        pendientes = [(sha256, resultados[indice]) for sha256, indice in nuevos.items()]
+        blobs = [self.bucket.blob(resultado.destino) for _, resultado in pendientes]  # type: ignore
+        salidas = transfer_manager.upload_many(
+            [(resultado.local_path, blob) for (_, resultado), blob in zip(pendientes, blobs)],
+            max_workers=self.max_workers,
+            worker_type=self.tipo_workers,
+            raise_exception=False,
+        )
 
+        for (sha256, resultado), blob, salida in zip(pendientes, blobs, salidas):
+            if isinstance(salida, Exception):
+                try:
+                    if es_error_permanente(salida):
+                        raise salida
+                    reintentar(
+                        lambda: blob.upload_from_filename(resultado.local_path),  # type: ignore
+                        ETAPA_SUBIDA,
+                        f"Subida de '{resultado.destino}'",
+                    )
                 except Exception as e:
-                    print(f"  -> ERROR al subir el archivo {filename}: {e}")
+                    resultado.error = str(e)
+                    continue
+            resultado.estado, resultado.url = RESULTADO_SUBIDO, blob.public_url
+            with self._contenido_lock:
+                self._blobs_por_contenido.setdefault(sha256, resultado.destino)
+
+    @staticmethod
+    def _imprimir_resumen(resultados: List[ResultadoSubida]):
+        conteos: Dict[str, int] = {}
+        for resultado in resultados:
+            conteos[resultado.estado] = conteos.get(resultado.estado, 0) + 1
+        if conteos.get(RESULTADO_COPIADO):
+            print(f"  -> {conteos[RESULTADO_COPIADO]} archivos con contenido repetido.")
+        if conteos.get(RESULTADO_OMITIDO):
+            print(
+                f"  -> {conteos[RESULTADO_OMITIDO]} archivos sin cambios no se volvieron a subir."
+            )
 
     def upload_period_and_images_standalone(
         self,
@@ -162,7 +335,9 @@ class StorageRepository:
             return [], []  # <-- CAMBIO 2: Devolver tupla de listas vacías
 
         upload_tasks: List[Tuple[str, str]] = []
-        for root, _, files in os.walk(period_path):
+        for root, dirs, files in os.walk(period_path):
+            # Las carpetas ocultas (ej: el almacén '.cas') no se suben
+            dirs[:] = [d for d in dirs if not d.startswith(".")]
             for filename in files:
                 local_file_path = os.path.join(root, filename)
                 destination_blob = os.path.relpath(
@@ -175,29 +350,30 @@ class StorageRepository:
             return [], []
 
         print(
-            f"  -> {len(upload_tasks)} tareas de subida listas. Ejecutando en paralelo..."
+            f"  -> {len(upload_tasks)} tareas de subida listas. Ejecutando en bloque..."
         )
 
-        # --- CAMBIO 3: Preparar listas para recolectar ambos tipos de datos ---
-        uploaded_urls: List[str] = []
-        gsutil_paths: List[str] = []
-
-        def _upload_worker(task: Tuple[str, str]):
-            local_path, destination_path = task
-            try:
-                blob = self.bucket.blob(destination_path)  # type: ignore
-                blob.upload_from_filename(local_path)  # type: ignore
-                uploaded_urls.append(blob.public_url)
-                gsutil_paths.append(
-                    f"gs://{self.bucket_name}/{destination_path}"
-                )  # Añadir la ruta gsutil
-            except Exception as e:
-                print(
-                    f"    -> ERROR al subir '{local_path}' a '{destination_path}': {e}"
-                )
+        resultados = self.subir_lote(upload_tasks)
+        fallidos = [r for r in resultados if not r.ok]
+        for resultado in fallidos:
+            print(
+                f"    -> ERROR al subir '{resultado.local_path}' a '{resultado.destino}': "
+                f"{resultado.error}"
+            )
+        self._imprimir_resumen(resultados)
+        if fallidos:
+            # Sin esto el log quedaría registrado sin esos archivos; al reanudar,
+            # los ya subidos se omiten por checksum y solo se suben los fallidos
+            raise RuntimeError(
+                f"{len(fallidos)} archivos del período {anio}-T{periodo} del NIT {nit} "
+                "no se pudieron subir tras los reintentos."
+            )
 
-        with ThreadPoolExecutor(max_workers=10) as executor:
-            executor.map(_upload_worker, upload_tasks)
+        # --- CAMBIO 3: URLs y rutas gsutil en el orden de las tareas ---
+        uploaded_urls: List[str] = [r.url for r in resultados]  # type: ignore
+        gsutil_paths: List[str] = [
+            f"gs://{self.bucket_name}/{r.destino}" for r in resultados
+        ]
 
         print(
             f"--- Subida para NIT {nit} completada. Se subieron {len(uploaded_urls)} archivos. ---"
@@ -205,90 +381,331 @@ class StorageRepository:
 
         return uploaded_urls, gsutil_paths  # <-- CAMBIO 4: Devolver ambas listas
 
-    '''
-    def upload_period_and_images_standalone(
+    def subida_continua(
         self,
         base_download_path: str,
         seccion: str,
         anio: int,
-        periodo: int,
         nit: str,
         expediente: str,
-    ):
+        trimestres: List[int],
+    ) -> "SubidaContinua":
         """
-        Sube los archivos de un período específico Y las imágenes generales para un ÚNICO NIT.
-        Esta función es independiente y ahora es específica para un solo NIT.
+        Abre una subida continua para los trimestres de un NIT/expediente en un
+        año: los archivos se suben a medida que el scraping los guarda.
         """
-        period_folder_name = f"{periodo}T"
-        # Construye la ruta directa a la carpeta del NIT que se está procesando
-        nit_folder_path = os.path.join(
-            base_download_path, seccion, str(anio), f"{nit}-{expediente}"
+        return SubidaContinua(
+            self, base_download_path, seccion, anio, nit, expediente, trimestres
         )
 
-        if not os.path.isdir(nit_folder_path):
-            print(
-                f"Advertencia: La carpeta del NIT '{nit_folder_path}' no existe. No se subirá nada."
-            )
-            return
+    def _huellas_de_archivo(self, local_path: str) -> Tuple[str, str]:
+        """
+        SHA-256 (hex) y MD5 (base64, el formato de `Blob.md5_hash`) del
+        contenido de un archivo, calculados en una sola lectura. Los hardlinks
+        del almacén local comparten inodo, así que cada inodo se lee una sola vez.
+        """
+        info = os.stat(local_path)
+        inodo = (info.st_dev, info.st_ino)
+        with self._contenido_lock:
+            huellas = self._huellas_por_inodo.get(inodo)
+        if huellas:
+            return huellas
+
+        sha256 = hashlib.sha256()
+        md5 = hashlib.md5()
+        with open(local_path, "rb") as archivo:
+            for bloque in iter(lambda: archivo.read(1024 * 1024), b""):
+                sha256.update(bloque)
+                md5.update(bloque)
+        huellas = (sha256.hexdigest(), base64.b64encode(md5.digest()).decode("ascii"))
+        if info.st_ino:
+            with self._contenido_lock:
+                self._huellas_por_inodo[inodo] = huellas
+        return huellas
+
+    @staticmethod
+    def _crc32c_de_archivo(local_path: str) -> str:
+        """CRC32C en base64, el formato de `Blob.crc32c`."""
+        checksum = google_crc32c.Checksum()
+        with open(local_path, "rb") as archivo:
+            for bloque in iter(lambda: archivo.read(1024 * 1024), b""):
+                checksum.update(bloque)
+        return base64.b64encode(checksum.digest()).decode("ascii")
+
+    # ------------------------------------------------------------------
+    # Sincronización incremental
+    # ------------------------------------------------------------------
+    def _listar_remotos(self, destinos: Iterable[str]) -> Dict[str, "storage.Blob"]:
+        """
+        Lista una sola vez los blobs bajo el prefijo común de `destinos` y los
+        devuelve por nombre. Si los destinos no comparten prefijo se lista cada
+        carpeta de primer nivel, para no recorrer el bucket completo.
+        """
+        if not self.sincronizar:
+            return {}
+        destinos = list(destinos)
+        if not destinos:
+            return {}
+        comun = os.path.commonpath([os.path.dirname(d) for d in destinos])
+        if comun:
+            prefijos = {f"{comun.replace(os.sep, '/')}/"}
+        else:
+            # Sin carpeta común: cada carpeta de primer nivel, o el propio
+            # nombre para los archivos sueltos en la raíz
+            prefijos = {
+                f"{destino.split('/')[0]}/" if "/" in destino else destino
+                for destino in destinos
+            }
+
+        remotos: Dict[str, storage.Blob] = {}
+        try:
+            for prefijo in prefijos:
+                for blob in self.storage_client.list_blobs(self.bucket, prefix=prefijo):
+                    remotos[blob.name] = blob
+        except Exception as e:
+            print(f"  -> ADVERTENCIA: no se pudo listar el bucket, se sube todo: {e}")
+            return {}
+        return remotos
 
-        print(
-            f"--- Iniciando subida para NIT {nit}, período '{period_folder_name}' ---"
+    def _sin_cambios(self, local_path: str, remoto: Optional["storage.Blob"]) -> bool:
+        """
+        Verdadero si el blob remoto tiene el mismo contenido que el archivo
+        local. Se compara el tamaño y luego el MD5; los objetos compuestos no
+        tienen MD5 y se comparan por CRC32C.
+        """
+        if remoto is None:
+            return False
+        try:
+            if remoto.size is not None and remoto.size != os.path.getsize(local_path):
+                return False
+            if remoto.md5_hash:
+                return remoto.md5_hash == self._huellas_de_archivo(local_path)[1]
+            if remoto.crc32c:
+                return remoto.crc32c == self._crc32c_de_archivo(local_path)
+        except OSError:
+            pass
+        return False
+
+    def _subir_o_copiar(self, sha256: str, local_path: str, destination_path: str):
+        """
+        Sube el archivo si su contenido aún no está en el bucket; si ya se subió
+        en esta ingesta, lo copia del lado del servidor desde ese blob.
+        """
+        with self._contenido_lock:
+            origen = self._blobs_por_contenido.get(sha256)
+
+        if origen and origen != destination_path:
+            try:
+                return reintentar(
+                    lambda: self.bucket.copy_blob(  # type: ignore
+                        self.bucket.blob(origen), self.bucket, destination_path  # type: ignore
+                    ),
+                    ETAPA_SUBIDA,
+                    f"Copia a '{destination_path}'",
+                )
+            except exceptions.NotFound:
+                # El blob de origen ya no existe: se vuelve a subir
+                pass
+
+        blob = self.bucket.blob(destination_path)  # type: ignore
+        reintentar(
+            lambda: blob.upload_from_filename(local_path),  # type: ignore
+            ETAPA_SUBIDA,
+            f"Subida de '{destination_path}'",
         )
+        with self._contenido_lock:
+            # Un origen que ya no existe se reemplaza por este destino
+            if self._blobs_por_contenido.get(sha256) in (None, origen):
+                self._blobs_por_contenido[sha256] = destination_path
+        return blob
 
-        upload_tasks = []
-
-        # --- 1. SUBIR ARCHIVOS DEL PERÍODO (CON DUPLICACIÓN) ---
-        period_path = os.path.join(nit_folder_path, period_folder_name)
-        if os.path.isdir(period_path):
-            print(f"  -> Encontrada carpeta de período '{period_folder_name}'.")
-            for root, _, files in os.walk(period_path):
-                for filename in files:
-                    local_file_path = os.path.join(root, filename)
-                    # Tarea 1: Subida a la ruta original
-                    dest_blob_original = os.path.relpath(
-                        local_file_path, base_download_path
-                    ).replace("\\", "/")
-                    upload_tasks.append((local_file_path, dest_blob_original))
-                    # Tarea 2: Subida a la raíz del período
-                    period_root_path = os.path.join(
-                        nit_folder_path, period_folder_name, filename
-                    )
-                    dest_blob_copy = os.path.relpath(
-                        period_root_path, base_download_path
-                    ).replace("\\", "/")
-                    upload_tasks.append((local_file_path, dest_blob_copy))
-        else:
-            print(f"  -> No se encontró carpeta del período '{period_folder_name}'.")
-
-        # --- 2. SUBIR IMÁGENES GENERALES (.png) DE LA RAÍZ DEL NIT ---
-        print("  -> Buscando imágenes generales (.png)...")
-        for item in os.listdir(nit_folder_path):
-            if item.lower().endswith(".png"):
-                local_image_path = os.path.join(nit_folder_path, item)
-                if os.path.isfile(local_image_path):
-                    dest_blob_image = os.path.relpath(
-                        local_image_path, base_download_path
-                    ).replace("\\", "/")
-                    upload_tasks.append((local_image_path, dest_blob_image))
 
-        if not upload_tasks:
-            print("  -> No se encontraron archivos para subir en este NIT y período.")
-            return
+class SubidaContinua:
+    """
+    Subida de un grupo solapada con su scraping (productor/consumidor).
+
+    El scraping encola cada FUR o captura con `encolar` apenas está en disco y
+    SER_SUBIDA_CONTINUA_HILOS hilos (4 por defecto) lo suben mientras el
+    navegador sigue con la siguiente fila. La cola es acotada
+    (SER_SUBIDA_COLA, 100 por defecto): si las subidas se atrasan, el scraping
+    espera en lugar de acumular trabajo sin límite.
+
+    `cerrar` espera a que la cola se vacíe y arma las URLs y rutas gsutil de
+    cada trimestre con los resultados de las subidas, sin volver a recorrer
+    las carpetas. Solo se suben los archivos de las carpetas de los trimestres
+    pedidos, igual que `upload_period_and_images_standalone`.
+    """
 
-        print(
-            f"  -> {len(upload_tasks)} tareas de subida listas. Ejecutando en paralelo..."
+    def __init__(
+        self,
+        repo: StorageRepository,
+        base_download_path: str,
+        seccion: str,
+        anio: int,
+        nit: str,
+        expediente: str,
+        trimestres: List[int],
+    ):
+        self.repo = repo
+        self.base_download_path = base_download_path
+        self.carpeta_grupo = os.path.join(
+            base_download_path, seccion, str(anio), f"{nit}-{expediente}"
+        )
+        self.trimestres = set(trimestres)
+        self.nit = nit
+
+        # Blob destino -> URL pública, por trimestre
+        self._resultados: Dict[int, Dict[str, str]] = {t: {} for t in trimestres}
+        self._fallidos: Dict[str, str] = {}
+        # Un archivo puede encolarse más de una vez (ej: scraping repetido tras
+        # abrirse el circuito del SER); solo cuenta el resultado del último
+        self._versiones: Dict[str, int] = {}
+        self._omitidos = 0
+        self._lock = threading.Lock()
+        # Tras abortar o cerrar, `encolar` ya no acepta archivos; tras abortar,
+        # los hilos descartan lo que aún llegue a la cola
+        self._cerrada = False
+        self._abortada = False
+
+        # Un solo listado de las carpetas de los trimestres para comparar checksums
+        destino_grupo = os.path.relpath(self.carpeta_grupo, base_download_path).replace(
+            os.sep, "/"
         )
+        self._remotos = repo._listar_remotos(
+            f"{destino_grupo}/{trimestre}T/" for trimestre in trimestres
+        )
+        self._cola: "queue.Queue[Optional[Tuple[str, str, int, int]]]" = queue.Queue(
+            maxsize=int(os.getenv("SER_SUBIDA_COLA", "100"))
+        )
+        self._hilos = [
+            threading.Thread(
+                target=self._trabajar, name=f"ser-subida-{i}", daemon=True
+            )
+            for i in range(int(os.getenv("SER_SUBIDA_CONTINUA_HILOS", "4")))
+        ]
+        for hilo in self._hilos:
+            hilo.start()
+
+    def _trimestre_de(self, local_path: str) -> Optional[int]:
+        relativa = os.path.relpath(local_path, self.carpeta_grupo)
+        carpeta = relativa.split(os.sep)[0]
+        if relativa.startswith("..") or not carpeta.endswith("T"):
+            return None
+        try:
+            trimestre = int(carpeta[:-1])
+        except ValueError:
+            return None
+        return trimestre if trimestre in self.trimestres else None
 
-        def _upload_worker(task):
-            local_path, destination_path = task
+    def encolar(self, local_path: str):
+        """
+        Encola un archivo ya escrito. Bloquea si la cola está llena, salvo que
+        la subida se cierre mientras tanto: después de `abortar` o `cerrar` no
+        hace nada, para que ningún hilo quede esperando una cola sin consumidores.
+        """
+        trimestre = self._trimestre_de(local_path)
+        if trimestre is None:
+            return
+        destino = os.path.relpath(local_path, self.base_download_path).replace("\\", "/")
+        with self._lock:
+            if self._cerrada:
+                return
+            version = self._versiones.get(destino, 0) + 1
+            self._versiones[destino] = version
+        tarea = (local_path, destino, trimestre, version)
+        while True:
             try:
-                blob = self.bucket.blob(destination_path)
-                blob.upload_from_filename(local_path)
-            except Exception as e:
-                print(f"    -> ERROR al subir '{local_path}': {e}")
+                self._cola.put(tarea, timeout=0.5)
+                return
+            except queue.Full:
+                with self._lock:
+                    if self._cerrada:
+                        return
+
+    def _trabajar(self):
+        while True:
+            tarea = self._cola.get()
+            if tarea is None:
+                return
+            with self._lock:
+                if self._abortada:
+                    continue
+            self._subir(*tarea)
+
+    def _subir(self, local_path: str, destino: str, trimestre: int, version: int):
+        try:
+            sha256 = self.repo._huellas_de_archivo(local_path)[0]
+            remoto = self._remotos.get(destino)
+            if self.repo._sin_cambios(local_path, remoto):
+                blob = remoto
+                omitido = True
+                with self.repo._contenido_lock:
+                    self.repo._blobs_por_contenido.setdefault(sha256, destino)
+            else:
+                blob = self.repo._subir_o_copiar(sha256, local_path, destino)
+                omitido = False
+        except Exception as e:
+            print(f"    -> ERROR al subir '{local_path}' a '{destino}': {e}")
+            with self._lock:
+                if self._versiones.get(destino) == version:
+                    self._fallidos[destino] = str(e)
+            return
 
-        with ThreadPoolExecutor(max_workers=10) as executor:
-            executor.map(_upload_worker, upload_tasks)
+        with self._lock:
+            if self._versiones.get(destino) != version:
+                return
+            self._fallidos.pop(destino, None)
+            self._resultados[trimestre][destino] = blob.public_url  # type: ignore
+            self._omitidos += omitido
+
+    def _detener(self, descartar_pendientes: bool = False):
+        with self._lock:
+            self._cerrada = True
+            self._abortada = descartar_pendientes
+        if descartar_pendientes:
+            while True:
+                try:
+                    self._cola.get_nowait()
+                except queue.Empty:
+                    break
+        for _ in self._hilos:
+            self._cola.put(None)
+        for hilo in self._hilos:
+            hilo.join()
+
+    def abortar(self):
+        """
+        Descarta las subidas aún en cola y detiene los hilos, sin reportar nada.
+        Los archivos que se sigan guardando después ya no se encolan.
+        """
+        self._detener(descartar_pendientes=True)
+
+    def cerrar(self) -> Dict[int, Tuple[List[str], List[str]]]:
+        """
+        Espera las subidas encoladas y devuelve, por trimestre, las URLs
+        públicas y las rutas gsutil, en el mismo orden.
 
-        print(f"--- Subida para NIT {nit} completada. ---")
-    '''
+        Raises:
+            RuntimeError: Si algún archivo no se pudo subir tras los reintentos.
+        """
+        self._detener()
+        if self._omitidos:
+            print(f"  -> {self._omitidos} archivos sin cambios no se volvieron a subir.")
+        if self._fallidos:
+            raise RuntimeError(
+                f"{len(self._fallidos)} archivos del NIT {self.nit} no se pudieron "
+                "subir tras los reintentos."
+            )
+
+        subidas: Dict[int, Tuple[List[str], List[str]]] = {}
+        for trimestre, urls_por_destino in self._resultados.items():
+            destinos = sorted(urls_por_destino)
+            subidas[trimestre] = (
+                [urls_por_destino[d] for d in destinos],
+                [f"gs://{self.repo.bucket_name}/{d}" for d in destinos],
+            )
+        total = sum(len(urls) for urls, _ in subidas.values())
+        print(
+            f"--- Subida continua para NIT {self.nit} completada. Se subieron {total} archivos. ---"
+        )
+        return subidas
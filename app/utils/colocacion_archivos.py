@@ -0,0 +1,169 @@
+import errno
+import hashlib
+import os
+import shutil
+import time
+import uuid
+from typing import List
+
+
+def directorio_descargas_temporales() -> str:
+    """
+    Carpeta que se pasa a Chromium como `downloads_path`.
+
+    Debe estar en el mismo sistema de archivos que DOWNLOAD_PATH para que las
+    descargas se muevan a su destino con un simple rename. Por defecto es la
+    carpeta hermana '<DOWNLOAD_PATH>-tmp'; se puede cambiar con SER_DOWNLOADS_TMP_PATH.
+    """
+    download_path = os.getenv("DOWNLOAD_PATH", "descargas").rstrip("/\\")
+    ruta = os.getenv("SER_DOWNLOADS_TMP_PATH") or f"{download_path}-tmp"
+    os.makedirs(ruta, exist_ok=True)
+    return ruta
+
+
+def directorio_ingesta(clave: str) -> str:
+    """
+    Carpeta de descargas propia de una ingesta (o de uno de sus shards, ver
+    `clave_shard`): '<DOWNLOAD_PATH>/<clave>'. Así una ingesta nueva nunca
+    borra los archivos de otra que sigue en curso o que quedó por reanudar.
+    """
+    return os.path.join(os.getenv("DOWNLOAD_PATH", "descargas"), clave)
+
+
+def preparar_directorio_ingesta(clave: str, reanudada: bool) -> str:
+    """
+    Devuelve la carpeta de la ingesta, vaciándola si quedó de un intento
+    anterior (al reanudar se conserva para reutilizar lo ya descargado).
+    """
+    ruta = directorio_ingesta(clave)
+    if os.path.exists(ruta) and not reanudada:
+        print(f"🧹 Limpiando directorio de descargas de la ingesta: {ruta}")
+        shutil.rmtree(ruta)
+    return ruta
+
+
+def liberar_directorio_ingesta(ruta: str):
+    """
+    Borra la carpeta de una ingesta terminada sin pendientes y poda del
+    almacén las capturas que ya ninguna carpeta usa.
+    """
+    print(f"🧹 Liberando directorio de descargas de la ingesta: {ruta}")
+    shutil.rmtree(ruta, ignore_errors=True)
+    podar_almacen()
+
+
+def podar_almacen(antiguedad_seg: float = 3600):
+    """
+    Elimina del almacén los archivos sin otros hardlinks (ninguna carpeta de
+    período los referencia). Solo los de más de `antiguedad_seg`, para no
+    tocar uno recién escrito que otra ingesta está por enlazar.
+    """
+    limite = time.time() - antiguedad_seg
+    for raiz, _, archivos in os.walk(directorio_almacen()):
+        for nombre in archivos:
+            ruta = os.path.join(raiz, nombre)
+            try:
+                info = os.stat(ruta)
+                if info.st_nlink <= 1 and info.st_mtime < limite:
+                    os.remove(ruta)
+            except OSError:
+                continue
+
+
+def enlazar(origen: str, destino: str):
+    """Crea `destino` como hardlink de `origen`, o lo copia si no se puede enlazar."""
+    if os.path.abspath(origen) == os.path.abspath(destino):
+        return
+    if os.path.lexists(destino):
+        os.remove(destino)
+    try:
+        os.link(origen, destino)
+    except OSError:
+        # Otro sistema de archivos o sin soporte de hardlinks
+        shutil.copy2(origen, destino)
+
+
+def colocar_archivo(origen: str, destinos: List[str]) -> str:
+    """
+    Mueve `origen` al primer destino con un rename y deja el resto de destinos
+    como hardlinks del primero, sin copiar bytes.
+
+    Si el rename cruza sistemas de archivos se recurre a mover copiando, y si
+    no se pueden crear hardlinks se copia; el resultado es el mismo.
+
+    Returns:
+        str: La ruta del primer destino.
+    """
+    principal = destinos[0]
+    os.makedirs(os.path.dirname(principal) or ".", exist_ok=True)
+    try:
+        os.replace(origen, principal)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        shutil.move(origen, principal)
+
+    for destino in destinos[1:]:
+        os.makedirs(os.path.dirname(destino) or ".", exist_ok=True)
+        enlazar(principal, destino)
+    return principal
+
+
+def directorio_almacen() -> str:
+    """
+    Almacén local direccionado por contenido: '<DOWNLOAD_PATH>/.cas'. Al estar
+    dentro de DOWNLOAD_PATH comparte sistema de archivos con las carpetas de
+    período de todas las ingestas; lo que ya no usan se poda con `podar_almacen`.
+    """
+    return os.path.join(os.getenv("DOWNLOAD_PATH", "descargas"), ".cas")
+
+
+def _escribir_en_almacen(ruta: str, contenido: bytes):
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    # Se escribe en un temporal y se renombra para que otro hilo nunca lea
+    # una copia a medio escribir
+    temporal = f"{ruta}.{uuid.uuid4().hex}.tmp"
+    with open(temporal, "wb") as archivo:
+        archivo.write(contenido)
+    os.replace(temporal, ruta)
+
+
+def guardar_por_contenido(contenido: bytes, destinos: List[str]) -> str:
+    """
+    Guarda `contenido` una sola vez en el almacén, bajo su SHA-256, y deja cada
+    destino como hardlink a esa copia. Contenido repetido no ocupa más disco.
+
+    Returns:
+        str: El SHA-256 del contenido.
+    """
+    sha256 = hashlib.sha256(contenido).hexdigest()
+    ruta = os.path.join(directorio_almacen(), sha256[:2], sha256)
+    try:
+        # Reutilizar una copia la rejuvenece, para que `podar_almacen` no la
+        # borre antes de enlazarla
+        os.utime(ruta)
+    except FileNotFoundError:
+        _escribir_en_almacen(ruta, contenido)
+
+    for destino in destinos:
+        os.makedirs(os.path.dirname(destino) or ".", exist_ok=True)
+        try:
+            enlazar(ruta, destino)
+        except FileNotFoundError:
+            # La poda la borró de todos modos: se vuelve a escribir
+            _escribir_en_almacen(ruta, contenido)
+            enlazar(ruta, destino)
+    return sha256
+
+
+def colocar_descarga(download, destinos: List[str]) -> str:
+    """
+    Coloca una descarga de Playwright (API síncrona) en sus destinos a partir
+    del archivo que Chromium ya escribió en `downloads_path`.
+    """
+    return colocar_archivo(str(download.path()), destinos)
+
+
+async def colocar_descarga_async(download, destinos: List[str]) -> str:
+    """Equivalente de `colocar_descarga` para la API asíncrona de Playwright."""
+    return colocar_archivo(str(await download.path()), destinos)
@@ -0,0 +1,201 @@
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Any, Callable, Deque, Dict, Iterator, Optional, Tuple
+
+# Operaciones observadas en el portal y su latencia objetivo por defecto (s)
+OPERACION_ESPERA = "espera"
+OPERACION_DESCARGA = "descarga"
+OPERACION_NAVEGACION = "navegacion"
+LATENCIAS_OBJETIVO = {
+    OPERACION_ESPERA: 10.0,
+    OPERACION_DESCARGA: 20.0,
+    OPERACION_NAVEGACION: 15.0,
+}
+
+
+class ControladorConcurrencia:
+    """
+    Controla cuántas sesiones del SER corren a la vez según lo que el portal
+    está respondiendo (AIMD: aumento aditivo, disminución multiplicativa).
+
+    Las sesiones piden turno con `sesion()` y las operaciones sobre el portal
+    (esperas de tabla/paginador y descargas) se reportan con `registrar`. Cada
+    `ventana` observaciones se evalúa la ventana: si la tasa de error supera
+    `tasa_error_max` o el p90 de latencia (relativa al objetivo de cada
+    operación) supera 1, el límite se multiplica por `factor_reduccion`; si no,
+    sube en 1. El límite siempre queda entre `piso` y `techo`.
+
+    Variables de entorno (ver `desde_entorno`):
+        SER_CONCURRENCIA_MIN, SER_CONCURRENCIA_MAX, SER_CONCURRENCIA_INICIAL,
+        SER_CONCURRENCIA_VENTANA, SER_CONCURRENCIA_TASA_ERROR_MAX,
+        SER_CONCURRENCIA_FACTOR_REDUCCION, SER_LATENCIA_OBJETIVO_<OPERACION>_SEG.
+    """
+
+    def __init__(
+        self,
+        piso: int,
+        techo: int,
+        inicial: Optional[int] = None,
+        ventana: int = 20,
+        tasa_error_max: float = 0.2,
+        factor_reduccion: float = 0.7,
+        latencias_objetivo: Optional[Dict[str, float]] = None,
+    ):
+        self.piso = max(1, piso)
+        self.techo = max(self.piso, techo)
+        self.limite = float(min(self.techo, max(self.piso, inicial or self.techo)))
+        self.ventana = max(1, ventana)
+        self.tasa_error_max = tasa_error_max
+        self.factor_reduccion = factor_reduccion
+        self.latencias_objetivo = dict(LATENCIAS_OBJETIVO, **(latencias_objetivo or {}))
+
+        self.en_curso = 0
+        self.ajustes = 0
+        self._observaciones: Deque[Tuple[float, bool]] = deque()
+        self._ultima_evaluacion: Dict[str, Any] = {}
+        self._condicion = threading.Condition()
+
+    @classmethod
+    def desde_entorno(cls, techo_por_defecto: int) -> "ControladorConcurrencia":
+        latencias = {
+            operacion: float(
+                os.getenv(f"SER_LATENCIA_OBJETIVO_{operacion.upper()}_SEG", str(objetivo))
+            )
+            for operacion, objetivo in LATENCIAS_OBJETIVO.items()
+        }
+        techo = int(os.getenv("SER_CONCURRENCIA_MAX", str(techo_por_defecto)))
+        inicial = os.getenv("SER_CONCURRENCIA_INICIAL")
+        return cls(
+            piso=int(os.getenv("SER_CONCURRENCIA_MIN", "1")),
+            techo=techo,
+            inicial=int(inicial) if inicial else None,
+            ventana=int(os.getenv("SER_CONCURRENCIA_VENTANA", "20")),
+            tasa_error_max=float(os.getenv("SER_CONCURRENCIA_TASA_ERROR_MAX", "0.2")),
+            factor_reduccion=float(os.getenv("SER_CONCURRENCIA_FACTOR_REDUCCION", "0.7")),
+            latencias_objetivo=latencias,
+        )
+
+    # ------------------------------------------------------------------
+    # Turnos de sesión
+    # ------------------------------------------------------------------
+    @property
+    def nivel(self) -> int:
+        """Sesiones simultáneas permitidas en este momento."""
+        return max(self.piso, int(self.limite))
+
+    def adquirir(self):
+        """Bloquea hasta que haya cupo para una sesión más."""
+        with self._condicion:
+            while self.en_curso >= self.nivel:
+                self._condicion.wait()
+            self.en_curso += 1
+
+    def liberar(self):
+        with self._condicion:
+            self.en_curso -= 1
+            self._condicion.notify_all()
+
+    def hay_cupo(self) -> bool:
+        """Sin bloquear: si cabe una sesión más (para quien lleva su propia cuenta)."""
+        with self._condicion:
+            return self.en_curso < self.nivel
+
+    @contextmanager
+    def sesion(self) -> Iterator[None]:
+        self.adquirir()
+        try:
+            yield
+        finally:
+            self.liberar()
+
+    # ------------------------------------------------------------------
+    # Observaciones y ajuste AIMD
+    # ------------------------------------------------------------------
+    def registrar(self, operacion: str, latencia_seg: float, exito: bool):
+        objetivo = self.latencias_objetivo.get(operacion, LATENCIAS_OBJETIVO[OPERACION_ESPERA])
+        with self._condicion:
+            self._observaciones.append((latencia_seg / objetivo, exito))
+            if len(self._observaciones) >= self.ventana:
+                self._evaluar()
+
+    def _evaluar(self):
+        observaciones = list(self._observaciones)
+        self._observaciones.clear()
+        errores = sum(1 for _, exito in observaciones if not exito)
+        tasa_error = errores / len(observaciones)
+        relativas = sorted(relativa for relativa, exito in observaciones if exito)
+        p90 = relativas[int(0.9 * (len(relativas) - 1))] if relativas else 0.0
+
+        anterior = self.nivel
+        if tasa_error > self.tasa_error_max or p90 > 1.0:
+            self.limite = max(float(self.piso), self.limite * self.factor_reduccion)
+        else:
+            self.limite = min(float(self.techo), self.limite + 1.0)
+        self._ultima_evaluacion = {
+            "tasa_error": round(tasa_error, 3),
+            "latencia_p90_relativa": round(p90, 2),
+        }
+        if self.nivel != anterior:
+            self.ajustes += 1
+            print(
+                f"🎚️ Concurrencia del SER: {anterior} -> {self.nivel} sesiones "
+                f"(errores {tasa_error:.0%}, p90 {p90:.2f}x del objetivo)."
+            )
+            self._condicion.notify_all()
+
+    def estado(self) -> Dict[str, Any]:
+        with self._condicion:
+            return {
+                "nivel": self.nivel,
+                "en_curso": self.en_curso,
+                "piso": self.piso,
+                "techo": self.techo,
+                "ajustes": self.ajustes,
+                "observaciones_pendientes": len(self._observaciones),
+                "ultima_evaluacion": dict(self._ultima_evaluacion),
+            }
+
+
+@lru_cache()
+def get_controlador_concurrencia() -> ControladorConcurrencia:
+    """Devuelve el controlador de concurrencia único del proceso."""
+    return ControladorConcurrencia.desde_entorno(
+        techo_por_defecto=int(os.getenv("SER_BROWSER_POOL_SIZE", "4"))
+    )
+
+
+# Destino de las observaciones del proceso. En los procesos de trabajo se
+# reemplaza para reenviarlas al controlador del proceso principal.
+_observador: Optional[Callable[[str, float, bool], None]] = None
+
+
+def establecer_observador(observador: Optional[Callable[[str, float, bool], None]]):
+    global _observador
+    _observador = observador
+
+
+def registrar_observacion(operacion: str, latencia_seg: float, exito: bool):
+    """Reporta una operación sobre el portal del SER al controlador."""
+    try:
+        if _observador is not None:
+            _observador(operacion, latencia_seg, exito)
+        else:
+            get_controlador_concurrencia().registrar(operacion, latencia_seg, exito)
+    except Exception as e:
+        print(f"⚠️ No se pudo registrar la observación de concurrencia: {e}")
+
+
+@contextmanager
+def observar(operacion: str) -> Iterator[None]:
+    """Mide el bloque y lo reporta como exitoso o fallido según si lanza."""
+    inicio = time.monotonic()
+    try:
+        yield
+    except Exception:
+        registrar_observacion(operacion, time.monotonic() - inicio, False)
+        raise
+    registrar_observacion(operacion, time.monotonic() - inicio, True)
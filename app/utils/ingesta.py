@@ -0,0 +1,414 @@
+import os
+from contextlib import nullcontext
+from dataclasses import dataclass
+from datetime import date, datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.playwright.BrowserPool import BrowserPool
+from app.playwright.CapturaEvidencia import EXTENSIONES_IMAGEN
+from app.playwright.SerAuthenticator import SerAuthenticator
+from app.playwright.SerService import SerService
+from app.repository.BigQueryRepository import BigQueryRepository, RpaFursLog
+from app.repository.ManifiestoRepository import (
+    ETAPA_REGISTRADO,
+    ETAPA_SCRAPEADO,
+    ETAPA_SUBIDO,
+    ManifiestoRepository,
+)
+from app.repository.StorageRepository import StorageRepository
+from app.utils.concurrencia import ControladorConcurrencia
+from app.utils.fecha_habil_colombia import (
+    get_next_business_day,
+    get_previous_business_day,
+)
+from app.utils.planificacion import GrupoTrabajo, planificar_reanudacion
+from app.utils.proteccion_ser import CircuitoAbierto, CircuitoSer
+from app.utils.trabajos import (
+    ESTADO_CANCELADO,
+    ESTADO_COMPLETADO,
+    ESTADO_EN_PROCESO,
+    ESTADO_ERROR,
+    ESTADO_ESTACIONADO,
+    ESTADO_OMITIDO,
+    TrabajoCancelado,
+)
+
+
+@dataclass
+class ContextoIngesta:
+    """
+    Recursos de una ingesta dentro de un proceso: repositorios, manifiesto,
+    pool de navegadores y autenticador. En el modo de procesos cada proceso
+    de trabajo arma el suyo.
+
+    Con `controlador`, cada sesión del SER espera turno según la concurrencia
+    que el portal está soportando. En el modo de procesos los turnos los
+    reparte el proceso principal y los procesos de trabajo no llevan controlador.
+
+    Con `circuito`, mientras el portal se considere caído las sesiones nuevas
+    quedan estacionadas sin abrir navegador, y un scraping interrumpido por la
+    apertura del circuito se repite cuando el portal vuelve.
+    """
+
+    ingestion_id: str
+    ingestion_timestamp_global: str
+    download_folder: str
+    storage_repo: StorageRepository
+    bq_repo: BigQueryRepository
+    manifiesto: ManifiestoRepository
+    browser_pool: BrowserPool
+    autenticador: SerAuthenticator
+    modo_sesion: str
+    controlador: Optional[ControladorConcurrencia] = None
+    circuito: Optional[CircuitoSer] = None
+
+    def turno_ser(self):
+        """Turno para abrir una sesión del SER (sin controlador, inmediato)."""
+        return self.controlador.sesion() if self.controlador else nullcontext()
+
+
+def construir_log(
+    item: Dict[str, Any],
+    anio: int,
+    trimestre: int,
+    uploaded_urls: List[str],
+    gsutil_paths: List[str],
+    ingestion_timestamp_global: str,
+) -> Dict[str, Any]:
+    """
+    Arma el registro de log de un ítem, clasificando los archivos subidos en
+    imágenes y documentos según su extensión.
+    """
+    image_urls, gs_images, doc_urls, gs_docs = [], [], [], []
+    for url, gs_path in zip(uploaded_urls, gsutil_paths):
+        if gs_path.lower().endswith(EXTENSIONES_IMAGEN):
+            image_urls.append(url)
+            gs_images.append(gs_path)
+        elif gs_path.lower().endswith(".pdf"):
+            doc_urls.append(url)
+            gs_docs.append(gs_path)
+
+    return {
+        "year": anio,
+        "nitOperador": str(item["Identificacion"]),
+        "expediente": str(item["Expediente"]),
+        "trimestre": trimestre,
+        "cod_seven": item.get("Cod_Servicio_Seven"),
+        "subido_a_storage": bool(uploaded_urls),
+        "links_imagenes": image_urls,
+        "gsutil_log_images": gs_images,
+        "links_documentos": doc_urls,
+        "gsutil_log_documents": gs_docs,
+        "ingestion_timestamp": datetime.now(timezone.utc).isoformat(),
+        "codigo_servicio": item.get("Cod_Servicio"),
+        "servicio": item.get("Servicio"),
+        "expediente_habilitado": "NO",
+        "ingestion_timestamp_global": ingestion_timestamp_global,
+    }
+
+
+def subir_y_registrar_trimestre(
+    storage_repo: StorageRepository,
+    bq_repo: BigQueryRepository,
+    grupo: GrupoTrabajo,
+    trimestre: int,
+    base_download_path: str,
+    ingestion_id: str,
+    ingestion_timestamp_global: str,
+    manifiesto: ManifiestoRepository,
+    subida_previa: Optional[Tuple[List[str], List[str]]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Sube la carpeta de un trimestre ya descargado e inserta un log por cada
+    registro (servicio) del grupo en ese trimestre, dejando constancia de
+    cada etapa en el manifiesto. Con `subida_previa` (ingesta reanudada) no
+    se vuelve a subir y solo se registra.
+    """
+    nit, expediente, anio = grupo.clave
+    if subida_previa is not None:
+        uploaded_urls, gsutil_paths = subida_previa
+        print(f"⏩ NIT {nit} | {anio}-T{trimestre} ya subido; solo se registra.")
+    else:
+        print(f"🟦 Iniciando subida a Storage para NIT {nit} | {anio}-T{trimestre}...")
+        uploaded_urls, gsutil_paths = storage_repo.upload_period_and_images_standalone(
+            base_download_path=base_download_path,
+            seccion="ia",
+            anio=anio,
+            periodo=trimestre,
+            nit=nit,
+            expediente=expediente,
+        )
+        manifiesto.marcar(
+            nit, expediente, anio, trimestre, ETAPA_SUBIDO, uploaded_urls, gsutil_paths
+        )
+        print(f"🟩 Finalizó subida a Storage para {nit}: {len(uploaded_urls)} archivos subidos.")
+
+    logs = []
+    for item in grupo.registros_de(trimestre):
+        log = construir_log(
+            item, anio, trimestre, uploaded_urls, gsutil_paths, ingestion_timestamp_global
+        )
+        bq_repo.insert_upload_log(RpaFursLog(**log), ingestion_id=ingestion_id)
+        logs.append(log)
+    manifiesto.marcar(nit, expediente, anio, trimestre, ETAPA_REGISTRADO)
+    print(f"✅ {len(logs)} logs insertados en BigQuery para NIT {nit} | Exp {expediente} | T{trimestre}")
+    return logs
+
+
+def _scrapear_grupo(
+    contexto: ContextoIngesta,
+    grupo: GrupoTrabajo,
+    trimestres: List[int],
+    fecha_inicial: date,
+    fecha_final: date,
+    al_guardar: Optional[Callable[[str], None]] = None,
+):
+    """Abre una sesión del SER, busca el año del grupo y descarga sus FURs."""
+    nit, expediente, anio = grupo.clave
+    ser_service = None
+    try:
+        # El turno cubre solo la sesión del SER; la subida no carga el portal
+        with contexto.turno_ser():
+            # Inicializar SER con un contexto prestado del pool de navegadores
+            ser_service = SerService(
+                browser_pool=contexto.browser_pool,
+                al_guardar=al_guardar,
+                download_path=contexto.download_folder,
+            )
+
+            if contexto.modo_sesion == "cookie":
+                # Inicio de sesion con la cookie SER_AUTH_COOKIE, sin login por la UI
+                ser_service.start_session_from_cookie()
+            elif contexto.modo_sesion == "cookie_compartida":
+                # Cookie renovada por el autenticador central de la ingesta
+                ser_service.start_session_from_cookie(contexto.autenticador)
+            else:
+                # Inicio de sesion con el storage_state compartido de la ingesta
+                # (token_ser o login manual, hechos una sola vez por el autenticador)
+                ser_service.start_session_from_state(contexto.autenticador)
+
+            # Buscar y descargar datos
+            ser_service.buscar_data(
+                nitOperador=nit,
+                expediente=expediente,
+                fechaInicial=fecha_inicial,
+                fechaFinal=fecha_final,
+            )
+
+            ser_service.descargar_y_clasificar_furs_paginado(
+                nit=nit,
+                anio=anio,
+                expediente=int(expediente),
+                seccion="ia",
+                trimestres=trimestres,
+            )
+    finally:
+        if ser_service:
+            try:
+                ser_service.close_session()
+            except Exception:
+                pass
+
+
+def _scrapear_con_circuito(
+    contexto: ContextoIngesta,
+    grupo: GrupoTrabajo,
+    trimestres: List[int],
+    fecha_inicial: date,
+    fecha_final: date,
+    cancelado: Callable[[], bool],
+    notificar: Callable[[str], None],
+    al_guardar: Optional[Callable[[str], None]] = None,
+):
+    """
+    Scraping de un grupo respetando el circuit breaker del SER: espera
+    estacionado mientras el circuito esté abierto y, si el circuito se abre
+    durante el scraping (las descargas restantes fallan de inmediato), lo
+    repite cuando el portal vuelve, hasta SER_CIRCUITO_REINTENTOS_GRUPO veces.
+    """
+    circuito = contexto.circuito
+    if circuito is None:
+        _scrapear_grupo(contexto, grupo, trimestres, fecha_inicial, fecha_final, al_guardar)
+        return
+
+    max_reintentos = int(os.getenv("SER_CIRCUITO_REINTENTOS_GRUPO", "3"))
+    intentos = 0
+    while True:
+        if not circuito.permite_llamada():
+            print(f"🅿️ {grupo.etiqueta} estacionado: el circuito del SER está abierto.")
+            notificar(ESTADO_ESTACIONADO)
+        es_sonda = circuito.esperar_turno(cancelado)
+        notificar(ESTADO_EN_PROCESO)
+        aperturas = circuito.aperturas
+        exito = False
+        try:
+            _scrapear_grupo(
+                contexto, grupo, trimestres, fecha_inicial, fecha_final, al_guardar
+            )
+            exito = circuito.aperturas == aperturas
+        except CircuitoAbierto:
+            pass
+        except Exception:
+            if circuito.aperturas == aperturas:
+                raise
+        finally:
+            if es_sonda:
+                circuito.terminar_sonda(exito)
+        if exito:
+            return
+        intentos += 1
+        if intentos > max_reintentos:
+            raise RuntimeError(
+                f"El circuito del SER se abrió {intentos} veces durante el scraping."
+            )
+        print(f"🔁 El portal falló durante el scraping de {grupo.etiqueta}; se repetirá.")
+
+
+async def scrapear_con_circuito_async(
+    circuito: CircuitoSer,
+    grupo: GrupoTrabajo,
+    scrapear: Callable[[], Awaitable[None]],
+    cancelado: Callable[[], bool] = lambda: False,
+):
+    """
+    Equivalente de `_scrapear_con_circuito` para el motor asíncrono: la sesión
+    espera estacionada (sin abrir contexto) mientras el circuito esté abierto
+    y `scrapear` se repite si el circuito se abre durante el scraping.
+    """
+    max_reintentos = int(os.getenv("SER_CIRCUITO_REINTENTOS_GRUPO", "3"))
+    intentos = 0
+    while True:
+        if not circuito.permite_llamada():
+            print(f"🅿️ [async] {grupo.etiqueta} estacionado: el circuito del SER está abierto.")
+        es_sonda = await circuito.esperar_turno_async(cancelado)
+        aperturas = circuito.aperturas
+        exito = False
+        try:
+            await scrapear()
+            exito = circuito.aperturas == aperturas
+        except CircuitoAbierto:
+            pass
+        except Exception:
+            if circuito.aperturas == aperturas:
+                raise
+        finally:
+            if es_sonda:
+                circuito.terminar_sonda(exito)
+        if exito:
+            return
+        intentos += 1
+        if intentos > max_reintentos:
+            raise RuntimeError(
+                f"El circuito del SER se abrió {intentos} veces durante el scraping."
+            )
+        print(f"🔁 [async] El portal falló durante el scraping de {grupo.etiqueta}; se repetirá.")
+
+
+def procesar_grupo(
+    contexto: ContextoIngesta,
+    grupo: GrupoTrabajo,
+    cancelado: Callable[[], bool] = lambda: False,
+    notificar: Callable[[str], None] = lambda estado: None,
+) -> Tuple[str, List[Dict[str, Any]], Optional[str]]:
+    """
+    Procesa un grupo (NIT, expediente, año) con todos sus trimestres:
+    scraping si hace falta, subida y logs, según el manifiesto de la ingesta.
+    Lo usan tanto los hilos de trabajo como los procesos del modo de procesos.
+
+    Args:
+        contexto (ContextoIngesta): Recursos de la ingesta en este proceso.
+        grupo (GrupoTrabajo): Grupo a procesar.
+        cancelado (Callable): Indica si se pidió cancelar la ingesta; se
+            consulta antes de cada trimestre.
+        notificar (Callable): Recibe los cambios de estado intermedios del
+            ítem (estacionado / en proceso).
+
+    Returns:
+        Tuple: Estado final del ítem, logs generados y mensaje de error.
+    """
+    logs: List[Dict[str, Any]] = []
+    manifiesto = contexto.manifiesto
+    download_folder = contexto.download_folder
+    try:
+        nit = grupo.nit
+        expediente = grupo.expediente
+        anio = grupo.anio
+        trimestres, requiere_scrape, subidas = planificar_reanudacion(
+            manifiesto, grupo, download_folder
+        )
+        if not trimestres:
+            print(f"⏩ NIT {nit} | Expediente {expediente} | {anio} ya registrado en esta ingesta.")
+            return ESTADO_OMITIDO, [], None
+
+        print(
+            f"🧩 Procesando NIT {nit} | Expediente {expediente} | {anio} "
+            f"T{trimestres} ({len(grupo.registros)} registros)"
+        )
+
+        # Una sola búsqueda por el año completo cubre todos sus trimestres
+        fecha_inicial = get_next_business_day(date(anio, 1, 1))
+        fecha_final = get_previous_business_day(date(anio, 12, 31))
+
+        if requiere_scrape:
+            # Subida continua: cada archivo se sube apenas el scraping lo guarda
+            # (SER_SUBIDA_CONTINUA=0 vuelve a subir cada carpeta al terminar)
+            continua = None
+            if os.getenv("SER_SUBIDA_CONTINUA", "1") == "1":
+                continua = contexto.storage_repo.subida_continua(
+                    download_folder,
+                    "ia",
+                    anio,
+                    nit,
+                    expediente,
+                    [t for t in trimestres if t not in subidas],
+                )
+            try:
+                _scrapear_con_circuito(
+                    contexto,
+                    grupo,
+                    trimestres,
+                    fecha_inicial,
+                    fecha_final,
+                    cancelado,
+                    notificar,
+                    continua.encolar if continua else None,
+                )
+            except Exception:
+                if continua:
+                    continua.abortar()
+                raise
+            for trimestre in trimestres:
+                if trimestre not in subidas:
+                    manifiesto.marcar(nit, expediente, anio, trimestre, ETAPA_SCRAPEADO)
+
+            if continua:
+                for trimestre, (uploaded_urls, gsutil_paths) in continua.cerrar().items():
+                    manifiesto.marcar(
+                        nit, expediente, anio, trimestre, ETAPA_SUBIDO, uploaded_urls, gsutil_paths
+                    )
+                    subidas[trimestre] = (uploaded_urls, gsutil_paths)
+
+        # Una sola búsqueda del año: se sube y registra cada trimestre solicitado
+        for trimestre in trimestres:
+            if cancelado():
+                raise TrabajoCancelado(f"Ingesta {contexto.ingestion_id} cancelada.")
+            logs.extend(
+                subir_y_registrar_trimestre(
+                    contexto.storage_repo,
+                    contexto.bq_repo,
+                    grupo,
+                    trimestre,
+                    download_folder,
+                    contexto.ingestion_id,
+                    contexto.ingestion_timestamp_global,
+                    manifiesto,
+                    subidas.get(trimestre),
+                )
+            )
+        return ESTADO_COMPLETADO, logs, None
+    except TrabajoCancelado:
+        # Lo ya subido queda en el manifiesto; se puede reanudar con el mismo ingestion_id
+        return ESTADO_CANCELADO, logs, None
+    except Exception as e:
+        print(f"⚠️ Error menor al procesar NIT {grupo.nit}: {e}")
+        return ESTADO_ERROR, [], str(e)  # No detiene todo el flujo
@@ -0,0 +1,171 @@
+import hashlib
+import os
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.playwright.ser_scripts import ruta_periodo
+from app.repository.ManifiestoRepository import (
+    ETAPA_REGISTRADO,
+    ETAPA_SCRAPEADO,
+    ETAPA_SUBIDO,
+    ManifiestoRepository,
+)
+
+
+@dataclass
+class GrupoTrabajo:
+    """
+    Unidad de trabajo del scraping: un NIT/expediente en un año.
+
+    La búsqueda en el SER cubre el año completo y clasifica cada FUR en su
+    trimestre, así que todos los registros de BigQuery del NIT/expediente en
+    ese año (uno por servicio y trimestre) comparten una sola búsqueda y una
+    sola descarga. Cada trimestre se sube por separado y cada registro
+    conserva su propio log.
+    """
+
+    nit: str
+    expediente: str
+    anio: int
+    registros: List[Dict[str, Any]] = field(default_factory=list)
+
+    @property
+    def clave(self) -> Tuple[str, str, int]:
+        return self.nit, self.expediente, self.anio
+
+    @property
+    def etiqueta(self) -> str:
+        """Identificador legible del grupo: '<nit>-<expediente>-<año>'."""
+        return f"{self.nit}-{self.expediente}-{self.anio}"
+
+    @property
+    def trimestres(self) -> List[int]:
+        """Trimestres solicitados para el grupo, en orden."""
+        return sorted({int(item["TRIMESTRE"]) for item in self.registros})
+
+    def registros_de(self, trimestre: int) -> List[Dict[str, Any]]:
+        return [item for item in self.registros if int(item["TRIMESTRE"]) == trimestre]
+
+
+def planificar_grupos(registros: List[Dict[str, Any]]) -> List[GrupoTrabajo]:
+    """
+    Agrupa los registros por (NIT, expediente, año), conservando el orden en
+    que aparece cada grupo por primera vez.
+    """
+    grupos: Dict[Tuple[str, str, int], GrupoTrabajo] = {}
+    for item in registros:
+        clave = (
+            str(item["Identificacion"]),
+            str(item["Expediente"]),
+            int(item["ANNO"]),
+        )
+        grupo = grupos.get(clave)
+        if grupo is None:
+            grupo = grupos[clave] = GrupoTrabajo(*clave)
+        grupo.registros.append(item)
+
+    agrupados = list(grupos.values())
+    if len(agrupados) < len(registros):
+        print(
+            f"🗂️ {len(registros)} registros agrupados en {len(agrupados)} búsquedas "
+            "(NIT, expediente, año)."
+        )
+    return agrupados
+
+
+def planificar_reanudacion(
+    manifiesto: ManifiestoRepository, grupo: GrupoTrabajo, base_download_path: str
+) -> Tuple[List[int], bool, Dict[int, Tuple[List[str], List[str]]]]:
+    """
+    Decide qué falta de un grupo según el manifiesto de la ingesta.
+
+    Returns:
+        Tuple: Trimestres aún no registrados; si hace falta volver a scrapear
+        (algún trimestre no llegó a scrapearse o su carpeta local ya no
+        existe); y las subidas ya hechas por trimestre (URLs y rutas gsutil),
+        que solo necesitan registrarse.
+    """
+    nit, expediente, anio = grupo.clave
+    etapas = manifiesto.etapas_de(nit, expediente, anio)
+    pendientes: List[int] = []
+    subidas: Dict[int, Tuple[List[str], List[str]]] = {}
+    requiere_scrape = False
+    for trimestre in grupo.trimestres:
+        etapa, uploaded_urls, gsutil_paths = etapas.get(trimestre, (None, None, None))
+        if etapa == ETAPA_REGISTRADO:
+            continue
+        pendientes.append(trimestre)
+        if etapa == ETAPA_SUBIDO and uploaded_urls is not None:
+            subidas[trimestre] = (uploaded_urls, gsutil_paths or [])
+        elif etapa != ETAPA_SCRAPEADO or not os.path.isdir(
+            ruta_periodo(base_download_path, "ia", anio, nit, expediente, trimestre)
+        ):
+            requiere_scrape = True
+    return pendientes, requiere_scrape, subidas
+
+
+def resolver_shard(
+    shard_index: Optional[int] = None, shard_count: Optional[int] = None
+) -> Tuple[int, int]:
+    """
+    Porción de la ingesta que le toca a esta instancia. Sin parámetros
+    explícitos se usan las variables de las tareas de Cloud Run Jobs
+    (CLOUD_RUN_TASK_INDEX / CLOUD_RUN_TASK_COUNT); sin ellas, todo el trabajo.
+
+    Raises:
+        ValueError: Si el índice no está entre 0 y shard_count - 1.
+    """
+    if shard_count is None:
+        shard_count = int(os.getenv("CLOUD_RUN_TASK_COUNT", "1"))
+    if shard_index is None:
+        shard_index = int(os.getenv("CLOUD_RUN_TASK_INDEX", "0"))
+    if shard_count < 1 or not 0 <= shard_index < shard_count:
+        raise ValueError(
+            f"Shard inválido: índice {shard_index} de {shard_count} shards."
+        )
+    return shard_index, shard_count
+
+
+def clave_shard(ingestion_id: str, shard_index: int = 0, shard_count: int = 1) -> str:
+    """
+    Identificador de la porción de una ingesta que procesa una instancia: el
+    `ingestion_id` o, con varios shards, '<ingestion_id>-shard-<i>-de-<n>'
+    (el mismo nombre que el manifiesto local del shard). Lo usan el trabajo en
+    segundo plano y la carpeta de descargas, para que dos shards de la misma
+    ingesta en una instancia no choquen ni se borren los archivos.
+    """
+    if shard_count == 1:
+        return ingestion_id
+    return f"{ingestion_id}-shard-{shard_index}-de-{shard_count}"
+
+
+def shard_de(nit: str, expediente: str, shard_count: int) -> int:
+    """
+    Shard de un NIT/expediente. Se usa SHA-256 y no `hash()`, que cambia entre
+    procesos, para que todas las instancias repartan igual.
+    """
+    digest = hashlib.sha256(f"{nit}|{expediente}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % shard_count
+
+
+def filtrar_shard(
+    registros: List[Dict[str, Any]], shard_index: int, shard_count: int
+) -> List[Dict[str, Any]]:
+    """
+    Registros del shard `shard_index`. Todos los años y trimestres de un
+    NIT/expediente caen en el mismo shard, así que los shards son disjuntos
+    y no comparten carpetas ni blobs.
+    """
+    if shard_count == 1:
+        return registros
+    propios = [
+        item
+        for item in registros
+        if shard_de(str(item["Identificacion"]), str(item["Expediente"]), shard_count)
+        == shard_index
+    ]
+    print(
+        f"🧮 Shard {shard_index + 1}/{shard_count}: {len(propios)} de "
+        f"{len(registros)} registros."
+    )
+    return propios
@@ -0,0 +1,306 @@
+import multiprocessing
+import os
+import queue
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.utils.concurrencia import (
+    OPERACION_DESCARGA,
+    OPERACION_NAVEGACION,
+    ControladorConcurrencia,
+    establecer_observador,
+)
+from app.utils.planificacion import GrupoTrabajo
+from app.utils.proteccion_ser import get_circuito_ser, repartir_limitador_ser
+from app.utils.trabajos import ESTADO_CANCELADO, ESTADO_ERROR, Trabajo
+
+# Eventos que los procesos de trabajo envían al proceso principal
+EVENTO_LISTO = "listo"
+EVENTO_INICIO = "inicio"
+EVENTO_FIN = "fin"
+EVENTO_FALLA = "falla"
+EVENTO_OBSERVACION = "observacion"
+EVENTO_ESTADO = "estado"
+
+
+def _worker_proceso(
+    indice: int,
+    configuracion: Dict[str, Any],
+    cola_items: Any,
+    cola_eventos: Any,
+    cancelacion: Any,
+):
+    """
+    Proceso de trabajo: arma sus propios recursos (driver de Playwright,
+    navegador, repositorios y autenticación) y procesa los grupos que recibe
+    por `cola_items` hasta recibir None. Cada resultado vuelve por `cola_eventos`.
+    """
+    # Las importaciones pesadas se hacen en el proceso hijo, que arranca con spawn
+    from app.playwright.BrowserPool import BrowserPool
+    from app.playwright.SerAuthenticator import SerAuthenticator
+    from app.repository.BigQueryRepository import BigQueryRepository
+    from app.repository.ManifiestoRepository import ManifiestoRepository
+    from app.repository.StorageRepository import StorageRepository
+    from app.utils.ingesta import ContextoIngesta, procesar_grupo
+
+    # La tasa del SER se reparte entre los procesos de trabajo simultáneos
+    repartir_limitador_ser(configuracion["procesos"])
+    # Las latencias del portal se reenvían al controlador del proceso principal
+    establecer_observador(
+        lambda operacion, latencia, exito: cola_eventos.put(
+            (EVENTO_OBSERVACION, indice, operacion, latencia, exito)
+        )
+    )
+    try:
+        browser_pool = BrowserPool(size=1)
+        storage_repo = StorageRepository()
+        contexto = ContextoIngesta(
+            ingestion_id=configuracion["ingestion_id"],
+            ingestion_timestamp_global=configuracion["ingestion_timestamp_global"],
+            download_folder=configuracion["download_folder"],
+            storage_repo=storage_repo,
+            bq_repo=BigQueryRepository(),
+            # Todos los procesos escriben el mismo archivo, así que el respaldo
+            # periódico de cualquiera de ellos incluye el avance de los demás
+            manifiesto=ManifiestoRepository(
+                configuracion["ingestion_id"],
+                bucket=storage_repo.bucket,
+                shard_index=configuracion["shard_index"],
+                shard_count=configuracion["shard_count"],
+                restaurar=False,
+            ),
+            browser_pool=browser_pool,
+            autenticador=SerAuthenticator(
+                browser_pool, token_ser=configuracion["token_ser"]
+            ),
+            modo_sesion=configuracion["modo_sesion"],
+            circuito=get_circuito_ser(),
+        )
+    except Exception as e:
+        cola_eventos.put((EVENTO_FALLA, indice, f"{type(e).__name__}: {e}"))
+        return
+
+    cola_eventos.put((EVENTO_LISTO, indice))
+    try:
+        while True:
+            grupo: Optional[GrupoTrabajo] = cola_items.get()
+            if grupo is None:
+                break
+            cola_eventos.put((EVENTO_INICIO, indice, grupo.etiqueta))
+            estado, logs, error = procesar_grupo(
+                contexto,
+                grupo,
+                cancelacion.is_set,
+                lambda estado, etiqueta=grupo.etiqueta: cola_eventos.put(
+                    (EVENTO_ESTADO, indice, etiqueta, estado)
+                ),
+            )
+            cola_eventos.put((EVENTO_FIN, indice, grupo.etiqueta, estado, logs, error))
+    finally:
+        contexto.manifiesto.cerrar()
+        browser_pool.shutdown()
+
+
+class PoolProcesosSer:
+    """
+    Modo de ejecución con procesos: cada proceso de trabajo tiene su propio
+    driver de Playwright, navegador, StorageRepository y BigQueryRepository, y
+    recibe grupos por una cola propia. Así el trabajo en Python (recorrido de
+    archivos, hilos de subida, clientes de Google) escala en varios núcleos, y
+    si un navegador tumba su proceso, el resto de la ingesta sigue: el proceso
+    se relanza y su grupo se reintenta una vez.
+
+    El estado de cada ítem se refleja en el `Trabajo` desde el proceso principal.
+    Con un controlador de concurrencia, solo se asignan grupos mientras los
+    procesos ocupados no superen su nivel actual. Cada proceso tiene su propio
+    circuit breaker del SER; el principal lleva otro con las observaciones de
+    todos y no asigna grupos mientras esté abierto. Cada proceso también tiene
+    su propio limitador de tasa, con una parte igual de SER_TASA_POR_SEG y
+    SER_TASA_RAFAGA.
+    """
+
+    def __init__(
+        self,
+        configuracion: Dict[str, Any],
+        procesos: int,
+        controlador: Optional[ControladorConcurrencia] = None,
+    ):
+        """
+        Args:
+            configuracion (dict): Datos de la ingesta para los procesos de
+                trabajo (ingestion_id, ingestion_timestamp_global,
+                download_folder, shard_index, shard_count, token_ser, modo_sesion).
+            procesos (int): Cantidad de procesos de trabajo.
+            controlador (ControladorConcurrencia): Controlador que limita
+                cuántos procesos trabajan a la vez.
+        """
+        self.configuracion = dict(configuracion)
+        self.controlador = controlador
+        self.circuito = get_circuito_ser()
+        self.procesos = max(1, procesos)
+        self.max_reintentos = int(os.getenv("SER_PROCESOS_REINTENTOS", "1"))
+        self.max_relanzamientos = int(
+            os.getenv("SER_PROCESOS_RELANZAMIENTOS", str(self.procesos * 3))
+        )
+        # Cada cuántos segundos se revisa si algún proceso murió
+        self.intervalo_revision = float(os.getenv("SER_PROCESOS_REVISION_SEG", "2"))
+        self._ctx = multiprocessing.get_context("spawn")
+        self._cola_eventos = self._ctx.Queue()
+        self._cancelacion = self._ctx.Event()
+        self._workers: Dict[int, Any] = {}
+        self._colas: Dict[int, Any] = {}
+
+    def _lanzar(self, indice: int):
+        cola = self._ctx.Queue()
+        proceso = self._ctx.Process(
+            target=_worker_proceso,
+            args=(indice, self.configuracion, cola, self._cola_eventos, self._cancelacion),
+            name=f"ser-proceso-{indice}",
+            daemon=True,
+        )
+        proceso.start()
+        self._workers[indice] = proceso
+        self._colas[indice] = cola
+
+    def ejecutar(self, grupos: List[GrupoTrabajo], trabajo: Trabajo) -> List[Dict[str, Any]]:
+        """Procesa los grupos en los procesos de trabajo y devuelve todos los logs."""
+        pendientes = deque(grupos)
+        asignados: Dict[int, GrupoTrabajo] = {}
+        intentos: Dict[str, int] = {}
+        libres: deque = deque()
+        relanzamientos = 0
+        ultima_revision = time.monotonic()
+        logs_totales: List[Dict[str, Any]] = []
+
+        def procesar_evento(evento: Tuple[Any, ...]):
+            tipo, indice = evento[0], evento[1]
+            if tipo == EVENTO_LISTO:
+                libres.append(indice)
+            elif tipo == EVENTO_INICIO:
+                trabajo.iniciar_item(evento[2])
+            elif tipo == EVENTO_FIN:
+                _, _, etiqueta, estado, logs, error = evento
+                trabajo.terminar_item(etiqueta, estado, logs=len(logs), error=error)
+                logs_totales.extend(logs)
+                asignados.pop(indice, None)
+                libres.append(indice)
+            elif tipo == EVENTO_ESTADO:
+                trabajo.actualizar_item(evento[2], evento[3])
+            elif tipo == EVENTO_OBSERVACION:
+                operacion, exito = evento[2], evento[4]
+                if operacion in (OPERACION_DESCARGA, OPERACION_NAVEGACION):
+                    self.circuito.registrar(exito)
+                if self.controlador:
+                    self.controlador.registrar(*evento[2:])
+            elif tipo == EVENTO_FALLA:
+                # No pudo preparar sus recursos; se reporta y el proceso termina
+                print(f"❌ El proceso de trabajo {indice} no pudo iniciar: {evento[2]}")
+
+        cantidad = min(self.procesos, len(grupos))
+        # Los relanzamientos reemplazan procesos, así que siempre hay `cantidad`
+        self.configuracion["procesos"] = cantidad
+        print(f"⚙️ Iniciando procesamiento con {cantidad} procesos de trabajo...")
+        for indice in range(cantidad):
+            self._lanzar(indice)
+
+        try:
+            while pendientes or asignados:
+                if trabajo.cancelado:
+                    self._cancelacion.set()
+                    for grupo in pendientes:
+                        trabajo.terminar_item(grupo.etiqueta, ESTADO_CANCELADO)
+                    pendientes.clear()
+                    if not asignados:
+                        break
+
+                while libres and pendientes and self._hay_cupo(len(asignados)):
+                    indice = libres.popleft()
+                    grupo = pendientes.popleft()
+                    asignados[indice] = grupo
+                    self._colas[indice].put(grupo)
+
+                try:
+                    evento = self._cola_eventos.get(
+                        timeout=min(2.0, self.intervalo_revision)
+                    )
+                except queue.Empty:
+                    evento = None
+                if evento is not None:
+                    procesar_evento(evento)
+
+                # Los procesos vivos reportan cada operación, así que la cola casi
+                # nunca queda vacía: la salud se revisa cada tanto, haya o no eventos
+                if evento is None or time.monotonic() - ultima_revision >= self.intervalo_revision:
+                    ultima_revision = time.monotonic()
+                    muertos = [i for i, p in self._workers.items() if not p.is_alive()]
+                    if not muertos:
+                        continue
+                    # Lo que un proceso alcanzó a enviar antes de morir (ej: el fin
+                    # de su grupo) se procesa antes de decidir si se reintenta
+                    while True:
+                        try:
+                            procesar_evento(self._cola_eventos.get_nowait())
+                        except queue.Empty:
+                            break
+                    for indice in muertos:
+                        proceso = self._workers.pop(indice)
+                        grupo = asignados.pop(indice, None)
+                        if indice in libres:
+                            libres.remove(indice)
+                        print(
+                            f"💥 El proceso {proceso.name} terminó inesperadamente "
+                            f"(código {proceso.exitcode})."
+                        )
+                        if grupo is not None:
+                            self._reintentar_o_fallar(grupo, trabajo, intentos, pendientes)
+                        if relanzamientos < self.max_relanzamientos and (pendientes or asignados):
+                            relanzamientos += 1
+                            self._lanzar(indice)
+                    if not self._workers and pendientes:
+                        for grupo in pendientes:
+                            trabajo.terminar_item(
+                                grupo.etiqueta,
+                                ESTADO_ERROR,
+                                error="No quedan procesos de trabajo disponibles.",
+                            )
+                        pendientes.clear()
+        finally:
+            self._cerrar()
+        return logs_totales
+
+    def _hay_cupo(self, ocupados: int) -> bool:
+        if not self.circuito.permite_llamada():
+            return False
+        return self.controlador is None or ocupados < self.controlador.nivel
+
+    def _reintentar_o_fallar(
+        self,
+        grupo: GrupoTrabajo,
+        trabajo: Trabajo,
+        intentos: Dict[str, int],
+        pendientes: deque,
+    ):
+        intentos[grupo.etiqueta] = intentos.get(grupo.etiqueta, 0) + 1
+        if intentos[grupo.etiqueta] <= self.max_reintentos and not trabajo.cancelado:
+            print(f"🔁 Reintentando {grupo.etiqueta} en otro proceso.")
+            pendientes.appendleft(grupo)
+        else:
+            trabajo.terminar_item(
+                grupo.etiqueta,
+                ESTADO_ERROR,
+                error="El proceso de trabajo terminó inesperadamente.",
+            )
+
+    def _cerrar(self):
+        for cola in self._colas.values():
+            try:
+                cola.put(None)
+            except Exception:
+                pass
+        for proceso in self._workers.values():
+            proceso.join(timeout=30)
+            if proceso.is_alive():
+                proceso.terminate()
+        self._workers.clear()
+        self._colas.clear()
@@ -0,0 +1,275 @@
+import asyncio
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from functools import lru_cache
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, Optional
+
+from app.utils.concurrencia import observar
+from app.utils.trabajos import TrabajoCancelado
+
+CIRCUITO_CERRADO = "cerrado"
+CIRCUITO_ABIERTO = "abierto"
+CIRCUITO_SEMIABIERTO = "semiabierto"
+
+# Procesos entre los que se reparte la tasa del SER (ver `repartir_limitador_ser`)
+_partes_limitador = 1
+
+
+class CircuitoAbierto(Exception):
+    """El portal del SER se considera caído: la llamada no se intenta."""
+
+
+class LimitadorTasa:
+    """
+    Token bucket compartido por las sesiones del proceso: `tasa` llamadas por
+    segundo en promedio, con ráfagas de hasta `capacidad`. Con tasa <= 0 no limita.
+    """
+
+    def __init__(self, tasa: float, capacidad: float):
+        self.tasa = tasa
+        self.capacidad = max(1.0, capacidad)
+        self._tokens = self.capacidad
+        self._ultimo = time.monotonic()
+        self._lock = threading.Lock()
+        self.esperas = 0
+
+    def _tomar(self) -> float:
+        """Toma un token si hay; si no, devuelve cuántos segundos esperar."""
+        with self._lock:
+            ahora = time.monotonic()
+            self._tokens = min(
+                self.capacidad, self._tokens + (ahora - self._ultimo) * self.tasa
+            )
+            self._ultimo = ahora
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            self.esperas += 1
+            return (1 - self._tokens) / self.tasa
+
+    def adquirir(self):
+        """Bloquea hasta tener un token disponible."""
+        if self.tasa <= 0:
+            return
+        while (faltante := self._tomar()) > 0:
+            time.sleep(faltante)
+
+    async def adquirir_async(self):
+        """Equivalente de `adquirir` para el motor asíncrono, sin bloquear el loop."""
+        if self.tasa <= 0:
+            return
+        while (faltante := self._tomar()) > 0:
+            await asyncio.sleep(faltante)
+
+
+class CircuitoSer:
+    """
+    Circuit breaker del portal del SER.
+
+    - Cerrado: todo pasa. `umbral_fallos` fallos consecutivos lo abren.
+    - Abierto: las llamadas fallan de inmediato con CircuitoAbierto y las
+      sesiones nuevas quedan estacionadas en `esperar_turno`, sin usar navegador.
+    - Semiabierto: pasado el tiempo de espera, una sola sesión (la sonda)
+      prueba el portal. Si le va bien el circuito se cierra; si falla, se
+      vuelve a abrir con el doble de espera (hasta `espera_max_seg`).
+    """
+
+    def __init__(self, umbral_fallos: int, espera_seg: float, espera_max_seg: float):
+        self.umbral_fallos = max(1, umbral_fallos)
+        self.espera_base = espera_seg
+        self.espera_max = max(espera_seg, espera_max_seg)
+        self.estado = CIRCUITO_CERRADO
+        self.aperturas = 0
+        self._espera_actual = espera_seg
+        self._fallos_consecutivos = 0
+        self._abierto_hasta = 0.0
+        self._sonda_en_curso = False
+        self._condicion = threading.Condition()
+
+    def _actualizar(self):
+        if self.estado == CIRCUITO_ABIERTO and time.monotonic() >= self._abierto_hasta:
+            self.estado = CIRCUITO_SEMIABIERTO
+            self._sonda_en_curso = False
+            print("🟡 Circuito del SER semiabierto: se probará el portal con una sesión.")
+            self._condicion.notify_all()
+
+    def _abrir(self):
+        if self.estado == CIRCUITO_SEMIABIERTO:
+            self._espera_actual = min(self.espera_max, self._espera_actual * 2)
+        else:
+            self._espera_actual = self.espera_base
+        self.estado = CIRCUITO_ABIERTO
+        self.aperturas += 1
+        self._sonda_en_curso = False
+        self._abierto_hasta = time.monotonic() + self._espera_actual
+        print(
+            f"🔴 Circuito del SER abierto tras {self._fallos_consecutivos} fallos "
+            f"consecutivos; se reintenta en {self._espera_actual:.0f} s."
+        )
+
+    def _cerrar(self):
+        self.estado = CIRCUITO_CERRADO
+        self._espera_actual = self.espera_base
+        self._fallos_consecutivos = 0
+        self._sonda_en_curso = False
+        print("🟢 Circuito del SER cerrado: el portal responde de nuevo.")
+        self._condicion.notify_all()
+
+    def registrar(self, exito: bool):
+        with self._condicion:
+            self._actualizar()
+            if exito:
+                self._fallos_consecutivos = 0
+                if self.estado == CIRCUITO_SEMIABIERTO:
+                    self._cerrar()
+                return
+            self._fallos_consecutivos += 1
+            if self.estado == CIRCUITO_SEMIABIERTO or (
+                self.estado == CIRCUITO_CERRADO
+                and self._fallos_consecutivos >= self.umbral_fallos
+            ):
+                self._abrir()
+
+    def permite_llamada(self) -> bool:
+        with self._condicion:
+            self._actualizar()
+            return self.estado != CIRCUITO_ABIERTO
+
+    def esperar_turno(self, cancelado: Callable[[], bool] = lambda: False) -> bool:
+        """
+        Estaciona al llamador mientras el circuito esté abierto.
+
+        Returns:
+            bool: Verdadero si el llamador es la sonda del circuito semiabierto;
+            debe informar el resultado con `terminar_sonda`.
+
+        Raises:
+            TrabajoCancelado: Si se cancela la ingesta mientras espera.
+        """
+        with self._condicion:
+            while (es_sonda := self._intentar_turno(cancelado)) is None:
+                self._condicion.wait(timeout=1)
+            return es_sonda
+
+    async def esperar_turno_async(
+        self, cancelado: Callable[[], bool] = lambda: False
+    ) -> bool:
+        """Equivalente de `esperar_turno` para el motor asíncrono."""
+        while True:
+            with self._condicion:
+                es_sonda = self._intentar_turno(cancelado)
+            if es_sonda is not None:
+                return es_sonda
+            await asyncio.sleep(1)
+
+    def _intentar_turno(self, cancelado: Callable[[], bool]) -> Optional[bool]:
+        """Con el lock tomado: si el llamador pasa (y si es la sonda), o None si espera."""
+        self._actualizar()
+        if self.estado == CIRCUITO_CERRADO:
+            return False
+        if self.estado == CIRCUITO_SEMIABIERTO and not self._sonda_en_curso:
+            self._sonda_en_curso = True
+            return True
+        if cancelado():
+            raise TrabajoCancelado("Ingesta cancelada mientras esperaba al SER.")
+        return None
+
+    def terminar_sonda(self, exito: bool):
+        with self._condicion:
+            self._sonda_en_curso = False
+            if self.estado == CIRCUITO_SEMIABIERTO:
+                if exito:
+                    self._cerrar()
+                else:
+                    self._abrir()
+            self._condicion.notify_all()
+
+    def estado_dict(self) -> Dict[str, Any]:
+        with self._condicion:
+            self._actualizar()
+            return {
+                "estado": self.estado,
+                "aperturas": self.aperturas,
+                "fallos_consecutivos": self._fallos_consecutivos,
+                "reabre_en_seg": max(0.0, round(self._abierto_hasta - time.monotonic(), 1))
+                if self.estado == CIRCUITO_ABIERTO
+                else 0.0,
+            }
+
+
+def repartir_limitador_ser(partes: int):
+    """
+    En el modo de procesos cada proceso de trabajo tiene su propio limitador:
+    con `partes` procesos, cada uno toma 1/`partes` de la tasa y de la ráfaga
+    para que entre todos no superen lo configurado para el portal.
+    """
+    global _partes_limitador
+    _partes_limitador = max(1, partes)
+    get_limitador_ser.cache_clear()
+
+
+@lru_cache()
+def get_limitador_ser() -> LimitadorTasa:
+    """
+    Limitador de navegaciones y descargas del SER del proceso
+    (SER_TASA_POR_SEG, por defecto 5; SER_TASA_RAFAGA, por defecto 10),
+    dividido entre los procesos indicados en `repartir_limitador_ser`.
+    """
+    return LimitadorTasa(
+        tasa=float(os.getenv("SER_TASA_POR_SEG", "5")) / _partes_limitador,
+        capacidad=float(os.getenv("SER_TASA_RAFAGA", "10")) / _partes_limitador,
+    )
+
+
+@lru_cache()
+def get_circuito_ser() -> CircuitoSer:
+    """
+    Circuit breaker del SER del proceso (SER_CIRCUITO_FALLOS, por defecto 5;
+    SER_CIRCUITO_ESPERA_SEG, por defecto 60; SER_CIRCUITO_ESPERA_MAX_SEG, por defecto 600).
+    """
+    return CircuitoSer(
+        umbral_fallos=int(os.getenv("SER_CIRCUITO_FALLOS", "5")),
+        espera_seg=float(os.getenv("SER_CIRCUITO_ESPERA_SEG", "60")),
+        espera_max_seg=float(os.getenv("SER_CIRCUITO_ESPERA_MAX_SEG", "600")),
+    )
+
+
+@contextmanager
+def llamada_ser(operacion: str) -> Iterator[None]:
+    """
+    Envuelve una navegación o descarga del SER: falla de inmediato si el
+    circuito está abierto, espera un token del limitador, mide la operación
+    para el controlador de concurrencia y reporta el resultado al circuito.
+    """
+    circuito = get_circuito_ser()
+    if not circuito.permite_llamada():
+        raise CircuitoAbierto(f"Circuito del SER abierto; se omite la {operacion}.")
+    get_limitador_ser().adquirir()
+    try:
+        with observar(operacion):
+            yield
+    except Exception:
+        circuito.registrar(False)
+        raise
+    circuito.registrar(True)
+
+
+@asynccontextmanager
+async def llamada_ser_async(operacion: str) -> AsyncIterator[None]:
+    """
+    Equivalente de `llamada_ser` para el motor asíncrono: comparte con el
+    motor síncrono el limitador y el circuito del proceso.
+    """
+    circuito = get_circuito_ser()
+    if not circuito.permite_llamada():
+        raise CircuitoAbierto(f"Circuito del SER abierto; se omite la {operacion}.")
+    await get_limitador_ser().adquirir_async()
+    try:
+        with observar(operacion):
+            yield
+    except Exception:
+        circuito.registrar(False)
+        raise
+    circuito.registrar(True)
@@ -0,0 +1,127 @@
+import asyncio
+import os
+import random
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Awaitable, Callable, Optional, Tuple, Type, TypeVar
+
+from app.utils.proteccion_ser import CircuitoAbierto
+from app.utils.trabajos import TrabajoCancelado
+
+# Etapas del pipeline con política de reintentos propia
+ETAPA_BUSQUEDA = "busqueda"
+ETAPA_DESCARGA = "descarga"
+ETAPA_SUBIDA = "subida"
+ETAPA_LOG = "log"
+
+# (intentos, espera base en s, espera máxima en s) por defecto de cada etapa
+POLITICAS_POR_DEFECTO = {
+    ETAPA_BUSQUEDA: (3, 2.0, 30.0),
+    ETAPA_DESCARGA: (3, 1.0, 15.0),
+    ETAPA_SUBIDA: (4, 0.5, 20.0),
+    ETAPA_LOG: (5, 0.5, 30.0),
+}
+
+# Errores que no se arreglan repitiendo: el NIT no existe en el SER, el
+# portal está caído (lo maneja el circuito) o se canceló la ingesta.
+NO_REINTENTABLES: Tuple[Type[BaseException], ...] = (
+    LookupError,
+    CircuitoAbierto,
+    TrabajoCancelado,
+)
+
+T = TypeVar("T")
+
+
+@dataclass(frozen=True)
+class PoliticaReintentos:
+    """Reintentos con backoff exponencial y jitter completo."""
+
+    intentos: int
+    espera_base_seg: float
+    espera_max_seg: float
+
+    def espera(self, intento: int) -> float:
+        """Espera antes del reintento que sigue al intento `intento` (desde 1)."""
+        tope = min(self.espera_max_seg, self.espera_base_seg * 2 ** (intento - 1))
+        return random.uniform(0, tope)
+
+
+@lru_cache()
+def politica_de(etapa: str) -> PoliticaReintentos:
+    """
+    Política de una etapa, configurable con SER_REINTENTOS_<ETAPA>_INTENTOS,
+    SER_REINTENTOS_<ETAPA>_BASE_SEG y SER_REINTENTOS_<ETAPA>_MAX_SEG.
+    """
+    intentos, base, maximo = POLITICAS_POR_DEFECTO[etapa]
+    prefijo = f"SER_REINTENTOS_{etapa.upper()}"
+    return PoliticaReintentos(
+        intentos=max(1, int(os.getenv(f"{prefijo}_INTENTOS", str(intentos)))),
+        espera_base_seg=float(os.getenv(f"{prefijo}_BASE_SEG", str(base))),
+        espera_max_seg=float(os.getenv(f"{prefijo}_MAX_SEG", str(maximo))),
+    )
+
+
+def es_error_permanente(error: BaseException) -> bool:
+    """
+    Errores HTTP 4xx (salvo 408 y 429), sea de los clientes de Google
+    (`code`) o de requests (`response.status_code`): repetirlos no sirve.
+    """
+    codigo: Optional[int] = getattr(error, "code", None)
+    if not isinstance(codigo, int):
+        codigo = getattr(getattr(error, "response", None), "status_code", None)
+    return isinstance(codigo, int) and 400 <= codigo < 500 and codigo not in (408, 429)
+
+
+def reintentar(funcion: Callable[[], T], etapa: str, descripcion: str) -> T:
+    """
+    Ejecuta `funcion` y, si falla con un error transitorio, la repite según
+    la política de la etapa. Solo se repite esa llamada, no el ítem completo.
+
+    Raises:
+        Exception: El error del último intento, o el primero que no sea reintentable.
+    """
+    politica = politica_de(etapa)
+    intento = 1
+    while True:
+        try:
+            return funcion()
+        except NO_REINTENTABLES:
+            raise
+        except Exception as e:
+            time.sleep(_espera_o_lanzar(politica, intento, e, descripcion))
+            intento += 1
+
+
+async def reintentar_async(
+    funcion: Callable[[], Awaitable[T]], etapa: str, descripcion: str
+) -> T:
+    """Equivalente de `reintentar` para el motor asíncrono."""
+    politica = politica_de(etapa)
+    intento = 1
+    while True:
+        try:
+            return await funcion()
+        except NO_REINTENTABLES:
+            raise
+        except Exception as e:
+            await asyncio.sleep(_espera_o_lanzar(politica, intento, e, descripcion))
+            intento += 1
+
+
+def _espera_o_lanzar(
+    politica: PoliticaReintentos, intento: int, error: Exception, descripcion: str
+) -> float:
+    """
+    Dentro de un `except`: relanza el error si no quedan intentos o es
+    permanente; si no, devuelve la espera antes del siguiente intento.
+    """
+    if intento >= politica.intentos or es_error_permanente(error):
+        raise error
+    espera = politica.espera(intento)
+    print(
+        f"🔁 {descripcion}: intento {intento}/{politica.intentos} falló ({error}); "
+        f"se reintenta en {espera:.1f} s."
+    )
+    return espera
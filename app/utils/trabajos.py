@@ -0,0 +1,341 @@
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+ESTADO_PENDIENTE = "pendiente"
+ESTADO_EN_PROCESO = "en_proceso"
+ESTADO_ESTACIONADO = "estacionado"
+ESTADO_COMPLETADO = "completado"
+ESTADO_OMITIDO = "omitido"
+ESTADO_ERROR = "error"
+ESTADO_CANCELADO = "cancelado"
+# Solo del trabajo: terminó, pero con ítems fallidos o sin procesar
+ESTADO_PARCIAL = "parcial"
+ESTADOS_FINALES = (
+    ESTADO_COMPLETADO,
+    ESTADO_OMITIDO,
+    ESTADO_ERROR,
+    ESTADO_CANCELADO,
+    ESTADO_PARCIAL,
+)
+
+
+class TrabajoCancelado(Exception):
+    """Se lanza dentro de un trabajo cuando se pidió cancelarlo."""
+
+
+class TrabajoEnCurso(Exception):
+    """Ya hay un trabajo sin terminar con el mismo ingestion_id."""
+
+
+def _ahora() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+@dataclass
+class EstadoItem:
+    """Estado de un ítem (NIT, expediente, año) dentro de un trabajo."""
+
+    trimestres: List[int]
+    registros: int
+    estado: str = ESTADO_PENDIENTE
+    logs: int = 0
+    inicio: Optional[str] = None
+    fin: Optional[str] = None
+    duracion_seg: Optional[float] = None
+    error: Optional[str] = None
+    _inicio_monotonico: Optional[float] = field(default=None, repr=False)
+
+    def como_dict(self) -> Dict[str, Any]:
+        return {
+            "estado": self.estado,
+            "trimestres": self.trimestres,
+            "registros": self.registros,
+            "logs": self.logs,
+            "inicio": self.inicio,
+            "fin": self.fin,
+            "duracion_seg": self.duracion_seg,
+            "error": self.error,
+        }
+
+
+class Trabajo:
+    """
+    Una ingesta ejecutándose en segundo plano: estado general, estado y
+    tiempos de cada ítem, y la señal de cancelación que consultan los workers.
+    """
+
+    def __init__(
+        self, ingestion_id: str, parametros: Dict[str, Any], clave: Optional[str] = None
+    ):
+        self.ingestion_id = ingestion_id
+        # Con shards, la clave distingue la porción de la ingesta (ver `clave_shard`)
+        self.clave = clave or ingestion_id
+        self.parametros = parametros
+        self.estado = ESTADO_PENDIENTE
+        self.creado = _ahora()
+        self.inicio: Optional[str] = None
+        self.fin: Optional[str] = None
+        self.error: Optional[str] = None
+        self.registros_totales = 0
+        self.items: Dict[str, EstadoItem] = {}
+        self._inicio_monotonico: Optional[float] = None
+        self._duracion_seg: Optional[float] = None
+        self._cancelacion = threading.Event()
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Cancelación
+    # ------------------------------------------------------------------
+    @property
+    def cancelado(self) -> bool:
+        return self._cancelacion.is_set()
+
+    def cancelar(self):
+        self._cancelacion.set()
+
+    def verificar_cancelacion(self):
+        """Lanza TrabajoCancelado si se pidió cancelar el trabajo."""
+        if self.cancelado:
+            raise TrabajoCancelado(f"El trabajo {self.ingestion_id} fue cancelado.")
+
+    # ------------------------------------------------------------------
+    # Estado de los ítems
+    # ------------------------------------------------------------------
+    def agregar_item(self, clave: str, trimestres: List[int], registros: int):
+        with self._lock:
+            self.items[clave] = EstadoItem(trimestres=trimestres, registros=registros)
+
+    def iniciar_item(self, clave: str):
+        with self._lock:
+            item = self.items[clave]
+            item.estado = ESTADO_EN_PROCESO
+            item.inicio = _ahora()
+            item._inicio_monotonico = time.monotonic()
+
+    def actualizar_item(self, clave: str, estado: str):
+        """Cambia el estado de un ítem en curso (ej: estacionado mientras el SER no responde)."""
+        with self._lock:
+            self.items[clave].estado = estado
+
+    def terminar_item(
+        self, clave: str, estado: str, logs: int = 0, error: Optional[str] = None
+    ):
+        with self._lock:
+            item = self.items[clave]
+            item.estado = estado
+            item.logs = logs
+            item.error = error
+            item.fin = _ahora()
+            if item._inicio_monotonico is not None:
+                item.duracion_seg = round(time.monotonic() - item._inicio_monotonico, 2)
+
+    # ------------------------------------------------------------------
+    # Estado general
+    # ------------------------------------------------------------------
+    def _marcar_inicio(self):
+        with self._lock:
+            self.estado = ESTADO_EN_PROCESO
+            self.inicio = _ahora()
+            self._inicio_monotonico = time.monotonic()
+
+    def _marcar_fin(self, estado: str, error: Optional[str] = None):
+        with self._lock:
+            self.estado = estado
+            self.error = error
+            self.fin = _ahora()
+            if self._inicio_monotonico is not None:
+                self._duracion_seg = round(time.monotonic() - self._inicio_monotonico, 2)
+
+    def estado_final(self) -> Tuple[str, Optional[str]]:
+        """
+        Estado con el que termina un trabajo cuya función no falló, según sus
+        ítems: completado si todos terminaron bien, error si ninguno, y parcial
+        si solo algunos.
+        """
+        if self.cancelado:
+            return ESTADO_CANCELADO, None
+        with self._lock:
+            estados = [item.estado for item in self.items.values()]
+        exitosos = sum(e in (ESTADO_COMPLETADO, ESTADO_OMITIDO) for e in estados)
+        if exitosos == len(estados):
+            return ESTADO_COMPLETADO, None
+        fallidos = sum(e == ESTADO_ERROR for e in estados)
+        error = (
+            f"{fallidos} de {len(estados)} ítems con error y "
+            f"{len(estados) - exitosos - fallidos} sin terminar."
+        )
+        return (ESTADO_PARCIAL if exitosos else ESTADO_ERROR), error
+
+    @property
+    def terminado(self) -> bool:
+        return self.estado in ESTADOS_FINALES
+
+    def como_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            conteos: Dict[str, int] = {}
+            for item in self.items.values():
+                conteos[item.estado] = conteos.get(item.estado, 0) + 1
+            duracion = self._duracion_seg
+            if duracion is None and self._inicio_monotonico is not None:
+                duracion = round(time.monotonic() - self._inicio_monotonico, 2)
+            return {
+                "ingestion_id": self.ingestion_id,
+                "clave": self.clave,
+                "estado": self.estado,
+                "cancelacion_solicitada": self.cancelado,
+                "parametros": self.parametros,
+                "creado": self.creado,
+                "inicio": self.inicio,
+                "fin": self.fin,
+                "duracion_seg": duracion,
+                "error": self.error,
+                "registros_totales": self.registros_totales,
+                "registros_procesados": sum(i.logs for i in self.items.values()),
+                "items_totales": len(self.items),
+                "items_por_estado": conteos,
+                "items": {clave: item.como_dict() for clave, item in self.items.items()},
+            }
+
+
+class GestorTrabajos:
+    """
+    Cola de ingestas en segundo plano dentro del mismo proceso.
+
+    Cada trabajo corre en un hilo de un pool propio; el trabajo a su vez
+    reparte sus ítems en el pool de workers del SER. Cada ingesta descarga en
+    su propia carpeta, pero todas comparten el portal, por eso por defecto se
+    ejecuta un trabajo a la vez (SER_JOBS_WORKERS). Los trabajos terminados se
+    conservan en memoria para consulta, hasta SER_JOBS_RETENIDOS.
+    """
+
+    def __init__(self, max_workers: int = 1, retenidos: int = 100):
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="ser-job"
+        )
+        self._retenidos = retenidos
+        self._trabajos: "OrderedDict[str, Trabajo]" = OrderedDict()
+        self._futuros: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def enviar(
+        self,
+        ingestion_id: str,
+        parametros: Dict[str, Any],
+        funcion: Callable[[Trabajo], Any],
+        clave: Optional[str] = None,
+    ) -> Trabajo:
+        """
+        Encola `funcion(trabajo)` y devuelve el trabajo de inmediato. Los
+        trabajos se identifican por `clave` (por defecto, el ingestion_id).
+
+        Raises:
+            TrabajoEnCurso: Si ya hay un trabajo sin terminar con esa clave.
+        """
+        with self._lock:
+            trabajo = self._registrar(ingestion_id, parametros, clave)
+            self._futuros[trabajo.clave] = self._executor.submit(
+                self._ejecutar, trabajo, funcion
+            )
+        print(f"📥 Ingesta {trabajo.clave} encolada.")
+        return trabajo
+
+    @contextmanager
+    def en_curso(
+        self, ingestion_id: str, parametros: Dict[str, Any], clave: Optional[str] = None
+    ) -> Iterator[Trabajo]:
+        """
+        Registra un trabajo que se ejecuta fuera del pool (ej: en el event loop
+        de POST /async), para que figure en GET /jobs y ocupe su clave mientras
+        corre. Su estado final se fija al salir del bloque.
+
+        Raises:
+            TrabajoEnCurso: Si ya hay un trabajo sin terminar con esa clave.
+        """
+        with self._lock:
+            trabajo = self._registrar(ingestion_id, parametros, clave)
+        trabajo._marcar_inicio()
+        try:
+            yield trabajo
+        except TrabajoCancelado:
+            trabajo._marcar_fin(ESTADO_CANCELADO)
+            raise
+        except BaseException as e:
+            trabajo._marcar_fin(ESTADO_ERROR, str(e) or type(e).__name__)
+            raise
+        else:
+            trabajo._marcar_fin(*trabajo.estado_final())
+        finally:
+            print(f"📤 Ingesta {trabajo.clave} terminó: {trabajo.estado}.")
+
+    def _registrar(
+        self, ingestion_id: str, parametros: Dict[str, Any], clave: Optional[str]
+    ) -> Trabajo:
+        """Agrega un trabajo nuevo con `clave`; debe llamarse con `_lock` tomado."""
+        clave = clave or ingestion_id
+        existente = self._trabajos.get(clave)
+        if existente is not None and not existente.terminado:
+            raise TrabajoEnCurso(f"La ingesta {clave} ya está {existente.estado}.")
+        trabajo = Trabajo(ingestion_id, parametros, clave)
+        self._trabajos.pop(clave, None)
+        self._trabajos[clave] = trabajo
+        self._purgar()
+        return trabajo
+
+    def _ejecutar(self, trabajo: Trabajo, funcion: Callable[[Trabajo], Any]):
+        if trabajo.cancelado:
+            trabajo._marcar_fin(ESTADO_CANCELADO)
+            return
+        trabajo._marcar_inicio()
+        try:
+            funcion(trabajo)
+        except TrabajoCancelado:
+            trabajo._marcar_fin(ESTADO_CANCELADO)
+        except Exception as e:
+            traceback.print_exc()
+            trabajo._marcar_fin(ESTADO_ERROR, str(e))
+        else:
+            trabajo._marcar_fin(*trabajo.estado_final())
+        finally:
+            with self._lock:
+                self._futuros.pop(trabajo.clave, None)
+        print(f"📤 Ingesta {trabajo.clave} terminó: {trabajo.estado}.")
+
+    def _purgar(self):
+        """Descarta los trabajos terminados más antiguos por encima del límite."""
+        terminados = [clave for clave, t in self._trabajos.items() if t.terminado]
+        for clave in terminados[: max(0, len(self._trabajos) - self._retenidos)]:
+            del self._trabajos[clave]
+
+    def obtener(self, clave: str) -> Optional[Trabajo]:
+        with self._lock:
+            return self._trabajos.get(clave)
+
+    def cancelar(self, clave: str) -> Optional[Trabajo]:
+        """
+        Pide cancelar un trabajo. Si aún no empezó, no llega a ejecutarse; si
+        está en curso, los ítems en proceso terminan su etapa actual y los
+        pendientes se descartan.
+        """
+        with self._lock:
+            trabajo = self._trabajos.get(clave)
+            futuro = self._futuros.get(clave)
+        if trabajo is None:
+            return None
+        trabajo.cancelar()
+        if futuro is not None and futuro.cancel():
+            trabajo._marcar_fin(ESTADO_CANCELADO)
+        return trabajo
+
+    def apagar(self):
+        with self._lock:
+            trabajos = list(self._trabajos.values())
+        for trabajo in trabajos:
+            trabajo.cancelar()
+        self._executor.shutdown(wait=False, cancel_futures=True)
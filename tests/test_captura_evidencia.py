@@ -0,0 +1,48 @@
+import asyncio
+
+import pytest
+
+from app.playwright.CapturaEvidencia import CapturaEvidencia
+
+
+@pytest.fixture(autouse=True)
+def descargas(tmp_path, monkeypatch):
+    monkeypatch.setenv("DOWNLOAD_PATH", str(tmp_path / "descargas"))
+    monkeypatch.setenv("SER_CAPTURA_FORMATO", "png")
+    return tmp_path
+
+
+def test_guarda_y_replica_la_captura(descargas):
+    evidencia = CapturaEvidencia()
+    [ruta] = evidencia.guardar("colapsada", b"png", "nit-pag-1", [str(descargas / "a")])
+    evidencia.replicar(ruta, [str(descargas / "b"), str(descargas / "c")])
+    evidencia.esperar()
+    for carpeta in "abc":
+        assert (descargas / carpeta / "nit-pag-1.png").read_bytes() == b"png"
+
+
+def _fallar_al_guardar(ruta):
+    raise OSError("disco lleno")
+
+
+def test_esperar_falla_si_una_captura_no_quedo_en_disco(descargas):
+    evidencia = CapturaEvidencia(al_guardar=_fallar_al_guardar)
+    evidencia.guardar("colapsada", b"png", "nit-pag-1", [str(descargas / "a")])
+    with pytest.raises(RuntimeError, match="disco lleno"):
+        evidencia.esperar()
+    # Los errores ya reportados no se repiten en la siguiente espera
+    evidencia.esperar()
+
+
+def test_esperar_falla_si_se_replica_una_captura_no_programada(descargas):
+    evidencia = CapturaEvidencia()
+    evidencia.replicar(str(descargas / "a" / "inexistente.png"), [str(descargas / "b")])
+    with pytest.raises(RuntimeError, match="no fue programada"):
+        evidencia.esperar()
+
+
+def test_esperar_async_falla_igual_que_esperar(descargas):
+    evidencia = CapturaEvidencia(al_guardar=_fallar_al_guardar)
+    evidencia.guardar("expandida", b"png", "nit-pag-2", [str(descargas / "a")])
+    with pytest.raises(RuntimeError):
+        asyncio.run(evidencia.esperar_async())
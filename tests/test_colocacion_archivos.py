@@ -0,0 +1,79 @@
+import os
+import time
+
+import pytest
+
+from app.utils import colocacion_archivos
+from app.utils.colocacion_archivos import (
+    directorio_almacen,
+    guardar_por_contenido,
+    podar_almacen,
+)
+
+
+@pytest.fixture(autouse=True)
+def descargas(tmp_path, monkeypatch):
+    monkeypatch.setenv("DOWNLOAD_PATH", str(tmp_path / "descargas"))
+    return tmp_path / "descargas"
+
+
+def _archivos_del_almacen():
+    return [
+        os.path.join(raiz, nombre)
+        for raiz, _, archivos in os.walk(directorio_almacen())
+        for nombre in archivos
+    ]
+
+
+def test_contenido_repetido_se_guarda_una_vez(descargas):
+    destinos = [str(descargas / "ing" / "a.png"), str(descargas / "ing" / "b.png")]
+    guardar_por_contenido(b"captura", destinos[:1])
+    guardar_por_contenido(b"captura", destinos[1:])
+
+    (copia,) = _archivos_del_almacen()
+    assert os.stat(copia).st_nlink == 3
+    assert all(open(destino, "rb").read() == b"captura" for destino in destinos)
+
+
+def test_reutilizar_una_copia_la_protege_de_la_poda(descargas, monkeypatch):
+    destino = str(descargas / "ing" / "a.png")
+    sha256 = guardar_por_contenido(b"captura", [destino])
+    (copia,) = _archivos_del_almacen()
+    inodo = os.stat(copia).st_ino
+    # La carpeta se liberó hace rato: la copia quedó vieja y sin enlaces
+    os.remove(destino)
+    hace_dos_horas = time.time() - 7200
+    os.utime(copia, (hace_dos_horas, hace_dos_horas))
+
+    # Otra ingesta la reutiliza y la poda corre justo antes del enlace
+    enlazar_original = colocacion_archivos.enlazar
+
+    def enlazar(origen, destino_):
+        podar_almacen()
+        enlazar_original(origen, destino_)
+
+    monkeypatch.setattr(colocacion_archivos, "enlazar", enlazar)
+    assert guardar_por_contenido(b"captura", [destino]) == sha256
+    # Sobrevivió a la poda: es la misma copia, no una reescrita
+    assert os.stat(destino).st_ino == inodo
+
+
+def test_copia_borrada_antes_de_enlazar_se_reescribe(descargas, monkeypatch):
+    destino = str(descargas / "ing" / "a.png")
+    guardar_por_contenido(b"captura", [str(descargas / "otra" / "a.png")])
+    (copia,) = _archivos_del_almacen()
+    enlazar_original = colocacion_archivos.enlazar
+    borrada = []
+
+    def enlazar(origen, destino_):
+        # La poda gana la carrera una vez: el origen desaparece antes del link
+        if not borrada:
+            borrada.append(origen)
+            os.remove(origen)
+        enlazar_original(origen, destino_)
+
+    monkeypatch.setattr(colocacion_archivos, "enlazar", enlazar)
+    guardar_por_contenido(b"captura", [destino])
+    assert borrada == [copia]
+    assert open(destino, "rb").read() == b"captura"
+    assert os.path.exists(copia)
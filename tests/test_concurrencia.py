@@ -0,0 +1,59 @@
+from app.utils.concurrencia import (
+    OPERACION_DESCARGA,
+    OPERACION_ESPERA,
+    ControladorConcurrencia,
+)
+
+
+def _controlador(**opciones):
+    valores = dict(piso=2, techo=6, inicial=4, ventana=5, tasa_error_max=0.2)
+    valores.update(opciones)
+    return ControladorConcurrencia(**valores)
+
+
+def _ventana(controlador, latencia_seg=1.0, errores=0, operacion=OPERACION_ESPERA):
+    for i in range(controlador.ventana):
+        controlador.registrar(operacion, latencia_seg, exito=i >= errores)
+
+
+def test_sube_de_a_uno_con_ventanas_sanas_hasta_el_techo():
+    controlador = _controlador()
+    _ventana(controlador)
+    assert controlador.nivel == 5
+    for _ in range(5):
+        _ventana(controlador)
+    assert controlador.nivel == 6
+
+
+def test_baja_multiplicativamente_con_errores_hasta_el_piso():
+    controlador = _controlador(inicial=6, factor_reduccion=0.5)
+    _ventana(controlador, errores=2)
+    assert controlador.nivel == 3
+    _ventana(controlador, errores=2)
+    _ventana(controlador, errores=2)
+    assert controlador.nivel == 2
+
+
+def test_baja_si_el_p90_supera_la_latencia_objetivo():
+    controlador = _controlador(latencias_objetivo={OPERACION_DESCARGA: 10.0})
+    _ventana(controlador, latencia_seg=12.0, operacion=OPERACION_DESCARGA)
+    assert controlador.nivel < 4
+    assert controlador.estado()["ultima_evaluacion"]["latencia_p90_relativa"] > 1
+
+
+def test_no_evalua_antes_de_completar_la_ventana():
+    controlador = _controlador()
+    for _ in range(controlador.ventana - 1):
+        controlador.registrar(OPERACION_ESPERA, 100.0, exito=False)
+    assert controlador.nivel == 4
+    assert controlador.estado()["observaciones_pendientes"] == controlador.ventana - 1
+
+
+def test_cupo_respeta_el_nivel():
+    controlador = _controlador(inicial=2)
+    controlador.adquirir()
+    assert controlador.hay_cupo()
+    controlador.adquirir()
+    assert not controlador.hay_cupo()
+    controlador.liberar()
+    assert controlador.hay_cupo()
@@ -0,0 +1,266 @@
+import os
+import sqlite3
+
+import pytest
+
+from app.repository.ManifiestoRepository import (
+    ETAPA_REGISTRADO,
+    ETAPA_SCRAPEADO,
+    ETAPA_SUBIDO,
+    ManifiestoRepository,
+)
+from app.playwright.ser_scripts import ruta_periodo
+from app.utils.planificacion import (
+    GrupoTrabajo,
+    clave_shard,
+    filtrar_shard,
+    planificar_reanudacion,
+    resolver_shard,
+    shard_de,
+)
+
+
+def _registros():
+    return [
+        {
+            "Identificacion": 800000000 + nit,
+            "Expediente": 96000000 + nit % 7,
+            "ANNO": anio,
+            "TRIMESTRE": trimestre,
+        }
+        for nit in range(60)
+        for anio in (2024, 2025)
+        for trimestre in (1, 2)
+    ]
+
+
+# ----------------------------------------------------------------------
+# Shards
+# ----------------------------------------------------------------------
+def test_shard_estable_entre_llamadas():
+    assert shard_de("800048212", "96002564", 8) == shard_de("800048212", "96002564", 8)
+    assert 0 <= shard_de("800048212", "96002564", 8) < 8
+
+
+def test_shards_disjuntos_y_completos():
+    registros = _registros()
+    shards = [filtrar_shard(registros, i, 4) for i in range(4)]
+    assert sum(len(shard) for shard in shards) == len(registros)
+    vistos = set()
+    for shard in shards:
+        claves = {id(item) for item in shard}
+        assert not claves & vistos
+        vistos |= claves
+    assert all(shards)
+
+
+def test_todos_los_periodos_de_un_nit_caen_en_el_mismo_shard():
+    registros = _registros()
+    shard_por_clave = {}
+    for indice in range(3):
+        for item in filtrar_shard(registros, indice, 3):
+            clave = (item["Identificacion"], item["Expediente"])
+            assert shard_por_clave.setdefault(clave, indice) == indice
+
+
+def test_un_solo_shard_devuelve_todo():
+    registros = _registros()
+    assert filtrar_shard(registros, 0, 1) is registros
+
+
+def test_clave_shard_distingue_los_shards_de_una_ingesta():
+    assert clave_shard("ing") == "ing"
+    assert clave_shard("ing", 0, 1) == "ing"
+    claves = {clave_shard("ing", i, 3) for i in range(3)}
+    assert claves == {"ing-shard-0-de-3", "ing-shard-1-de-3", "ing-shard-2-de-3"}
+
+
+def test_resolver_shard_desde_cloud_run(monkeypatch):
+    monkeypatch.setenv("CLOUD_RUN_TASK_INDEX", "2")
+    monkeypatch.setenv("CLOUD_RUN_TASK_COUNT", "5")
+    assert resolver_shard() == (2, 5)
+    assert resolver_shard(0, 1) == (0, 1)
+    with pytest.raises(ValueError):
+        resolver_shard(5, 5)
+
+
+# ----------------------------------------------------------------------
+# Manifiesto y reanudación
+# ----------------------------------------------------------------------
+@pytest.fixture
+def manifiesto(tmp_path, monkeypatch):
+    monkeypatch.setenv("SER_MANIFIESTO_PATH", str(tmp_path / "manifiestos"))
+    manifiesto = ManifiestoRepository("ingesta-prueba")
+    yield manifiesto
+    manifiesto.cerrar()
+
+
+def test_manifiesto_nuevo_y_reanudado(tmp_path, monkeypatch):
+    monkeypatch.setenv("SER_MANIFIESTO_PATH", str(tmp_path))
+    primero = ManifiestoRepository("ingesta-prueba")
+    assert not primero.reanudado
+    primero.marcar("1", "2", 2025, 1, ETAPA_REGISTRADO)
+    primero.cerrar()
+
+    segundo = ManifiestoRepository("ingesta-prueba")
+    assert segundo.reanudado
+    assert segundo.contar(ETAPA_REGISTRADO) == 1
+    segundo.cerrar()
+
+
+class _BlobFalso:
+    def __init__(self, bucket, nombre):
+        self.bucket = bucket
+        self.nombre = nombre
+
+    def upload_from_filename(self, ruta):
+        if self.bucket.falla:
+            raise ConnectionError("sin red")
+        with open(ruta, "rb") as archivo:
+            self.bucket.objetos[self.nombre] = archivo.read()
+        self.bucket.subidas += 1
+
+    def download_to_filename(self, ruta):
+        if self.nombre not in self.bucket.objetos:
+            from google.api_core import exceptions
+
+            raise exceptions.NotFound(self.nombre)
+        with open(ruta, "wb") as archivo:
+            archivo.write(self.bucket.objetos[self.nombre])
+
+
+class _BucketFalso:
+    name = "bucket-prueba"
+
+    def __init__(self):
+        self.objetos = {}
+        self.subidas = 0
+        self.falla = False
+
+    def blob(self, nombre):
+        return _BlobFalso(self, nombre)
+
+
+def test_procesos_respaldan_el_manifiesto_compartido(tmp_path, monkeypatch):
+    monkeypatch.setenv("SER_MANIFIESTO_PATH", str(tmp_path))
+    monkeypatch.setenv("SER_MANIFIESTO_RESPALDO_SEG", "0")
+    bucket = _BucketFalso()
+    # El proceso principal prepara el archivo; los de trabajo lo abren sin restaurar
+    principal = ManifiestoRepository("ingesta-prueba")
+    primero = ManifiestoRepository("ingesta-prueba", bucket=bucket, restaurar=False)
+    segundo = ManifiestoRepository("ingesta-prueba", bucket=bucket, restaurar=False)
+
+    segundo.marcar("2", "2", 2025, 1, ETAPA_REGISTRADO)
+    primero.marcar("1", "2", 2025, 1, ETAPA_REGISTRADO)
+    assert bucket.subidas == 2
+    # Dentro del intervalo no se vuelve a respaldar
+    primero.intervalo_respaldo = 3600
+    primero.marcar("1", "2", 2025, 2, ETAPA_REGISTRADO)
+    assert bucket.subidas == 2
+
+    # El respaldo de un proceso incluye lo que escribieron los demás
+    respaldo = tmp_path / "respaldo.sqlite"
+    respaldo.write_bytes(bucket.objetos["manifiestos/ingesta-prueba.sqlite"])
+    conexion = sqlite3.connect(respaldo)
+    (cantidad,) = conexion.execute("SELECT COUNT(*) FROM etapas").fetchone()
+    conexion.close()
+    assert cantidad == 2
+
+    for manifiesto_ in (segundo, primero, principal):
+        manifiesto_.cerrar()
+
+
+def test_cerrar_completo_borra_el_archivo_local_respaldado(tmp_path, monkeypatch):
+    # Restaurar desde el bucket usa las excepciones del cliente de Google
+    pytest.importorskip("google.api_core")
+    monkeypatch.setenv("SER_MANIFIESTO_PATH", str(tmp_path))
+    bucket = _BucketFalso()
+    manifiesto = ManifiestoRepository("ingesta-prueba", bucket=bucket)
+    manifiesto.marcar("1", "2", 2025, 1, ETAPA_REGISTRADO)
+    manifiesto.cerrar(completo=True)
+    assert not os.path.exists(manifiesto.local_path)
+
+    # Reanudarla después la restaura desde el bucket
+    restaurado = ManifiestoRepository("ingesta-prueba", bucket=bucket)
+    assert restaurado.reanudado
+    assert restaurado.contar(ETAPA_REGISTRADO) == 1
+    restaurado.cerrar()
+
+
+@pytest.mark.parametrize("completo, con_bucket, falla", [
+    (False, True, False),
+    (True, False, False),
+    (True, True, True),
+])
+def test_cerrar_conserva_el_archivo_local(tmp_path, monkeypatch, completo, con_bucket, falla):
+    if con_bucket:
+        pytest.importorskip("google.api_core")
+    monkeypatch.setenv("SER_MANIFIESTO_PATH", str(tmp_path))
+    bucket = _BucketFalso()
+    bucket.falla = falla
+    manifiesto = ManifiestoRepository(
+        "ingesta-prueba", bucket=bucket if con_bucket else None
+    )
+    manifiesto.marcar("1", "2", 2025, 1, ETAPA_REGISTRADO)
+    manifiesto.cerrar(completo=completo)
+    # Con pendientes, o sin un respaldo exitoso, el archivo local es lo único que queda
+    assert os.path.exists(manifiesto.local_path)
+
+
+def test_marcar_conserva_las_urls_de_la_subida(manifiesto):
+    manifiesto.marcar("1", "2", 2025, 1, ETAPA_SCRAPEADO)
+    manifiesto.marcar(
+        "1", "2", 2025, 1, ETAPA_SUBIDO, ["https://a/fur.pdf"], ["gs://b/fur.pdf"]
+    )
+    # REGISTRADO sin URLs no debe borrar las de la subida (COALESCE)
+    manifiesto.marcar("1", "2", 2025, 1, ETAPA_REGISTRADO)
+
+    etapas = manifiesto.etapas_de("1", "2", 2025)
+    assert etapas == {1: (ETAPA_REGISTRADO, ["https://a/fur.pdf"], ["gs://b/fur.pdf"])}
+
+
+def test_marcar_reemplaza_urls_si_llegan_nuevas(manifiesto):
+    manifiesto.marcar("1", "2", 2025, 1, ETAPA_SUBIDO, ["https://a/v1.pdf"], [])
+    manifiesto.marcar("1", "2", 2025, 1, ETAPA_SUBIDO, ["https://a/v2.pdf"], [])
+    assert manifiesto.etapas_de("1", "2", 2025)[1][1] == ["https://a/v2.pdf"]
+
+
+def _grupo(trimestres):
+    return GrupoTrabajo(
+        "1",
+        "2",
+        2025,
+        [{"TRIMESTRE": trimestre} for trimestre in trimestres],
+    )
+
+
+def test_reanudacion_sin_historial_scrapea_todo(manifiesto, tmp_path):
+    pendientes, requiere_scrape, subidas = planificar_reanudacion(
+        manifiesto, _grupo([1, 2]), str(tmp_path)
+    )
+    assert pendientes == [1, 2]
+    assert requiere_scrape
+    assert subidas == {}
+
+
+def test_reanudacion_omite_registrados_y_registra_subidos(manifiesto, tmp_path):
+    manifiesto.marcar("1", "2", 2025, 1, ETAPA_REGISTRADO)
+    manifiesto.marcar("1", "2", 2025, 2, ETAPA_SUBIDO, ["https://a/t2.pdf"], ["gs://b/t2.pdf"])
+
+    pendientes, requiere_scrape, subidas = planificar_reanudacion(
+        manifiesto, _grupo([1, 2]), str(tmp_path)
+    )
+    assert pendientes == [2]
+    assert not requiere_scrape
+    assert subidas == {2: (["https://a/t2.pdf"], ["gs://b/t2.pdf"])}
+
+
+def test_reanudacion_scrapeado_depende_de_la_carpeta_local(manifiesto, tmp_path):
+    manifiesto.marcar("1", "2", 2025, 3, ETAPA_SCRAPEADO)
+    grupo = _grupo([3])
+
+    # La carpeta del período se perdió (contenedor nuevo): hay que volver a scrapear
+    assert planificar_reanudacion(manifiesto, grupo, str(tmp_path))[1]
+
+    os.makedirs(ruta_periodo(str(tmp_path), "ia", 2025, "1", "2", 3))
+    assert not planificar_reanudacion(manifiesto, grupo, str(tmp_path))[1]
@@ -0,0 +1,148 @@
+import queue
+import threading
+import time
+
+from app.utils import procesos
+from app.utils.planificacion import GrupoTrabajo
+from app.utils.procesos import (
+    EVENTO_FIN,
+    EVENTO_INICIO,
+    EVENTO_LISTO,
+    EVENTO_OBSERVACION,
+    PoolProcesosSer,
+)
+from app.utils.proteccion_ser import CircuitoSer
+from app.utils.trabajos import ESTADO_COMPLETADO, ESTADO_ERROR, Trabajo
+
+
+class ProcesoFalso:
+    """Proceso de trabajo simulado: procesa o 'muere' al recibir un grupo."""
+
+    def __init__(self, indice, eventos, caidas):
+        self.name = f"ser-proceso-{indice}"
+        self.exitcode = None
+        self.indice = indice
+        self.eventos = eventos
+        self.caidas = caidas
+        self.vivo = True
+
+    def is_alive(self):
+        return self.vivo
+
+    def join(self, timeout=None):
+        pass
+
+    def terminate(self):
+        self.vivo = False
+
+    def recibir(self, grupo):
+        if grupo is None:
+            self.vivo = False
+            return
+        self.eventos.put((EVENTO_INICIO, self.indice, grupo.etiqueta))
+        if self.caidas.get(grupo.etiqueta, 0) > 0:
+            self.caidas[grupo.etiqueta] -= 1
+            self.vivo = False
+            self.exitcode = -11
+            return
+        self.eventos.put(
+            (EVENTO_FIN, self.indice, grupo.etiqueta, ESTADO_COMPLETADO, [{"log": grupo.etiqueta}], None)
+        )
+
+
+class ColaFalsa:
+    def __init__(self, proceso):
+        self.proceso = proceso
+
+    def put(self, grupo):
+        self.proceso.recibir(grupo)
+
+
+def _pool(monkeypatch, procesos_, caidas, **entorno):
+    monkeypatch.setenv("SER_PROCESOS_REVISION_SEG", "0.05")
+    for nombre, valor in entorno.items():
+        monkeypatch.setenv(nombre, valor)
+    monkeypatch.setattr(
+        procesos, "get_circuito_ser", lambda: CircuitoSer(umbral_fallos=100, espera_seg=1, espera_max_seg=1)
+    )
+    pool = PoolProcesosSer(configuracion={}, procesos=procesos_)
+    pool._cola_eventos = queue.Queue()
+    pool.lanzados = 0
+
+    def lanzar(indice):
+        proceso = ProcesoFalso(indice, pool._cola_eventos, caidas)
+        pool._workers[indice] = proceso
+        pool._colas[indice] = ColaFalsa(proceso)
+        pool.lanzados += 1
+        pool._cola_eventos.put((EVENTO_LISTO, indice))
+
+    monkeypatch.setattr(pool, "_lanzar", lanzar)
+    return pool
+
+
+def _trabajo(grupos):
+    trabajo = Trabajo("ing", {})
+    for grupo in grupos:
+        trabajo.agregar_item(grupo.etiqueta, grupo.trimestres, len(grupo.registros))
+    return trabajo
+
+
+def _grupos(cantidad):
+    return [
+        GrupoTrabajo(str(nit), "96000000", 2025, [{"TRIMESTRE": 1}])
+        for nit in range(cantidad)
+    ]
+
+
+def test_todos_los_grupos_terminan_sin_caidas(monkeypatch):
+    grupos = _grupos(5)
+    trabajo = _trabajo(grupos)
+    pool = _pool(monkeypatch, 2, {})
+    logs = pool.ejecutar(grupos, trabajo)
+    assert len(logs) == 5
+    assert all(item.estado == ESTADO_COMPLETADO for item in trabajo.items.values())
+
+
+def test_proceso_caido_se_relanza_y_su_grupo_se_reintenta(monkeypatch):
+    grupos = _grupos(3)
+    trabajo = _trabajo(grupos)
+    pool = _pool(monkeypatch, 2, {grupos[0].etiqueta: 1})
+    logs = pool.ejecutar(grupos, trabajo)
+    assert len(logs) == 3
+    assert trabajo.items[grupos[0].etiqueta].estado == ESTADO_COMPLETADO
+    assert pool.lanzados == 3
+
+
+def test_grupo_que_tumba_procesos_falla_tras_los_reintentos(monkeypatch):
+    grupos = _grupos(2)
+    trabajo = _trabajo(grupos)
+    pool = _pool(monkeypatch, 1, {grupos[0].etiqueta: 5}, SER_PROCESOS_REINTENTOS="1")
+    logs = pool.ejecutar(grupos, trabajo)
+    assert trabajo.items[grupos[0].etiqueta].estado == ESTADO_ERROR
+    assert trabajo.items[grupos[1].etiqueta].estado == ESTADO_COMPLETADO
+    assert len(logs) == 1
+
+
+def test_caida_se_detecta_aunque_otros_procesos_reporten_sin_pausa(monkeypatch):
+    grupos = _grupos(2)
+    trabajo = _trabajo(grupos)
+    pool = _pool(monkeypatch, 2, {grupos[0].etiqueta: 1})
+    parar = threading.Event()
+
+    def reportar():
+        # Un proceso vivo reporta latencias todo el tiempo: la cola nunca se vacía
+        while not parar.is_set():
+            pool._cola_eventos.put((EVENTO_OBSERVACION, 1, "espera", 0.1, True))
+            time.sleep(0.005)
+
+    hilo = threading.Thread(target=reportar, daemon=True)
+    hilo.start()
+    inicio = time.monotonic()
+    try:
+        pool.ejecutar(grupos, trabajo)
+    finally:
+        parar.set()
+        hilo.join()
+    # Sin la revisión periódica el bucle esperaría a que la cola se vacíe
+    assert time.monotonic() - inicio < 2
+    assert trabajo.items[grupos[0].etiqueta].estado == ESTADO_COMPLETADO
@@ -0,0 +1,144 @@
+import pytest
+
+from app.utils import proteccion_ser
+from app.utils.proteccion_ser import (
+    CIRCUITO_ABIERTO,
+    CIRCUITO_CERRADO,
+    CIRCUITO_SEMIABIERTO,
+    CircuitoAbierto,
+    CircuitoSer,
+    get_limitador_ser,
+    llamada_ser,
+    repartir_limitador_ser,
+)
+from app.utils.trabajos import TrabajoCancelado
+
+
+class Reloj:
+    """Reloj monotónico controlado por la prueba."""
+
+    def __init__(self):
+        self.ahora = 1000.0
+
+    def __call__(self) -> float:
+        return self.ahora
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    reloj = Reloj()
+    monkeypatch.setattr(proteccion_ser.time, "monotonic", reloj)
+    return reloj
+
+
+@pytest.fixture
+def circuito(reloj):
+    return CircuitoSer(umbral_fallos=3, espera_seg=60, espera_max_seg=200)
+
+
+def _abrir(circuito: CircuitoSer):
+    for _ in range(circuito.umbral_fallos):
+        circuito.registrar(False)
+
+
+def test_se_abre_tras_umbral_de_fallos_consecutivos(circuito):
+    circuito.registrar(False)
+    circuito.registrar(False)
+    circuito.registrar(True)  # un éxito reinicia la cuenta
+    circuito.registrar(False)
+    circuito.registrar(False)
+    assert circuito.estado == CIRCUITO_CERRADO
+
+    circuito.registrar(False)
+    assert circuito.estado == CIRCUITO_ABIERTO
+    assert circuito.aperturas == 1
+    assert not circuito.permite_llamada()
+
+
+def test_abierto_falla_rapido_sin_ejecutar_la_operacion(circuito, monkeypatch):
+    monkeypatch.setattr(proteccion_ser, "get_circuito_ser", lambda: circuito)
+    _abrir(circuito)
+    with pytest.raises(CircuitoAbierto):
+        with llamada_ser("navegacion"):
+            pytest.fail("La operación no debía ejecutarse con el circuito abierto.")
+
+
+def test_llamada_fallida_cuenta_para_el_circuito(circuito, monkeypatch):
+    monkeypatch.setattr(proteccion_ser, "get_circuito_ser", lambda: circuito)
+    for _ in range(circuito.umbral_fallos):
+        with pytest.raises(TimeoutError):
+            with llamada_ser("navegacion"):
+                raise TimeoutError("El portal no respondió.")
+    assert circuito.estado == CIRCUITO_ABIERTO
+
+
+def test_pasa_a_semiabierto_y_solo_una_sonda(circuito, reloj):
+    _abrir(circuito)
+    reloj.ahora += 59
+    assert not circuito.permite_llamada()
+
+    reloj.ahora += 1
+    assert circuito.permite_llamada()
+    assert circuito.estado == CIRCUITO_SEMIABIERTO
+    assert circuito.esperar_turno() is True
+    # Mientras la sonda está en curso, el resto sigue esperando
+    assert circuito._intentar_turno(lambda: False) is None
+
+
+def test_sonda_exitosa_cierra_el_circuito(circuito, reloj):
+    _abrir(circuito)
+    reloj.ahora += 60
+    assert circuito.esperar_turno() is True
+    circuito.terminar_sonda(True)
+    assert circuito.estado == CIRCUITO_CERRADO
+    assert circuito.esperar_turno() is False
+
+
+def test_sonda_fallida_reabre_con_el_doble_de_espera_hasta_el_maximo(circuito, reloj):
+    _abrir(circuito)
+    esperas = []
+    for _ in range(3):
+        reloj.ahora += 1000
+        assert circuito.esperar_turno() is True
+        inicio = reloj.ahora
+        circuito.terminar_sonda(False)
+        assert circuito.estado == CIRCUITO_ABIERTO
+        esperas.append(circuito._abierto_hasta - inicio)
+    assert esperas == [120, 200, 200]
+
+    # Al cerrarse, la espera vuelve a la base
+    reloj.ahora += 1000
+    circuito.esperar_turno()
+    circuito.terminar_sonda(True)
+    _abrir(circuito)
+    assert circuito._abierto_hasta - reloj.ahora == 60
+
+
+def test_fallo_registrado_en_semiabierto_reabre(circuito, reloj):
+    _abrir(circuito)
+    reloj.ahora += 60
+    circuito.registrar(False)
+    assert circuito.estado == CIRCUITO_ABIERTO
+    assert circuito.aperturas == 2
+
+
+def test_cancelacion_mientras_espera_estacionado(circuito):
+    _abrir(circuito)
+    with pytest.raises(TrabajoCancelado):
+        circuito.esperar_turno(cancelado=lambda: True)
+
+
+def test_limitador_repartido_entre_procesos(monkeypatch):
+    monkeypatch.setenv("SER_TASA_POR_SEG", "8")
+    monkeypatch.setenv("SER_TASA_RAFAGA", "6")
+    try:
+        repartir_limitador_ser(4)
+        limitador = get_limitador_ser()
+        assert limitador.tasa == 2
+        assert limitador.capacidad == 1.5
+
+        # La ráfaga nunca baja de un token
+        repartir_limitador_ser(10)
+        assert get_limitador_ser().capacidad == 1.0
+    finally:
+        repartir_limitador_ser(1)
@@ -0,0 +1,114 @@
+import asyncio
+
+import pytest
+
+from app.utils import reintentos
+from app.utils.proteccion_ser import CircuitoAbierto
+from app.utils.reintentos import (
+    ETAPA_DESCARGA,
+    es_error_permanente,
+    reintentar,
+    reintentar_async,
+)
+
+
+class ErrorHttp(Exception):
+    """Error con `code`, como los de google.api_core."""
+
+    def __init__(self, code):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+
+
+class Respuesta:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class ErrorRequests(Exception):
+    """Error con `response.status_code`, como los de requests."""
+
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.response = Respuesta(status_code)
+
+
+@pytest.fixture(autouse=True)
+def politica_rapida(monkeypatch):
+    monkeypatch.setenv("SER_REINTENTOS_DESCARGA_INTENTOS", "3")
+    monkeypatch.setattr(reintentos.time, "sleep", lambda _: None)
+    reintentos.politica_de.cache_clear()
+    yield
+    reintentos.politica_de.cache_clear()
+
+
+@pytest.mark.parametrize("codigo", [400, 401, 403, 404, 409, 422])
+def test_4xx_es_permanente(codigo):
+    assert es_error_permanente(ErrorHttp(codigo))
+    assert es_error_permanente(ErrorRequests(codigo))
+
+
+@pytest.mark.parametrize("codigo", [408, 429, 500, 502, 503])
+def test_408_429_y_5xx_son_transitorios(codigo):
+    assert not es_error_permanente(ErrorHttp(codigo))
+    assert not es_error_permanente(ErrorRequests(codigo))
+
+
+def test_error_sin_codigo_es_transitorio():
+    assert not es_error_permanente(TimeoutError("sin respuesta"))
+    # `code` que no es un entero (ej: errno como texto) no se interpreta
+    assert not es_error_permanente(ErrorHttp("ECONNRESET"))
+
+
+def _fallar(errores):
+    """Función que lanza los errores dados en orden y luego devuelve 'ok'."""
+    llamadas = []
+
+    def funcion():
+        llamadas.append(1)
+        if errores:
+            raise errores.pop(0)
+        return "ok"
+
+    return funcion, llamadas
+
+
+def test_reintenta_errores_transitorios_hasta_lograrlo():
+    funcion, llamadas = _fallar([ErrorHttp(503), ErrorHttp(429)])
+    assert reintentar(funcion, ETAPA_DESCARGA, "prueba") == "ok"
+    assert len(llamadas) == 3
+
+
+def test_agotados_los_intentos_relanza_el_ultimo_error():
+    funcion, llamadas = _fallar([ErrorHttp(503), ErrorHttp(503), ErrorHttp(500)])
+    with pytest.raises(ErrorHttp) as error:
+        reintentar(funcion, ETAPA_DESCARGA, "prueba")
+    assert error.value.code == 500
+    assert len(llamadas) == 3
+
+
+@pytest.mark.parametrize(
+    "error", [ErrorHttp(404), LookupError("NIT inexistente"), CircuitoAbierto("caído")]
+)
+def test_no_reintenta_errores_permanentes_ni_no_reintentables(error):
+    funcion, llamadas = _fallar([error])
+    with pytest.raises(type(error)):
+        reintentar(funcion, ETAPA_DESCARGA, "prueba")
+    assert len(llamadas) == 1
+
+
+def test_reintentar_async(monkeypatch):
+    async def sin_espera(_):
+        return None
+
+    monkeypatch.setattr(reintentos.asyncio, "sleep", sin_espera)
+    llamadas = []
+
+    async def funcion():
+        llamadas.append(1)
+        if len(llamadas) < 2:
+            raise ConnectionError("HTTP 502")
+        return "ok"
+
+    assert asyncio.run(reintentar_async(funcion, ETAPA_DESCARGA, "prueba")) == "ok"
+    assert len(llamadas) == 2
@@ -0,0 +1,118 @@
+import base64
+import json
+
+import pytest
+
+from app.playwright.ser_scripts import (
+    encabezados_reenviables,
+    extraer_pdf_de_respuesta,
+    opcion_operador,
+    periodo_de_fecha,
+    repartir_paginas,
+)
+
+
+@pytest.mark.parametrize(
+    "fecha, periodo",
+    [
+        ("01/01/2025", (2025, 1)),
+        ("31/03/2025", (2025, 1)),
+        ("01/04/2025", (2025, 2)),
+        ("30/09/2024", (2024, 3)),
+        ("31/12/2024", (2024, 4)),
+        # Así llega la celda extraída de la tabla, con espacios alrededor
+        ("  15/08/2025 \n", (2025, 3)),
+    ],
+)
+def test_periodo_de_fecha(fecha, periodo):
+    assert periodo_de_fecha(fecha) == periodo
+
+
+def test_periodo_de_fecha_invalida():
+    with pytest.raises(ValueError):
+        periodo_de_fecha("2025-01-01")
+
+
+OPCIONES = [
+    "Seleccione",
+    "8001234567 - OPERADOR UNO S.A.S.",
+    "800123456 - OPERADOR DOS S.A.",
+    "900555 - OPERADOR TRES",
+]
+
+
+def test_opcion_operador_coincide_con_el_nit_completo():
+    assert opcion_operador(OPCIONES, "800123456") == "800123456 - OPERADOR DOS S.A."
+    assert opcion_operador(OPCIONES, "8001234567") == "8001234567 - OPERADOR UNO S.A.S."
+
+
+def test_opcion_operador_no_acepta_un_nit_parcial():
+    # '900555' no debe tomarse por el prefijo de otro NIT ni viceversa
+    assert opcion_operador(OPCIONES, "90055") is None
+    assert opcion_operador(OPCIONES, "9005551") is None
+
+
+
+@pytest.mark.parametrize(
+    "total, partes, rangos",
+    [
+        (1, 4, [(1, 1)]),
+        (6, 3, [(1, 2), (3, 4), (5, 6)]),
+        (7, 3, [(1, 3), (4, 5), (6, 7)]),
+        (3, 5, [(1, 1), (2, 2), (3, 3)]),
+        (5, 0, [(1, 5)]),
+    ],
+)
+def test_repartir_paginas(total, partes, rangos):
+    assert repartir_paginas(total, partes) == rangos
+
+
+@pytest.mark.parametrize("total, partes", [(57, 4), (100, 7), (2, 2)])
+def test_repartir_paginas_cubre_todo_sin_solapes(total, partes):
+    paginas = [p for inicio, fin in repartir_paginas(total, partes) for p in range(inicio, fin + 1)]
+    assert paginas == list(range(1, total + 1))
+
+
+PDF = b"%PDF-1.4 contenido"
+
+
+def test_extraer_pdf_directo_con_nombre_del_encabezado():
+    contenido, nombre = extraer_pdf_de_respuesta(
+        "application/pdf", PDF, 'attachment; filename="FUR 123.pdf"', "https://ser/api/fur/123"
+    )
+    assert (contenido, nombre) == (PDF, "FUR 123.pdf")
+
+
+def test_extraer_pdf_con_nombre_codificado():
+    _, nombre = extraer_pdf_de_respuesta(
+        "application/pdf", PDF, "attachment; filename*=UTF-8''FUR%20a%C3%B1o.pdf", ""
+    )
+    assert nombre == "FUR año.pdf"
+
+
+def test_extraer_pdf_sin_nombre_usa_la_url():
+    _, nombre = extraer_pdf_de_respuesta("application/pdf", PDF, "", "https://ser/archivos/fur-9?x=1")
+    assert nombre == "fur-9.pdf"
+    _, nombre = extraer_pdf_de_respuesta("application/pdf", PDF, "", "https://ser/")
+    assert nombre == "fur.pdf"
+
+
+def test_extraer_pdf_de_respuesta_json():
+    cuerpo = json.dumps(
+        {"data": {"archivo": {"content": base64.b64encode(PDF).decode()}, "Nombre": "FUR-77"}}
+    ).encode()
+    contenido, nombre = extraer_pdf_de_respuesta(
+        "application/json; charset=utf-8", cuerpo, "", "https://ser/api/fur/77"
+    )
+    assert (contenido, nombre) == (PDF, "FUR-77.pdf")
+
+
+def test_extraer_pdf_de_json_sin_archivo_falla():
+    with pytest.raises(KeyError):
+        extraer_pdf_de_respuesta("application/json", b'{"data": {}}', "", "")
+
+
+def test_encabezados_reenviables():
+    assert encabezados_reenviables(
+        {":authority": "ser", "Host": "ser", "Content-Length": "0", "Authorization": "Bearer x"}
+    ) == {"Authorization": "Bearer x"}
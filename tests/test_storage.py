@@ -0,0 +1,363 @@
+import base64
+import hashlib
+import os
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("google.cloud.storage")
+
+from google.api_core import exceptions
+
+from app.repository import StorageRepository as modulo
+from app.repository.StorageRepository import (
+    RESULTADO_COPIADO,
+    RESULTADO_ERROR,
+    RESULTADO_OMITIDO,
+    RESULTADO_SUBIDO,
+    StorageRepository,
+)
+from app.utils import reintentos
+
+
+class BlobFalso:
+    def __init__(self, bucket, name):
+        self.bucket = bucket
+        self.name = name
+        self.size = None
+        self.md5_hash = None
+        self.crc32c = None
+
+    @property
+    def public_url(self):
+        return f"https://storage.googleapis.com/{self.bucket.name}/{self.name}"
+
+    def _guardar(self, contenido):
+        self.size = len(contenido)
+        self.md5_hash = base64.b64encode(hashlib.md5(contenido).digest()).decode("ascii")
+        self.bucket.objetos[self.name] = self
+
+    def upload_from_filename(self, ruta):
+        self.bucket.intentos.append(self.name)
+        if self.name in self.bucket.prohibidos:
+            raise exceptions.Forbidden("403")
+        if self.name in self.bucket.fallas_subida:
+            self.bucket.fallas_subida.remove(self.name)
+            raise exceptions.ServiceUnavailable("503")
+        with open(ruta, "rb") as archivo:
+            self._guardar(archivo.read())
+        self.bucket.subidas.append(self.name)
+
+
+class BucketFalso:
+    name = "bucket-prueba"
+
+    def __init__(self):
+        self.objetos = {}
+        self.subidas = []
+        self.copias = []
+        self.fallas_subida = []
+        self.prohibidos = set()
+        self.intentos = []
+
+    def blob(self, name):
+        return self.objetos.get(name) or BlobFalso(self, name)
+
+    def copy_blob(self, origen, bucket, destino):
+        if origen.name not in self.objetos:
+            raise exceptions.NotFound("origen")
+        copia = BlobFalso(self, destino)
+        copia.size, copia.md5_hash = origen.size, origen.md5_hash
+        self.objetos[destino] = copia
+        self.copias.append((origen.name, destino))
+        return copia
+
+
+class ClienteFalso:
+    def list_blobs(self, bucket, prefix):
+        return [blob for nombre, blob in bucket.objetos.items() if nombre.startswith(prefix)]
+
+
+@pytest.fixture
+def bucket(monkeypatch):
+    bucket = BucketFalso()
+    monkeypatch.setattr(modulo, "get_storage_client", lambda: ClienteFalso())
+    monkeypatch.setattr(modulo, "_bucket_verificado", lambda nombre: bucket)
+
+    def upload_many(pares, raise_exception, **_):
+        salidas = []
+        for ruta, blob in pares:
+            try:
+                blob.upload_from_filename(ruta)
+                salidas.append(None)
+            except Exception as e:
+                salidas.append(e)
+        return salidas
+
+    monkeypatch.setattr(modulo.transfer_manager, "upload_many", upload_many)
+    monkeypatch.setattr(reintentos.time, "sleep", lambda _: None)
+    return bucket
+
+
+@pytest.fixture
+def repo(bucket):
+    return StorageRepository()
+
+
+def _archivo(tmp_path, relativa, contenido):
+    ruta = tmp_path / relativa
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    ruta.write_bytes(contenido)
+    return str(ruta)
+
+
+def test_contenido_repetido_se_sube_una_vez_y_se_copia(repo, bucket, tmp_path):
+    tareas = [
+        (_archivo(tmp_path, f"ia/2025/1-2/{t}T/captura.png", b"captura"), f"ia/2025/1-2/{t}T/captura.png")
+        for t in (1, 2, 3)
+    ]
+    resultados = repo.subir_lote(tareas)
+
+    assert [r.estado for r in resultados] == [RESULTADO_SUBIDO, RESULTADO_COPIADO, RESULTADO_COPIADO]
+    assert bucket.subidas == ["ia/2025/1-2/1T/captura.png"]
+    assert {destino for _, destino in bucket.copias} == {
+        "ia/2025/1-2/2T/captura.png",
+        "ia/2025/1-2/3T/captura.png",
+    }
+    assert all(r.url.endswith(r.destino) for r in resultados)
+
+
+def test_contenido_ya_subido_en_otro_lote_se_copia(repo, bucket, tmp_path):
+    repo.subir_lote([(_archivo(tmp_path, "ia/1T/a.png", b"captura"), "ia/1T/a.png")])
+    (resultado,) = repo.subir_lote(
+        [(_archivo(tmp_path, "ia/2T/a.png", b"captura"), "ia/2T/a.png")]
+    )
+    assert resultado.estado == RESULTADO_COPIADO
+    assert bucket.copias == [("ia/1T/a.png", "ia/2T/a.png")]
+
+
+def test_origen_borrado_del_bucket_se_vuelve_a_subir(repo, bucket, tmp_path):
+    repo.subir_lote([(_archivo(tmp_path, "ia/1T/a.png", b"captura"), "ia/1T/a.png")])
+    del bucket.objetos["ia/1T/a.png"]
+    (resultado,) = repo.subir_lote(
+        [(_archivo(tmp_path, "ia/2T/a.png", b"captura"), "ia/2T/a.png")]
+    )
+    assert resultado.estado == RESULTADO_SUBIDO
+    assert bucket.subidas == ["ia/1T/a.png", "ia/2T/a.png"]
+    # El nuevo origen reemplaza al borrado para las copias siguientes
+    (resultado,) = repo.subir_lote(
+        [(_archivo(tmp_path, "ia/3T/a.png", b"captura"), "ia/3T/a.png")]
+    )
+    assert resultado.estado == RESULTADO_COPIADO
+    assert bucket.copias[-1] == ("ia/2T/a.png", "ia/3T/a.png")
+
+
+def test_archivos_sin_cambios_en_el_bucket_no_se_suben(repo, bucket, tmp_path):
+    igual = _archivo(tmp_path, "ia/1T/igual.pdf", b"fur")
+    distinto = _archivo(tmp_path, "ia/1T/distinto.pdf", b"fur v2")
+    repo.subir_lote([(igual, "ia/1T/igual.pdf")])
+    bucket.blob("ia/1T/distinto.pdf")._guardar(b"fur v1")
+    bucket.subidas.clear()
+
+    # Un repositorio nuevo (otro proceso) solo conoce el bucket
+    resultados = StorageRepository().subir_lote(
+        [(igual, "ia/1T/igual.pdf"), (distinto, "ia/1T/distinto.pdf")]
+    )
+    assert [r.estado for r in resultados] == [RESULTADO_OMITIDO, RESULTADO_SUBIDO]
+    assert bucket.subidas == ["ia/1T/distinto.pdf"]
+    assert resultados[0].url.endswith("ia/1T/igual.pdf")
+
+
+def test_mismo_tamano_distinto_contenido_se_sube(repo, bucket, tmp_path):
+    local = _archivo(tmp_path, "ia/1T/a.pdf", b"AAAA")
+    bucket.blob("ia/1T/a.pdf")._guardar(b"BBBB")
+    (resultado,) = repo.subir_lote([(local, "ia/1T/a.pdf")])
+    assert resultado.estado == RESULTADO_SUBIDO
+
+
+def test_objeto_compuesto_se_compara_por_crc32c(repo, bucket, tmp_path):
+    local = _archivo(tmp_path, "ia/1T/a.pdf", b"fur")
+    remoto = bucket.blob("ia/1T/a.pdf")
+    remoto._guardar(b"fur")
+    remoto.md5_hash = None
+    remoto.crc32c = StorageRepository._crc32c_de_archivo(local)
+    (resultado,) = repo.subir_lote([(local, "ia/1T/a.pdf")])
+    assert resultado.estado == RESULTADO_OMITIDO
+
+
+def test_sin_sincronizacion_se_sube_todo(repo, bucket, tmp_path, monkeypatch):
+    local = _archivo(tmp_path, "ia/1T/a.pdf", b"fur")
+    bucket.blob("ia/1T/a.pdf")._guardar(b"fur")
+    monkeypatch.setenv("SER_STORAGE_SYNC", "0")
+    (resultado,) = StorageRepository().subir_lote([(local, "ia/1T/a.pdf")])
+    assert resultado.estado == RESULTADO_SUBIDO
+
+
+def test_listado_sin_prefijo_comun_recorre_cada_carpeta(repo, bucket):
+    for nombre in ("ia/1T/a.pdf", "otra/1T/b.pdf", "ajena/c.pdf", "suelto.pdf"):
+        bucket.blob(nombre)._guardar(b"x")
+    remotos = repo._listar_remotos(["ia/1T/a.pdf", "otra/1T/b.pdf", "suelto.pdf"])
+    assert set(remotos) == {"ia/1T/a.pdf", "otra/1T/b.pdf", "suelto.pdf"}
+
+
+def test_falla_transitoria_del_lote_se_reintenta_sola(repo, bucket, tmp_path):
+    bucket.fallas_subida = ["ia/1T/b.pdf"]
+    tareas = [
+        (_archivo(tmp_path, f"ia/1T/{nombre}.pdf", nombre.encode()), f"ia/1T/{nombre}.pdf")
+        for nombre in ("a", "b", "c")
+    ]
+    resultados = repo.subir_lote(tareas)
+    assert all(r.estado == RESULTADO_SUBIDO for r in resultados)
+    # Solo el archivo que falló se vuelve a intentar, fuera del lote
+    assert bucket.intentos.count("ia/1T/b.pdf") == 2
+    assert bucket.intentos.count("ia/1T/a.pdf") == 1
+
+
+def test_falla_permanente_no_se_reintenta(repo, bucket, tmp_path):
+    bucket.prohibidos = {"ia/1T/a.pdf"}
+    (resultado,) = repo.subir_lote([(_archivo(tmp_path, "ia/1T/a.pdf", b"fur"), "ia/1T/a.pdf")])
+    assert resultado.estado == RESULTADO_ERROR
+    assert not resultado.ok
+    assert bucket.intentos == ["ia/1T/a.pdf"]
+
+
+def test_periodo_con_archivos_fallidos_no_devuelve_urls(repo, bucket, tmp_path):
+    base = tmp_path / "descargas"
+    _archivo(base, "ia/2025/1-2/1T/fur.pdf", b"fur")
+    _archivo(base, "ia/2025/1-2/1T/.cas/ab/oculto", b"almacen")
+    bucket.prohibidos = {"ia/2025/1-2/1T/fur.pdf"}
+    with pytest.raises(RuntimeError):
+        repo.upload_period_and_images_standalone(str(base), "ia", 2025, 1, "1", "2")
+
+    bucket.prohibidos = set()
+    urls, rutas = repo.upload_period_and_images_standalone(str(base), "ia", 2025, 1, "1", "2")
+    # Las carpetas ocultas (el almacén) no se suben
+    assert rutas == ["gs://contraprestaciones-pro-ser/ia/2025/1-2/1T/fur.pdf"]
+    assert urls == [bucket.objetos["ia/2025/1-2/1T/fur.pdf"].public_url]
+
+
+# ----------------------------------------------------------------------
+# Subida continua
+# ----------------------------------------------------------------------
+def _esperar(condicion, timeout=5):
+    limite = time.monotonic() + timeout
+    while not condicion():
+        assert time.monotonic() < limite
+        time.sleep(0.01)
+
+
+def _continua(repo, base, trimestres=(1, 2)):
+    return repo.subida_continua(str(base), "ia", 2025, "1", "2", list(trimestres))
+
+
+def test_subida_continua_agrupa_por_trimestre(repo, bucket, tmp_path):
+    base = tmp_path / "descargas"
+    continua = _continua(repo, base)
+    for relativa in ("1T/b.pdf", "1T/a.pdf", "2T/c.pdf", "3T/d.pdf", "e.png"):
+        continua.encolar(_archivo(base, f"ia/2025/1-2/{relativa}", relativa.encode()))
+    subidas = continua.cerrar()
+
+    # Los trimestres no pedidos y los archivos fuera de un trimestre no se suben
+    assert set(bucket.subidas) == {"ia/2025/1-2/1T/a.pdf", "ia/2025/1-2/1T/b.pdf", "ia/2025/1-2/2T/c.pdf"}
+    urls, rutas = subidas[1]
+    assert rutas == [
+        "gs://contraprestaciones-pro-ser/ia/2025/1-2/1T/a.pdf",
+        "gs://contraprestaciones-pro-ser/ia/2025/1-2/1T/b.pdf",
+    ]
+    assert urls == [bucket.objetos[r.split("/", 3)[3]].public_url for r in rutas]
+    assert subidas[2][1] == ["gs://contraprestaciones-pro-ser/ia/2025/1-2/2T/c.pdf"]
+
+
+def test_subida_continua_omite_lo_que_ya_esta_en_el_bucket(repo, bucket, tmp_path):
+    base = tmp_path / "descargas"
+    local = _archivo(base, "ia/2025/1-2/1T/a.pdf", b"fur")
+    bucket.blob("ia/2025/1-2/1T/a.pdf")._guardar(b"fur")
+    continua = _continua(repo, base)
+    continua.encolar(local)
+    subidas = continua.cerrar()
+    assert bucket.subidas == []
+    assert subidas[1][0] == [bucket.objetos["ia/2025/1-2/1T/a.pdf"].public_url]
+
+
+def test_subida_continua_falla_al_cerrar_si_un_archivo_no_subio(repo, bucket, tmp_path):
+    base = tmp_path / "descargas"
+    bucket.prohibidos = {"ia/2025/1-2/1T/a.pdf"}
+    continua = _continua(repo, base)
+    continua.encolar(_archivo(base, "ia/2025/1-2/1T/a.pdf", b"fur"))
+    with pytest.raises(RuntimeError):
+        continua.cerrar()
+
+
+def test_subida_continua_solo_cuenta_la_ultima_version(repo, bucket, tmp_path, monkeypatch):
+    monkeypatch.setenv("SER_SUBIDA_CONTINUA_HILOS", "1")
+    base = tmp_path / "descargas"
+    # La primera versión falla; el scraping repetido vuelve a guardar el archivo
+    bucket.prohibidos = {"ia/2025/1-2/1T/a.pdf"}
+    continua = _continua(repo, base)
+    local = _archivo(base, "ia/2025/1-2/1T/a.pdf", b"fur v1")
+    continua.encolar(local)
+    _esperar(lambda: "ia/2025/1-2/1T/a.pdf" in bucket.intentos)
+    bucket.prohibidos = set()
+    _archivo(base, "ia/2025/1-2/1T/a.pdf", b"fur v2")
+    continua.encolar(local)
+    (urls, _) = continua.cerrar()[1]
+    assert urls == [bucket.objetos["ia/2025/1-2/1T/a.pdf"].public_url]
+
+
+def test_subida_continua_version_vieja_no_pisa_a_la_nueva(repo, bucket, tmp_path):
+    base = tmp_path / "descargas"
+    continua = _continua(repo, base)
+    continua.abortar()
+    local = _archivo(base, "ia/2025/1-2/1T/a.pdf", b"fur")
+    # Resultado tardío de la versión 1 cuando ya se encoló la 2
+    continua._versiones["ia/2025/1-2/1T/a.pdf"] = 2
+    bucket.prohibidos = {"ia/2025/1-2/1T/a.pdf"}
+    continua._subir(local, "ia/2025/1-2/1T/a.pdf", 1, 1)
+    assert continua._fallidos == {}
+
+
+def test_abortar_descarta_la_cola_y_encolar_no_bloquea(repo, bucket, tmp_path, monkeypatch):
+    monkeypatch.setenv("SER_SUBIDA_CONTINUA_HILOS", "1")
+    monkeypatch.setenv("SER_SUBIDA_COLA", "1")
+    base = tmp_path / "descargas"
+    continua = _continua(repo, base)
+    liberar = threading.Event()
+    subir_original = continua._subir
+
+    def subir_lento(*tarea):
+        liberar.wait(timeout=5)
+        subir_original(*tarea)
+
+    monkeypatch.setattr(continua, "_subir", subir_lento)
+    # Uno en manos del hilo y otro llenando la cola
+    continua.encolar(_archivo(base, "ia/2025/1-2/1T/a.pdf", b"a"))
+    continua.encolar(_archivo(base, "ia/2025/1-2/1T/b.pdf", b"b"))
+    _esperar(lambda: continua._cola.qsize() == 1)
+
+    bloqueado = threading.Thread(
+        target=continua.encolar, args=(_archivo(base, "ia/2025/1-2/1T/c.pdf", b"c"),)
+    )
+    bloqueado.start()
+    abortador = threading.Thread(target=continua.abortar)
+    abortador.start()
+    liberar.set()
+    abortador.join(timeout=5)
+    bloqueado.join(timeout=5)
+    assert not abortador.is_alive() and not bloqueado.is_alive()
+    # Solo termina la subida que ya estaba en curso; lo encolado se descarta
+    assert bucket.subidas == ["ia/2025/1-2/1T/a.pdf"]
+
+    # Después de abortar, encolar no hace nada
+    en_cola = continua._cola.qsize()
+    continua.encolar(_archivo(base, "ia/2025/1-2/1T/d.pdf", b"d"))
+    assert continua._cola.qsize() == en_cola
+
+
+def test_encolar_despues_de_cerrar_no_hace_nada(repo, bucket, tmp_path):
+    base = tmp_path / "descargas"
+    continua = _continua(repo, base)
+    continua.cerrar()
+    continua.encolar(_archivo(base, "ia/2025/1-2/1T/a.pdf", b"a"))
+    assert continua._cola.empty()
+    assert bucket.subidas == []
@@ -0,0 +1,199 @@
+import threading
+import time
+
+import pytest
+
+from app.utils.trabajos import (
+    ESTADO_CANCELADO,
+    ESTADO_COMPLETADO,
+    ESTADO_EN_PROCESO,
+    ESTADO_ERROR,
+    ESTADO_OMITIDO,
+    ESTADO_PARCIAL,
+    GestorTrabajos,
+    TrabajoCancelado,
+    TrabajoEnCurso,
+)
+
+
+@pytest.fixture
+def gestor():
+    gestor = GestorTrabajos(max_workers=2)
+    yield gestor
+    gestor.apagar()
+
+
+def _bloqueante(liberar: threading.Event):
+    def funcion(trabajo):
+        liberar.wait(timeout=5)
+
+    return funcion
+
+
+def _esperar_fin(trabajo, timeout=5):
+    limite = time.monotonic() + timeout
+    while not trabajo.terminado:
+        assert time.monotonic() < limite
+        time.sleep(0.01)
+
+
+def _con_items(*estados):
+    """Función de trabajo que deja un ítem por estado (None: sin procesar)."""
+
+    def funcion(trabajo):
+        for indice, estado in enumerate(estados):
+            trabajo.agregar_item(f"item-{indice}", [1], 1)
+            if estado is not None:
+                trabajo.terminar_item(f"item-{indice}", estado)
+
+    return funcion
+
+
+def test_shards_de_la_misma_ingesta_no_chocan(gestor):
+    liberar = threading.Event()
+    primero = gestor.enviar("ing", {}, _bloqueante(liberar), clave="ing-shard-0-de-2")
+    segundo = gestor.enviar("ing", {}, _bloqueante(liberar), clave="ing-shard-1-de-2")
+
+    assert primero.ingestion_id == segundo.ingestion_id == "ing"
+    assert gestor.obtener("ing-shard-0-de-2") is primero
+    assert gestor.obtener("ing-shard-1-de-2") is segundo
+    assert gestor.obtener("ing") is None
+
+    # El mismo shard sí se rechaza mientras sigue en curso
+    with pytest.raises(TrabajoEnCurso):
+        gestor.enviar("ing", {}, _bloqueante(liberar), clave="ing-shard-0-de-2")
+    liberar.set()
+
+
+def test_trabajo_en_curso_fuera_del_pool_ocupa_su_clave(gestor):
+    liberar = threading.Event()
+    with gestor.en_curso("ing", {}) as trabajo:
+        assert gestor.obtener("ing") is trabajo
+        assert trabajo.estado == ESTADO_EN_PROCESO
+        # Ni POST / ni otro POST /async pueden tomar la misma ingesta
+        with pytest.raises(TrabajoEnCurso):
+            gestor.enviar("ing", {}, _bloqueante(liberar))
+        with pytest.raises(TrabajoEnCurso):
+            with gestor.en_curso("ing", {}):
+                pass
+    assert trabajo.estado == ESTADO_COMPLETADO
+
+    # Terminado, la clave vuelve a estar libre
+    with gestor.en_curso("ing", {}) as otro:
+        assert otro is not trabajo
+
+
+def test_trabajo_en_curso_rechazado_si_el_pool_ya_lo_ejecuta(gestor):
+    liberar = threading.Event()
+    gestor.enviar("ing", {}, _bloqueante(liberar))
+    with pytest.raises(TrabajoEnCurso):
+        with gestor.en_curso("ing", {}):
+            pass
+    liberar.set()
+
+
+def test_trabajo_en_curso_registra_el_error(gestor):
+    with pytest.raises(ValueError):
+        with gestor.en_curso("ing", {}) as trabajo:
+            raise ValueError("sin registros")
+    assert trabajo.estado == ESTADO_ERROR
+    assert trabajo.error == "sin registros"
+
+
+@pytest.mark.parametrize(
+    "estados, esperado",
+    [
+        ((), ESTADO_COMPLETADO),
+        ((ESTADO_COMPLETADO, ESTADO_OMITIDO), ESTADO_COMPLETADO),
+        ((ESTADO_COMPLETADO, ESTADO_ERROR), ESTADO_PARCIAL),
+        ((ESTADO_COMPLETADO, None), ESTADO_PARCIAL),
+        ((ESTADO_ERROR, ESTADO_ERROR), ESTADO_ERROR),
+        ((ESTADO_ERROR, None), ESTADO_ERROR),
+    ],
+)
+def test_estado_final_sale_de_los_items(gestor, estados, esperado):
+    trabajo = gestor.enviar("ing", {}, _con_items(*estados))
+    _esperar_fin(trabajo)
+    assert trabajo.estado == esperado
+    assert (trabajo.error is None) == (esperado == ESTADO_COMPLETADO)
+
+
+def test_estado_final_de_un_trabajo_en_curso_sale_de_los_items(gestor):
+    with gestor.en_curso("ing", {}) as trabajo:
+        _con_items(ESTADO_COMPLETADO, ESTADO_ERROR)(trabajo)
+    assert trabajo.estado == ESTADO_PARCIAL
+    assert trabajo.error == "1 de 2 ítems con error y 0 sin terminar."
+
+
+def test_funcion_que_falla_deja_el_trabajo_en_error(gestor):
+    def funcion(trabajo):
+        raise LookupError("sin registros")
+
+    trabajo = gestor.enviar("ing", {}, funcion)
+    _esperar_fin(trabajo)
+    assert trabajo.estado == ESTADO_ERROR
+    assert trabajo.error == "sin registros"
+
+
+def test_cancelar_un_trabajo_en_cola_evita_que_corra():
+    gestor = GestorTrabajos(max_workers=1)
+    liberar = threading.Event()
+    ejecutados = []
+    try:
+        gestor.enviar("primero", {}, _bloqueante(liberar))
+        segundo = gestor.enviar("segundo", {}, ejecutados.append)
+        assert gestor.cancelar("segundo") is segundo
+        assert segundo.estado == ESTADO_CANCELADO
+        liberar.set()
+        _esperar_fin(gestor.obtener("primero"))
+        assert ejecutados == []
+    finally:
+        gestor.apagar()
+
+
+def test_cancelar_un_trabajo_en_curso(gestor):
+    iniciado = threading.Event()
+
+    def funcion(trabajo):
+        iniciado.set()
+        while True:
+            trabajo.verificar_cancelacion()
+            time.sleep(0.01)
+
+    trabajo = gestor.enviar("ing", {}, funcion)
+    assert iniciado.wait(timeout=5)
+    gestor.cancelar("ing")
+    _esperar_fin(trabajo)
+    assert trabajo.estado == ESTADO_CANCELADO
+    assert trabajo.como_dict()["cancelacion_solicitada"]
+
+
+def test_cancelar_clave_desconocida(gestor):
+    assert gestor.cancelar("no-existe") is None
+
+
+def test_trabajo_cancelado_puede_volver_a_enviarse(gestor):
+    with pytest.raises(TrabajoCancelado):
+        with gestor.en_curso("ing", {}) as trabajo:
+            trabajo.cancelar()
+            trabajo.verificar_cancelacion()
+    assert trabajo.estado == ESTADO_CANCELADO
+    nuevo = gestor.enviar("ing", {}, _con_items())
+    assert nuevo is not trabajo
+
+
+def test_se_purgan_los_terminados_mas_antiguos():
+    gestor = GestorTrabajos(max_workers=1, retenidos=2)
+    liberar = threading.Event()
+    try:
+        for clave in ("a", "b", "c"):
+            _esperar_fin(gestor.enviar(clave, {}, _con_items()))
+        en_curso = gestor.enviar("d", {}, _bloqueante(liberar))
+        # Se descartan los terminados más antiguos; el que corre nunca
+        assert gestor.obtener("a") is None
+        assert gestor.obtener("b") is None
+        assert gestor.obtener("c") is not None
+        assert gestor.obtener("d") is en_curso
+    finally:
+        liberar.set()
+        gestor.apagar()